@@ -18,6 +18,10 @@ try:
         PROCESSOR_CLASSES = {
             "realtime": "django_opensearch_models.signals.RealTimeSignalProcessor",
             "celery": "django_opensearch_models.signals.CelerySignalProcessor",
+            "transaction": "django_opensearch_models.signals.TransactionSignalProcessor",
+            "batched-celery": "django_opensearch_models.signals.BatchedCelerySignalProcessor",
+            "threaded": "django_opensearch_models.signals.ThreadedSignalProcessor",
+            "outbox": "django_opensearch_models.outbox.signals.OutboxSignalProcessor",
         }
 
         signal_processor = PROCESSOR_CLASSES[signal_processor]
@@ -36,6 +40,7 @@ try:
                 "django.contrib.contenttypes",
                 "django.contrib.sites",
                 "django_opensearch_models",
+                "django_opensearch_models.outbox",
                 "tests",
             ],
             SITE_ID=1,
@@ -83,7 +88,7 @@ def make_parser():
         "--signal-processor",
         nargs="?",
         default="realtime",
-        choices=("realtime", "celery"),
+        choices=("realtime", "celery", "transaction", "batched-celery", "threaded", "outbox"),
         help="Defines which signal backend to choose",
     )
     parser.add_argument("--opensearch-username", nargs="?", help="Username for OpenSearch user")
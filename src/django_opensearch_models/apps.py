@@ -19,6 +19,14 @@ class DEDConfig(AppConfig):
             )
             signal_processor_class = import_string(signal_processor_path)
             self.signal_processor = signal_processor_class(connections)
+        if self.hydration_cache():
+            from .cache import connect_instance_cache_signals  # noqa: PLC0415
+
+            connect_instance_cache_signals()
+        if self.search_cache():
+            from .cache import connect_search_cache_signals  # noqa: PLC0415
+
+            connect_search_cache_signals()
 
     @classmethod
     def autosync_enabled(cls):
@@ -31,3 +39,92 @@ class DEDConfig(AppConfig):
     @classmethod
     def auto_refresh_enabled(cls):
         return getattr(settings, "OPENSEARCH_AUTO_REFRESH", True)
+
+    @classmethod
+    def adaptive_bulk_enabled(cls):
+        return getattr(settings, "OPENSEARCH_ADAPTIVE_BULK", False)
+
+    @classmethod
+    def adaptive_bulk_options(cls):
+        return getattr(settings, "OPENSEARCH_ADAPTIVE_BULK_OPTIONS", {})
+
+    @classmethod
+    def bulk_max_retries(cls):
+        return getattr(settings, "OPENSEARCH_BULK_MAX_RETRIES", 0)
+
+    @classmethod
+    def bulk_initial_backoff(cls):
+        return getattr(settings, "OPENSEARCH_BULK_INITIAL_BACKOFF", 2)
+
+    @classmethod
+    def bulk_max_backoff(cls):
+        return getattr(settings, "OPENSEARCH_BULK_MAX_BACKOFF", 600)
+
+    @classmethod
+    def dead_letter_sink(cls):
+        sink_path = getattr(settings, "OPENSEARCH_DEAD_LETTER_SINK", None)
+        return import_string(sink_path)() if sink_path else None
+
+    @classmethod
+    def dead_letter_file(cls):
+        return getattr(settings, "OPENSEARCH_DEAD_LETTER_FILE", "opensearch_dead_letters.jsonl")
+
+    @classmethod
+    def serializer(cls):
+        serializer_path = getattr(
+            settings, "OPENSEARCH_SERIALIZER", "django_opensearch_models.serializers.DjangoJSONSerializer"
+        )
+        return import_string(serializer_path)()
+
+    @classmethod
+    def source_hash_cache(cls):
+        return getattr(settings, "OPENSEARCH_SOURCE_HASH_CACHE", "default")
+
+    @classmethod
+    def source_hash_timeout(cls):
+        return getattr(settings, "OPENSEARCH_SOURCE_HASH_TIMEOUT", None)
+
+    @classmethod
+    def source_hash_local_size(cls):
+        return getattr(settings, "OPENSEARCH_SOURCE_HASH_LOCAL_SIZE", 10000)
+
+    @classmethod
+    def async_connections_settings(cls):
+        return getattr(settings, "OPENSEARCH_ASYNC", None) or settings.OPENSEARCH
+
+    @classmethod
+    def hydration_cache(cls):
+        return getattr(settings, "OPENSEARCH_HYDRATION_CACHE", None)
+
+    @classmethod
+    def hydration_cache_alias(cls):
+        return getattr(settings, "OPENSEARCH_HYDRATION_CACHE_ALIAS", "default")
+
+    @classmethod
+    def hydration_cache_timeout(cls):
+        return getattr(settings, "OPENSEARCH_HYDRATION_CACHE_TIMEOUT", 300)
+
+    @classmethod
+    def hydration_cache_size(cls):
+        return getattr(settings, "OPENSEARCH_HYDRATION_CACHE_SIZE", 1000)
+
+    @classmethod
+    def search_cache(cls):
+        return getattr(settings, "OPENSEARCH_SEARCH_CACHE", None)
+
+    @classmethod
+    def search_cache_timeout(cls):
+        return getattr(settings, "OPENSEARCH_SEARCH_CACHE_TIMEOUT", 60)
+
+    @classmethod
+    def threaded_processor_options(cls):
+        return getattr(settings, "OPENSEARCH_THREADED_PROCESSOR_OPTIONS", {})
+
+    @classmethod
+    def related_update_threshold(cls):
+        return getattr(settings, "OPENSEARCH_RELATED_UPDATE_THRESHOLD", None)
+
+    @classmethod
+    def related_update_handler(cls):
+        handler_path = getattr(settings, "OPENSEARCH_RELATED_UPDATE_HANDLER", None)
+        return import_string(handler_path) if handler_path else None
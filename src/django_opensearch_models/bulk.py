@@ -0,0 +1,370 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from opensearchpy.exceptions import TransportError
+from opensearchpy.helpers import BulkIndexError, expand_action
+
+# The responses are processed like in opensearchpy.helpers.bulk() so that the results are the same
+from opensearchpy.helpers.actions import _process_bulk_chunk_error, _process_bulk_chunk_success  # noqa: PLC2701
+
+from .apps import DEDConfig
+
+NOT_FOUND = 404
+TOO_MANY_REQUESTS = 429
+
+# Status codes of bulk requests rejected because of the load or size of the request
+REJECTED_STATUS_CODES = (413, TOO_MANY_REQUESTS)
+
+# Arguments of opensearchpy.helpers.bulk() which are replaced by the adaptive sizing
+IGNORED_BULK_ARGUMENTS = ("chunk_size", "max_chunk_bytes")
+
+# Status codes of failed items which are worth sending again, "N/A" is the status of connection errors
+RETRY_STATUS_CODES = (TOO_MANY_REQUESTS, 502, 503, 504, "N/A")
+
+
+def collect_results(results, stats_only=False, max_errors=None, on_error=None):
+    """
+    Count the ``(ok, item)`` results of a streaming bulk like opensearchpy.helpers.bulk().
+
+    Return ``(success, errors)``, or ``(success, failed)`` with `stats_only`. Only the first
+    `max_errors` failed items are kept if it is set, `on_error` is called with every failed item.
+    """
+    success, failed, errors = 0, 0, []
+    for ok, item in results:
+        if ok:
+            success += 1
+        else:
+            failed += 1
+            if on_error is not None:
+                on_error(item)
+            if not stats_only and (max_errors is None or len(errors) < max_errors):
+                errors.append(item)
+    return success, failed if stats_only else errors
+
+
+def describe_requests(requests):
+    """Describe the ``(docs, size)`` of sent bulk requests, as recorded by AdaptiveChunkSizer."""
+    if not requests:
+        return "0 bulk requests"
+    docs = [request[0] for request in requests]
+    sizes = [request[1] for request in requests]
+    return f"{len(requests)} bulk requests of {min(docs)}-{max(docs)} documents and {min(sizes)}-{max(sizes)} bytes"
+
+
+class AdaptiveChunkSizer:
+    """
+    Split bulk actions in requests sized by serialized bytes, adapting the size to the cluster's response.
+
+    The byte budget of a request grows by `growth` while requests are answered in less than
+    `target_latency` seconds, and shrinks by `shrink` when they take more than twice as long or
+    when items or whole requests are rejected (429/413). Rejected requests, and the items of a
+    request rejected with a 429 status, are split with the new budget and sent again, at most
+    `max_rejections` times.
+    """
+
+    def __init__(
+        self,
+        initial_bytes=1024 * 1024,
+        min_bytes=64 * 1024,
+        max_bytes=10 * 1024 * 1024,
+        max_docs=10000,
+        target_latency=1.0,
+        growth=1.5,
+        shrink=0.5,
+        max_rejections=5,
+        backoff=1.0,
+    ):
+        self.chunk_bytes = initial_bytes
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.target_latency = target_latency
+        self.growth = growth
+        self.shrink = shrink
+        self.max_rejections = max_rejections
+        self.backoff = backoff
+        # Number of documents and bytes of each sent request
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**DEDConfig.adaptive_bulk_options())
+
+    def record(self, docs, size, latency, rejected=False):
+        """Record a sent request and adapt the byte budget of the next ones."""
+        with self._lock:
+            self.requests.append((docs, size))
+            if rejected or latency > 2 * self.target_latency:
+                self.chunk_bytes = max(self.min_bytes, int(self.chunk_bytes * self.shrink))
+            elif latency < self.target_latency and size >= self.chunk_bytes * self.shrink:
+                # Only grow when the request actually used the budget
+                self.chunk_bytes = min(self.max_bytes, int(self.chunk_bytes * self.growth))
+
+    def summary(self):
+        """Describe the sizes of the sent requests."""
+        if not self.requests:
+            return describe_requests(self.requests)
+        return f"{describe_requests(self.requests)}, last budget {self.chunk_bytes} bytes"
+
+    def chunks(self, actions, serializer, expand_action_callback=expand_action):
+        """Serialize `actions` and group them in chunks that fit in the current byte budget."""
+        chunk, size = [], 0
+        for action in actions:
+            action, data = expand_action_callback(action)  # noqa: PLW2901
+            bulk_data = (action,) if data is None else (action, data)
+            lines = [line if isinstance(line, str) else serializer.dumps(line) for line in bulk_data]
+            item_size = sum(len(line.encode("utf-8")) + 1 for line in lines)
+            if chunk and (size + item_size > self.chunk_bytes or len(chunk) >= self.max_docs):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append((bulk_data, lines, item_size))
+            size += item_size
+        if chunk:
+            yield chunk
+
+    def split(self, chunk):
+        """Split a rejected chunk with the current byte budget, or in halves if it still fits in it."""
+        parts, part, size = [], [], 0
+        for item in chunk:
+            if part and size + item[2] > self.chunk_bytes:
+                parts.append(part)
+                part, size = [], 0
+            part.append(item)
+            size += item[2]
+        parts.append(part)
+        if len(parts) == 1 and len(chunk) > 1:
+            middle = len(chunk) // 2
+            parts = [chunk[:middle], chunk[middle:]]
+        return parts
+
+    def send(self, client, chunk, params, rejections=0):
+        """Send a chunk, splitting and resending it if it is rejected, and return ``[(bulk_data, response)]``."""
+        size = sum(item[2] for item in chunk)
+        body = "".join(line + "\n" for item in chunk for line in item[1])
+        start = time.monotonic()
+        try:
+            response = client.bulk(body=body, **params)
+        except TransportError as e:
+            if e.status_code not in REJECTED_STATUS_CODES or rejections >= self.max_rejections:
+                return [([item[0] for item in chunk], e)]
+            self.record(len(chunk), size, time.monotonic() - start, rejected=True)
+            time.sleep(self.backoff * 2**rejections)
+            return [result for part in self.split(chunk) for result in self.send(client, part, params, rejections + 1)]
+
+        statuses = [item.get("status") for result in response["items"] for item in result.values()]
+        rejected = TOO_MANY_REQUESTS in statuses
+        self.record(len(chunk), size, time.monotonic() - start, rejected=rejected)
+        if not rejected or rejections >= self.max_rejections:
+            return [([item[0] for item in chunk], response)]
+
+        # Only the rejected items are sent again
+        done = [
+            (item, result)
+            for item, result, status in zip(chunk, response["items"], statuses)
+            if status != TOO_MANY_REQUESTS
+        ]
+        retried = [item for item, status in zip(chunk, statuses) if status == TOO_MANY_REQUESTS]
+        results = (
+            [([item[0] for item, _ in done], {**response, "items": [result for _, result in done]})] if done else []
+        )
+        time.sleep(self.backoff * 2**rejections)
+        return results + [
+            result for part in self.split(retried) for result in self.send(client, part, params, rejections + 1)
+        ]
+
+    def streaming_bulk(
+        self,
+        client,
+        actions,
+        thread_count=1,
+        expand_action_callback=expand_action,
+        raise_on_error=True,
+        raise_on_exception=True,
+        ignore_status=(),
+        **kwargs,
+    ):
+        """
+        Like opensearchpy.helpers.streaming_bulk(), yield an ``(ok, item)`` tuple for each action.
+
+        With a `thread_count` greater than 1, up to `thread_count` requests are sent concurrently.
+        """
+        params = {key: value for key, value in kwargs.items() if key not in IGNORED_BULK_ARGUMENTS}
+        chunks = self.chunks(actions, client.transport.serializer, expand_action_callback)
+
+        def process(results):
+            for bulk_data, response in results:
+                if isinstance(response, TransportError):
+                    yield from _process_bulk_chunk_error(
+                        response, bulk_data, ignore_status, raise_on_exception, raise_on_error
+                    )
+                else:
+                    yield from _process_bulk_chunk_success(response, bulk_data, ignore_status, raise_on_error)
+
+        if thread_count <= 1:
+            for chunk in chunks:
+                yield from process(self.send(client, chunk, params))
+            return
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(self.send, client, chunk, params))
+                if len(pending) >= thread_count:
+                    yield from process(pending.popleft().result())
+            while pending:
+                yield from process(pending.popleft().result())
+
+    def bulk(self, client, actions, stats_only=False, **kwargs):
+        """Like opensearchpy.helpers.bulk(), return ``(success, errors)`` or ``(success, failed)`` with `stats_only`."""
+        return collect_results(self.streaming_bulk(client, actions, **kwargs), stats_only=stats_only)
+
+
+class BulkRetrier:
+    """
+    Send again the bulk actions which failed with a transient error, waiting longer after each attempt.
+
+    Items failed with one of the `RETRY_STATUS_CODES` are sent again up to `max_retries` times,
+    waiting `initial_backoff` seconds, doubled after each attempt and at most `max_backoff`. The
+    actions which still fail are added to the `dead_letter_sink`, if there is one, so that they can
+    be replayed later with ``search_index --replay-failed``.
+    """
+
+    def __init__(self, max_retries=3, initial_backoff=2, max_backoff=600, dead_letter_sink=None):
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.dead_letter_sink = dead_letter_sink
+
+    @classmethod
+    def from_settings(cls):
+        """Return the retrier configured in the settings, or None if there are neither retries nor a sink."""
+        max_retries = DEDConfig.bulk_max_retries()
+        dead_letter_sink = DEDConfig.dead_letter_sink()
+        if not max_retries and dead_letter_sink is None:
+            return None
+        return cls(
+            max_retries=max_retries,
+            initial_backoff=DEDConfig.bulk_initial_backoff(),
+            max_backoff=DEDConfig.bulk_max_backoff(),
+            dead_letter_sink=dead_letter_sink,
+        )
+
+    @staticmethod
+    def is_retryable(item):
+        _op_type, info = next(iter(item.items()))
+        return info.get("status") in RETRY_STATUS_CODES
+
+    def add_dead_letter(self, action, item):
+        op_type, info = next(iter(item.items()))
+        if op_type in {"delete", "update"} and info.get("status") == NOT_FOUND:
+            # Deleted documents are already gone, and partial updates of missing documents
+            # are followed by the indexing of the whole document
+            return
+        error = {key: value for key, value in info.items() if key not in {"data", "exception"}}
+        self.dead_letter_sink.add(action, error)
+
+    def streaming_bulk(self, send, actions, raise_on_error=True):
+        """
+        Yield an ``(ok, item)`` tuple for each action, once it succeeded or can't be retried anymore.
+
+        `send` is called with an iterable of actions and must yield their results in the same
+        order, without raising on errors. Without a dead-letter sink and with `raise_on_error`,
+        a BulkIndexError is raised at the end if some actions failed.
+        """
+        errors = []
+        for attempt in range(self.max_retries + 1):
+            sent = deque()
+
+            def track(actions, sent=sent):
+                for action in actions:
+                    sent.append(action)
+                    yield action
+
+            retry = []
+            for ok, item in send(track(actions), raise_on_error=False, raise_on_exception=False):
+                action = sent.popleft()
+                if not ok and attempt < self.max_retries and self.is_retryable(item):
+                    retry.append(action)
+                    continue
+                if not ok:
+                    if self.dead_letter_sink is not None:
+                        self.add_dead_letter(action, item)
+                    elif raise_on_error:
+                        errors.append(item)
+                yield ok, item
+
+            if not retry:
+                break
+            time.sleep(min(self.max_backoff, self.initial_backoff * 2**attempt))
+            actions = retry
+
+        if errors:
+            msg = f"{len(errors)} document(s) failed to index."
+            raise BulkIndexError(msg, errors)
+
+    def bulk(self, send, actions, stats_only=False, raise_on_error=True):
+        """Like opensearchpy.helpers.bulk(), return ``(success, errors)`` or ``(success, failed)`` with `stats_only`."""
+        return collect_results(self.streaming_bulk(send, actions, raise_on_error=raise_on_error), stats_only=stats_only)
+
+
+class DeadLetterSink(ABC):
+    """Store of the bulk actions which failed to be indexed, to be replayed later."""
+
+    @abstractmethod
+    def add(self, action, error):
+        """Store a failed action and its error."""
+
+    @abstractmethod
+    def read(self):
+        """Return the stored ``{"action": ..., "error": ..., "failed_at": ...}`` records."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all the stored records."""
+
+
+class MemoryDeadLetterSink(DeadLetterSink):
+    """Keep the failed actions in a list."""
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, action, error):
+        self.records.append({"action": action, "error": error, "failed_at": timezone.now()})
+
+    def read(self):
+        return list(self.records)
+
+    def clear(self):
+        self.records = []
+
+
+class JSONLinesDeadLetterSink(DeadLetterSink):
+    """Append the failed actions to a JSON Lines file, by default ``OPENSEARCH_DEAD_LETTER_FILE``."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or DEDConfig.dead_letter_file())
+        self._lock = threading.Lock()
+
+    def add(self, action, error):
+        record = {"action": action, "error": error, "failed_at": timezone.now()}
+        line = json.dumps(record, cls=DjangoJSONEncoder)
+        with self._lock, self.path.open("a") as f:
+            f.write(line + "\n")
+
+    def read(self):
+        if not self.path.exists():
+            return []
+        with self.path.open() as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
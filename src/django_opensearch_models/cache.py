@@ -0,0 +1,320 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .apps import DEDConfig
+from .registries import registry
+from .signals import post_index
+
+
+class DjangoCacheSourceHashStore:
+    """
+    Keep the hashes of the indexed sources in a Django cache (``OPENSEARCH_SOURCE_HASH_CACHE``).
+
+    The keys include a generation number per namespace (document), so that all the hashes of a
+    document are invalidated at once by incrementing it.
+    """
+
+    key_prefix = "django_opensearch_models:source_hash:"
+
+    def __init__(self, alias=None, timeout=None):
+        self.alias = alias or DEDConfig.source_hash_cache()
+        self.timeout = timeout if timeout is not None else DEDConfig.source_hash_timeout()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation_key(self, namespace):
+        return f"{self.key_prefix}{namespace}:generation"
+
+    def _prefix(self, namespace):
+        generation = self.cache.get(self._generation_key(namespace), 0)
+        return f"{self.key_prefix}{namespace}:{generation}:"
+
+    def get_many(self, namespace, ids):
+        prefix = self._prefix(namespace)
+        hashes = self.cache.get_many([prefix + id_ for id_ in ids])
+        return {key[len(prefix) :]: source_hash for key, source_hash in hashes.items()}
+
+    def set_many(self, namespace, hashes):
+        prefix = self._prefix(namespace)
+        self.cache.set_many({prefix + id_: source_hash for id_, source_hash in hashes.items()}, timeout=self.timeout)
+
+    def delete_many(self, namespace, ids):
+        prefix = self._prefix(namespace)
+        self.cache.delete_many([prefix + id_ for id_ in ids])
+
+    def invalidate(self, namespace):
+        key = self._generation_key(namespace)
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Evicted in between
+            self.cache.set(key, 1, timeout=None)
+
+
+class LocalSourceHashStore:
+    """Keep the hashes of the last `max_size` indexed sources in the memory of the process."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or DEDConfig.source_hash_local_size()
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace, ids):
+        hashes = {}
+        with self._lock:
+            for id_ in ids:
+                source_hash = self._hashes.get((namespace, id_))
+                if source_hash is not None:
+                    self._hashes.move_to_end((namespace, id_))
+                    hashes[id_] = source_hash
+        return hashes
+
+    def set_many(self, namespace, hashes):
+        with self._lock:
+            for id_, source_hash in hashes.items():
+                self._hashes[namespace, id_] = source_hash
+                self._hashes.move_to_end((namespace, id_))
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+
+    def delete_many(self, namespace, ids):
+        with self._lock:
+            for id_ in ids:
+                self._hashes.pop((namespace, id_), None)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for key in [key for key in self._hashes if key[0] == namespace]:
+                del self._hashes[key]
+
+
+SOURCE_HASH_STORES = {"cache": DjangoCacheSourceHashStore, "local": LocalSourceHashStore}
+
+_source_hash_stores = {}
+
+
+def get_source_hash_store(mode):
+    """Return the source hash store shared by the documents using the `mode` ``skip_unchanged`` option."""
+    store = _source_hash_stores.get(mode)
+    if store is None:
+        store = _source_hash_stores[mode] = SOURCE_HASH_STORES[mode]()
+    return store
+
+
+class DjangoCacheInstanceStore:
+    """Keep the model instances hydrated from search results in a Django cache, by model and primary key."""
+
+    key_prefix = "django_opensearch_models:instance:"
+
+    def __init__(self, alias=None, timeout=None):
+        self.alias = alias or DEDConfig.hydration_cache_alias()
+        self.timeout = timeout if timeout is not None else DEDConfig.hydration_cache_timeout()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, model, pk):
+        return f"{self.key_prefix}{model._meta.label_lower}:{pk}"
+
+    def get_many(self, model, pks):
+        keys = {self._key(model, pk): pk for pk in pks}
+        return {keys[key]: instance for key, instance in self.cache.get_many(list(keys)).items()}
+
+    async def aget_many(self, model, pks):
+        keys = {self._key(model, pk): pk for pk in pks}
+        return {keys[key]: instance for key, instance in (await self.cache.aget_many(list(keys))).items()}
+
+    def set_many(self, model, instances):
+        data = {self._key(model, pk): instance for pk, instance in instances.items()}
+        self.cache.set_many(data, timeout=self.timeout)
+
+    async def aset_many(self, model, instances):
+        data = {self._key(model, pk): instance for pk, instance in instances.items()}
+        await self.cache.aset_many(data, timeout=self.timeout)
+
+    def delete(self, model, pk):
+        self.cache.delete(self._key(model, pk))
+
+
+class LocalInstanceStore:
+    """
+    Keep the last `max_size` model instances hydrated from search results in the memory of the process.
+
+    The instances expire after `timeout` seconds and are copied when read, so that the callers
+    can't alter each other's instances. Saving or deleting an instance only drops it from the
+    store of the current process, the other processes keep it until it expires.
+    """
+
+    def __init__(self, max_size=None, timeout=None):
+        self.max_size = max_size or DEDConfig.hydration_cache_size()
+        self.timeout = timeout if timeout is not None else DEDConfig.hydration_cache_timeout()
+        self._instances = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, model, pks):
+        instances = {}
+        now = time.monotonic()
+        with self._lock:
+            for pk in pks:
+                key = (model._meta.label_lower, pk)
+                expires_at, instance = self._instances.get(key, (None, None))
+                if expires_at is not None and expires_at <= now:
+                    del self._instances[key]
+                elif instance is not None:
+                    self._instances.move_to_end(key)
+                    instances[pk] = instance
+        return {pk: deepcopy(instance) for pk, instance in instances.items()}
+
+    async def aget_many(self, model, pks):
+        return self.get_many(model, pks)
+
+    def set_many(self, model, instances):
+        expires_at = time.monotonic() + self.timeout
+        with self._lock:
+            for pk, instance in instances.items():
+                key = (model._meta.label_lower, pk)
+                self._instances[key] = (expires_at, deepcopy(instance))
+                self._instances.move_to_end(key)
+            while len(self._instances) > self.max_size:
+                self._instances.popitem(last=False)
+
+    async def aset_many(self, model, instances):
+        self.set_many(model, instances)
+
+    def delete(self, model, pk):
+        with self._lock:
+            self._instances.pop((model._meta.label_lower, pk), None)
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+
+
+INSTANCE_STORES = {"cache": DjangoCacheInstanceStore, "local": LocalInstanceStore}
+
+_instance_stores = {}
+
+
+def get_instance_store():
+    """Return the cache of the hydrated model instances per the ``OPENSEARCH_HYDRATION_CACHE`` setting, if any."""
+    mode = DEDConfig.hydration_cache()
+    if not mode:
+        return None
+    store = _instance_stores.get(mode)
+    if store is None:
+        store = _instance_stores[mode] = INSTANCE_STORES[mode]()
+    return store
+
+
+def invalidate_instance(sender, instance, using=None, **kwargs):
+    """
+    Drop a saved or deleted instance of an indexed model from the cache of the hydrated instances.
+
+    It's dropped again once the transaction is committed, since a concurrent search may have
+    cached the row it read before the commit in the meantime.
+    """
+    store = get_instance_store()
+    if store is None or sender not in registry.get_models():
+        return
+    pk = instance.pk
+    store.delete(sender, pk)
+    transaction.on_commit(lambda: store.delete(sender, pk), using=using)
+
+
+def connect_instance_cache_signals():
+    post_save.connect(invalidate_instance, dispatch_uid="django_opensearch_models_instance_cache_save")
+    post_delete.connect(invalidate_instance, dispatch_uid="django_opensearch_models_instance_cache_delete")
+
+
+class SearchResponseCache:
+    """
+    Keep the responses of the searches in the Django cache ``OPENSEARCH_SEARCH_CACHE``.
+
+    The keys are made of the searched indices, their generation numbers and a hash of the search,
+    so that all the responses of an index are invalidated at once by incrementing its generation.
+    The searches of aliases, wildcards or other names than the indices of the registered documents
+    use the generation of all the indices, incremented whenever any index is updated.
+    """
+
+    key_prefix = "django_opensearch_models:search:"
+
+    def __init__(self, alias=None):
+        self.alias = alias or DEDConfig.search_cache()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation_key(self, index_name):
+        return f"{self.key_prefix}{index_name}:generation"
+
+    def _generation_keys(self, index_names):
+        index_names = index_names or []
+        known_names = {index._name for index in registry.get_indices()}
+        names = [index_name for index_name in index_names if index_name in known_names]
+        if not index_names or len(names) < len(index_names):
+            names.append("_all")
+        return [self._generation_key(index_name) for index_name in names]
+
+    def _make_key(self, index_names, generations, data):
+        generation_keys = self._generation_keys(index_names)
+        key_data = json.dumps(
+            [index_names, [generations.get(key, 0) for key in generation_keys], data], sort_keys=True, default=str
+        )
+        return self.key_prefix + hashlib.blake2b(key_data.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get_key(self, index_names, data):
+        """Return the key of the response of the search `data` of `index_names`."""
+        generations = self.cache.get_many(self._generation_keys(index_names))
+        return self._make_key(index_names, generations, data)
+
+    async def aget_key(self, index_names, data):
+        generations = await self.cache.aget_many(self._generation_keys(index_names))
+        return self._make_key(index_names, generations, data)
+
+    def invalidate(self, index_name):
+        # The searches of all the indices are invalidated with any index
+        for key in (self._generation_key(index_name), self._generation_key("_all")):
+            self.cache.add(key, 0, timeout=None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # Evicted in between
+                self.cache.set(key, 1, timeout=None)
+
+
+_search_caches = {}
+
+
+def get_search_cache():
+    """Return the cache of the search responses per the ``OPENSEARCH_SEARCH_CACHE`` setting, if any."""
+    alias = DEDConfig.search_cache()
+    if not alias:
+        return None
+    search_cache = _search_caches.get(alias)
+    if search_cache is None:
+        search_cache = _search_caches[alias] = SearchResponseCache(alias)
+    return search_cache
+
+
+def invalidate_search_cache(sender, instance, **kwargs):
+    """Invalidate the cached responses of the searches of the index of the document which was just indexed."""
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        search_cache.invalidate(instance._index._name)
+
+
+def connect_search_cache_signals():
+    post_index.connect(invalidate_search_cache, dispatch_uid="django_opensearch_models_search_cache")
@@ -0,0 +1,20 @@
+from opensearchpy.connection.async_connections import async_connections
+
+from .apps import DEDConfig
+
+
+async def get_async_connection(alias="default"):
+    """
+    Return the ``AsyncOpenSearch`` client of the connection `alias`.
+
+    The clients are created on first use from the ``OPENSEARCH_ASYNC`` setting, or the
+    ``OPENSEARCH`` one, and then reused. Like opensearchpy's connections, a client passed
+    as `alias` is returned as is.
+    """
+    try:
+        return await async_connections.get_connection(alias)
+    except KeyError:
+        connections_settings = DEDConfig.async_connections_settings()
+        if alias not in connections_settings:
+            raise
+        return await async_connections.create_connection(alias, **connections_settings[alias])
@@ -1,11 +1,21 @@
-from collections import deque
+import hashlib
 from fnmatch import fnmatch
 from functools import partial
+from itertools import chain, islice
 
+import django
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models.query import ModelIterable
+from django.db.models.query_utils import DeferredAttribute
 from opensearchpy import Document as OSDocument
-from opensearchpy.helpers import bulk, parallel_bulk
+from opensearchpy.helpers import BulkIndexError, async_bulk, bulk, expand_action, parallel_bulk, streaming_bulk
 
+from .apps import DEDConfig
+from .bulk import NOT_FOUND, AdaptiveChunkSizer, BulkRetrier, collect_results
+from .cache import get_source_hash_store
+from .connections import get_async_connection
 from .exceptions import ModelFieldNotMappedError
 from .fields import (
     BooleanField,
@@ -16,6 +26,7 @@ from .fields import (
     IntegerField,
     KeywordField,
     LongField,
+    ObjectField,
     ShortField,
     TextField,
     TimeField,
@@ -23,6 +34,15 @@ from .fields import (
 from .search import Search
 from .signals import post_index
 
+# Number of actions whose source hashes are looked up at once with the `skip_unchanged` option
+SOURCE_HASH_BATCH_SIZE = 500
+
+# Update script of the 'detect_noop' mode of the `skip_unchanged` option: replace the whole source,
+# like an index action, unless it didn't change
+REPLACE_SOURCE_SCRIPT = (
+    "if (ctx._source.equals(params.source)) { ctx.op = 'none' } else { ctx._source = params.source }"
+)
+
 model_field_class_to_field_class = {
     models.AutoField: IntegerField,
     models.BigAutoField: LongField,
@@ -50,14 +70,64 @@ model_field_class_to_field_class = {
     models.PositiveBigIntegerField: LongField,
 }
 
+# Maximum number of failed items kept in the response of parallel_bulk()
+PARALLEL_BULK_MAX_ERRORS = 100
+
+# Chunk size used when the document doesn't set `queryset_pagination` but one is needed: keyset
+# pagination and iterating over a queryset with prefetched relations.
+DEFAULT_CHUNK_SIZE = 2000
+
+# Arguments of update() and bulk() which the async methods don't support
+SYNC_ONLY_ARGUMENTS = ("parallel", "update_fields", "skip_unchanged", "chunk_sizer", "retrier")
+
+
+class _ValuesRows:
+    """Rows of a ``values_list(named=True)`` queryset, indexed by the values fast path of a document."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def _check_async_arguments(method, kwargs):
+    """Raise a TypeError if `kwargs` has arguments only supported by the sync methods."""
+    unsupported = [name for name in SYNC_ONLY_ARGUMENTS if name in kwargs]
+    if unsupported:
+        msg = f"{method}() doesn't support the {', '.join(unsupported)} argument(s) of the sync methods."
+        raise TypeError(msg)
+
+
+def _get_relation_field(model, name):
+    """Return the relation named `name` on `model` (forward field or reverse accessor), or None."""
+    opts = model._meta
+    for related_object in opts.related_objects:
+        if related_object.get_accessor_name() == name:
+            return related_object
+
+    try:
+        field = opts.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+    # Reverse relations are looked up by their query name, which isn't an attribute of the instance
+    if field.auto_created and not field.concrete:
+        return None
+
+    if not field.is_relation or field.related_model is None:
+        return None
+    return field
+
 
 class DocType(OSDocument):
-    _prepared_fields = []
+    _prepare_plan = None
+    _values_plan = None
+    _serializer = None
 
     def __init__(self, related_instance_to_ignore=None, **kwargs):
         super().__init__(**kwargs)
         self._related_instance_to_ignore = related_instance_to_ignore
-        self._prepared_fields = self.init_prepare()
 
     def __eq__(self, other):
         return id(self) == id(other)
@@ -88,45 +158,247 @@ class DocType(OSDocument):
 
     def get_indexing_queryset(self):
         """Build queryset (iterator) for use by indexing."""
-        qs = self.get_queryset()
-        kwargs = {}
-        if self.django.queryset_pagination:
-            kwargs = {"chunk_size": self.django.queryset_pagination}
-        return qs.iterator(**kwargs)
+        return self.get_indexing_iterator(self.get_queryset())
 
-    def init_prepare(self):
+    def get_indexing_iterator(self, queryset):
         """
-        Initialise the data model preparers once.
+        Iterate over `queryset` for indexing, loading the related objects and paginating as configured.
 
-        Extracts the preparers from the model and generate a list of callables to avoid doing,
-        that work on every object instance over.
+        With the `use_values` Django option, documents made only of plain model columns
+        iterate over ``values_list()`` rows instead of model instances.
         """
-        index_fields = getattr(self, "_fields", {})
-        fields = []
-        for name, field in index_fields.items():
+        values_plan = self.get_values_plan() if self.django.use_values else None
+        use_values = values_plan is not None and self._is_model_queryset(queryset)
+        if use_values:
+            columns = list(dict.fromkeys(column for _name, column in values_plan))
+            qs = queryset.values_list("pk", *columns, named=True)
+        else:
+            qs = self.apply_related_lookups(queryset)
+
+        if self.django.pagination == "keyset":
+            rows = chain.from_iterable(self.get_keyset_chunks(qs))
+        else:
+            kwargs = {}
+            if self.django.queryset_pagination:
+                kwargs = {"chunk_size": self.django.queryset_pagination}
+            elif self.django.prefetch_related:
+                kwargs = {"chunk_size": DEFAULT_CHUNK_SIZE}
+            rows = qs.iterator(**kwargs)
+
+        return _ValuesRows(rows) if use_values else rows
+
+    def get_keyset_chunks(self, queryset, start_after=None):
+        """
+        Yield the objects of `queryset` in lists ordered by primary key.
+
+        Each chunk is fetched with its own ``pk > last_pk LIMIT n`` query, so no
+        database cursor is held open between chunks and the cost of a chunk doesn't
+        grow with its position. The ordering of `queryset` is replaced by the primary key.
+        """
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        queryset = queryset.order_by("pk")
+        last_pk = start_after
+        while True:
+            chunk_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk_qs[:chunk_size])
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_pk = chunk[-1].pk
+
+    @classmethod
+    def get_related_lookups(cls):
+        """
+        Derive the relations to load along with the model from the fields of the document.
+
+        Forward foreign keys and one-to-one relations reachable without crossing a
+        multi-valued relation are returned as ``select_related`` lookups, everything
+        else (reverse foreign keys, many-to-many) as ``prefetch_related`` lookups.
+        """
+        select_related = set()
+        prefetch_related = set()
+
+        def walk(model, index_fields, prefix, selectable):
+            for name, field in index_fields.items():
+                if not isinstance(field, DEDField):
+                    continue
+
+                current_model, lookup, can_select = model, prefix, selectable
+                for attr in field._path or [name]:
+                    relation = _get_relation_field(current_model, attr)
+                    if relation is None:
+                        break
+
+                    lookup = f"{lookup}__{attr}" if lookup else attr
+                    can_select = can_select and (relation.many_to_one or relation.one_to_one)
+                    (select_related if can_select else prefetch_related).add(lookup)
+                    current_model = relation.related_model
+                else:
+                    if isinstance(field, ObjectField):
+                        walk(current_model, field._get_inner_fields(), lookup, can_select)
+
+        walk(cls.django.model, getattr(cls, "_fields", {}), "", selectable=True)
+        return sorted(select_related), sorted(prefetch_related)
+
+    def _is_model_queryset(self, queryset):
+        return queryset.model is self.django.model and issubclass(queryset._iterable_class, ModelIterable)
+
+    def apply_related_lookups(self, queryset):
+        """Load the relations used by the document fields along with `queryset`."""
+        if not self._is_model_queryset(queryset):
+            return queryset
+
+        if self.django.select_related:
+            queryset = queryset.select_related(*self.django.select_related)
+        if self.django.prefetch_related:
+            queryset = queryset.prefetch_related(*self.django.prefetch_related)
+        return queryset
+
+    @classmethod
+    def get_prepare_plan(cls):
+        """
+        Return the data model preparers of the document class.
+
+        The plan is a list of ``(name, field, prepare_method_name, with_related)`` tuples
+        computed once per class, so that creating a document instance doesn't redo that work.
+        """
+        plan = cls.__dict__.get("_prepare_plan")
+        if plan is not None:
+            return plan
+
+        plan = []
+        for name, field in getattr(cls, "_fields", {}).items():
             if not isinstance(field, DEDField):
                 continue
 
             if not field._path:
                 field._path = [name]
 
-            prep_func = getattr(self, f"prepare_{name}_with_related", None)
-            if prep_func:
-                fn = partial(prep_func, related_to_ignore=self._related_instance_to_ignore)
+            if hasattr(cls, f"prepare_{name}_with_related"):
+                plan.append((name, field, f"prepare_{name}_with_related", True))
+            elif hasattr(cls, f"prepare_{name}"):
+                plan.append((name, field, f"prepare_{name}", False))
             else:
-                prep_func = getattr(self, f"prepare_{name}", None)
-                if prep_func:
-                    fn = prep_func
-                else:
-                    fn = partial(field.get_value_from_instance, field_value_to_ignore=self._related_instance_to_ignore)
+                plan.append((name, field, None, False))
+
+        cls._prepare_plan = plan
+        return plan
+
+    @classmethod
+    def get_values_plan(cls):
+        """
+        Return the ``(name, column)`` pairs to build the documents from ``values_list()`` rows.
+
+        Returns None if the document needs model instances: when a field has a `prepare_`
+        method, follows a relation, isn't a plain model column or when the document
+        overrides how instances are turned into actions.
+        """
+        plan = cls.__dict__.get("_values_plan")
+        if plan is None:
+            plan = cls._build_values_plan()
+            # False marks documents which can't use values rows
+            cls._values_plan = plan if plan is not None else False
+        return None if plan is False else plan
+
+    @classmethod
+    def _build_values_plan(cls):
+        for hook in ("generate_id", "should_index_object", "prepare", "_prepare_action"):
+            method, default = getattr(cls, hook), getattr(DocType, hook)
+            if getattr(method, "__func__", method) is not getattr(default, "__func__", default):
+                return None
+
+        plan = []
+        for name, field, method_name, _with_related in cls.get_prepare_plan():
+            if method_name is not None or len(field._path) != 1:
+                return None
+            if type(field).get_value_from_instance is not DEDField.get_value_from_instance:
+                return None
+            try:
+                model_field = cls.django.model._meta.get_field(field._path[0])
+            except FieldDoesNotExist:
+                return None
+            if (
+                not model_field.concrete
+                or model_field.is_relation
+                or model_field.descriptor_class is not DeferredAttribute
+            ):
+                return None
+            plan.append((name, model_field.attname))
+        return plan
+
+    @classmethod
+    def get_update_field_names(cls, update_fields):
+        """
+        Return the names of the document fields affected by saving the model fields `update_fields`.
+
+        Fields with a `prepare_` method or reading an attribute which isn't a model field (a
+        method or a property) are always included, since what they depend on is unknown.
+        Reverse relations and many-to-many fields are never saved with `update_fields`.
+        """
+        model = cls.django.model
+        columns = {}
+        for model_field in model._meta.concrete_fields:
+            columns[model_field.name] = columns[model_field.attname] = model_field
+
+        touched = set()
+        for field_name in update_fields:
+            model_field = columns.get(field_name)
+            if model_field is not None:
+                touched.update((model_field.name, model_field.attname))
+
+        names = []
+        for name, field, method_name, _with_related in cls.get_prepare_plan():
+            attr = field._path[0]
+            if (
+                method_name is not None
+                or attr in touched
+                or (attr not in columns and _get_relation_field(model, attr) is None)
+            ):
+                names.append(name)
+        return names
+
+    def init_prepare(self):
+        """
+        Bind the data model preparers to this instance.
+
+        Returns a list of ``(name, field, callable)`` tuples built from the class preparation plan.
+        """
+        fields = []
+        for name, field, method_name, with_related in self.get_prepare_plan():
+            if method_name is None:
+                fn = partial(field.get_value_from_instance, field_value_to_ignore=self._related_instance_to_ignore)
+            elif with_related:
+                fn = partial(getattr(self, method_name), related_to_ignore=self._related_instance_to_ignore)
+            else:
+                fn = getattr(self, method_name)
 
             fields.append((name, field, fn))
 
         return fields
 
+    @property
+    def _prepared_fields(self):
+        return self.init_prepare()
+
     def prepare(self, instance):
         """Turn instance it into a dict that can be serialized based on the fields defined on this DocType subclass."""
-        return {name: prep_func(instance) for name, field, prep_func in self._prepared_fields}
+        return self._prepare_fields(instance)
+
+    def _prepare_fields(self, instance, names=None):
+        """Prepare the fields of the document, or only the ones in `names`."""
+        related_to_ignore = self._related_instance_to_ignore
+        data = {}
+        for name, field, method_name, with_related in self.get_prepare_plan():
+            if names is not None and name not in names:
+                continue
+            if method_name is None:
+                data[name] = field.get_value_from_instance(instance, field_value_to_ignore=related_to_ignore)
+            elif with_related:
+                data[name] = getattr(self, method_name)(instance, related_to_ignore=related_to_ignore)
+            else:
+                data[name] = getattr(self, method_name)(instance)
+        return data
 
     @classmethod
     def get_model_field_class_to_field_class(cls):
@@ -150,22 +422,159 @@ class DocType(OSDocument):
             msg = f"Cannot convert model field {field_name} to an OpenSearch field!"
             raise ModelFieldNotMappedError(msg) from e
 
+    def _get_chunk_sizer(self, kwargs):
+        """
+        Pop the `chunk_sizer` argument, defaulting to a new sizer if the document uses adaptive bulk sizing.
+
+        A `chunk_sizer` of False disables the adaptive sizing of a document using it.
+        """
+        chunk_sizer = kwargs.pop("chunk_sizer", None)
+        if chunk_sizer is None and self.django.adaptive_bulk:
+            chunk_sizer = AdaptiveChunkSizer.from_settings()
+        return chunk_sizer or None
+
+    @classmethod
+    def get_serializer(cls):
+        """
+        Return the serializer encoding the bulk actions of the document, ``OPENSEARCH_SERIALIZER`` by default.
+
+        The serializer is created once per document class.
+        """
+        serializer = cls.__dict__.get("_serializer")
+        if serializer is None:
+            serializer = cls._serializer = DEDConfig.serializer()
+        return serializer
+
+    def _decode_errors(self, errors):
+        """
+        Decode the sources of the failed items, encoded by the expand callback, back to dicts.
+
+        Works in place on the items of bulk errors and returns them.
+        """
+        if not isinstance(errors, list):
+            return errors
+        loads = self.get_serializer().loads
+        for error in errors:
+            for info in error.values():
+                if isinstance(info, dict) and isinstance(info.get("data"), str):
+                    info["data"] = loads(info["data"])
+        return errors
+
+    def _decode_results(self, results):
+        """Yield the ``(ok, item)`` results of a streaming bulk with the sources of the failed items decoded."""
+        try:
+            for ok, item in results:
+                if not ok:
+                    self._decode_errors([item])
+                yield ok, item
+        except BulkIndexError as e:
+            self._decode_errors(e.errors)
+            raise
+
+    def _get_expand_action(self):
+        """
+        Return a callback turning an action in its bulk lines, like opensearchpy's expand_action().
+
+        The lines are encoded with the serializer of the document, so that the bulk helpers
+        send them as they are instead of encoding them again.
+        """
+        dumps = self.get_serializer().dumps
+
+        def expand(data):
+            action, source = expand_action(data)
+            return dumps(action), None if source is None else dumps(source)
+
+        return expand
+
+    def _streaming_bulk(self, actions, parallel=False, chunk_sizer=None, **kwargs):
+        """Yield an ``(ok, item)`` tuple for each action, in the order of the actions."""
+        client = self._get_connection()
+        kwargs.setdefault("expand_action_callback", self._get_expand_action())
+        if chunk_sizer is not None:
+            if parallel:
+                kwargs.setdefault("thread_count", 4)
+            results = chunk_sizer.streaming_bulk(client, actions, **kwargs)
+        elif parallel:
+            if self.django.queryset_pagination and "chunk_size" not in kwargs:
+                kwargs["chunk_size"] = self.django.queryset_pagination
+            results = parallel_bulk(client=client, actions=actions, **kwargs)
+        else:
+            results = streaming_bulk(client=client, actions=actions, **kwargs)
+        return self._decode_results(results)
+
     def bulk(self, actions, **kwargs):
-        response = bulk(client=self._get_connection(), actions=actions, **kwargs)
+        chunk_sizer = self._get_chunk_sizer(kwargs)
+        retrier = kwargs.pop("retrier", None) or BulkRetrier.from_settings()
+        if retrier is not None:
+            stats_only = kwargs.pop("stats_only", False)
+            raise_on_error = kwargs.pop("raise_on_error", True)
+            send = partial(self._streaming_bulk, chunk_sizer=chunk_sizer, **kwargs)
+            response = retrier.bulk(send, actions, stats_only=stats_only, raise_on_error=raise_on_error)
+        else:
+            kwargs.setdefault("expand_action_callback", self._get_expand_action())
+            try:
+                if chunk_sizer is not None:
+                    response = chunk_sizer.bulk(self._get_connection(), actions, **kwargs)
+                else:
+                    response = bulk(client=self._get_connection(), actions=actions, **kwargs)
+            except BulkIndexError as e:
+                self._decode_errors(e.errors)
+                raise
+            self._decode_errors(response[1])
         # send post index signal
         post_index.send(sender=self.__class__, instance=self, actions=actions, response=response)
         return response
 
-    def parallel_bulk(self, actions, **kwargs):
-        if self.django.queryset_pagination and "chunk_size" not in kwargs:
-            kwargs["chunk_size"] = self.django.queryset_pagination
-        bulk_actions = parallel_bulk(client=self._get_connection(), actions=actions, **kwargs)
-        # As the `parallel_bulk` is lazy, we need to get it into `deque` to run it instantly
-        # See https://discuss.elastic.co/t/helpers-parallel-bulk-in-python-not-working/39498/2
-        deque(bulk_actions, maxlen=0)
-        # Fake return value to emulate bulk() since we don't have a result yet,
-        # the result is currently not used upstream anyway.
-        return (1, [])
+    async def abulk(self, actions, **kwargs):
+        """
+        Async counterpart of bulk(), sending the actions with the async client of the connection.
+
+        `actions` may be an async iterable. The bulk requests are neither sized adaptively nor
+        sent to the dead-letter sink, the rejected actions are retried per the
+        ``OPENSEARCH_BULK_MAX_RETRIES`` settings by the opensearchpy async helper.
+        """
+        _check_async_arguments("abulk", kwargs)
+        retrier = BulkRetrier.from_settings()
+        if retrier is not None and retrier.max_retries:
+            kwargs.setdefault("max_retries", retrier.max_retries)
+            kwargs.setdefault("initial_backoff", retrier.initial_backoff)
+            kwargs.setdefault("max_backoff", retrier.max_backoff)
+        kwargs.setdefault("expand_action_callback", self._get_expand_action())
+        client = await get_async_connection(self._get_using())
+        try:
+            response = await async_bulk(client, actions, **kwargs)
+        except BulkIndexError as e:
+            self._decode_errors(e.errors)
+            raise
+        self._decode_errors(response[1])
+        # send post index signal
+        if hasattr(post_index, "asend"):
+            await post_index.asend(sender=self.__class__, instance=self, actions=actions, response=response)
+        else:
+            post_index.send(sender=self.__class__, instance=self, actions=actions, response=response)
+        return response
+
+    def parallel_bulk(self, actions, stats_only=False, max_errors=PARALLEL_BULK_MAX_ERRORS, on_error=None, **kwargs):
+        """
+        Index `actions` with several threads and return the same ``(success, errors)`` shape as bulk().
+
+        The per-item results are counted as they are streamed, only the first `max_errors`
+        failed items are kept, but `on_error` is called with each of them. With `stats_only`,
+        the number of failed items is returned instead of the list of errors.
+        """
+        chunk_sizer = self._get_chunk_sizer(kwargs)
+        retrier = kwargs.pop("retrier", None) or BulkRetrier.from_settings()
+        if retrier is not None:
+            raise_on_error = kwargs.pop("raise_on_error", True)
+            send = partial(self._streaming_bulk, parallel=True, chunk_sizer=chunk_sizer, **kwargs)
+            results = retrier.streaming_bulk(send, actions, raise_on_error=raise_on_error)
+        else:
+            results = self._streaming_bulk(actions, parallel=True, chunk_sizer=chunk_sizer, **kwargs)
+
+        response = collect_results(results, stats_only=stats_only, max_errors=max_errors, on_error=on_error)
+        # send post index signal
+        post_index.send(sender=self.__class__, instance=self, actions=actions, response=response)
+        return response
 
     @classmethod
     def generate_id(cls, object_instance):
@@ -186,11 +595,42 @@ class DocType(OSDocument):
             "_source": (self.prepare(object_instance) if action != "delete" else None),
         }
 
+    def _get_values_actions(self, rows, action):
+        """Build the actions straight from the ``values_list()`` rows of the values fast path."""
+        index_name = self._index._name
+        plan = self.get_values_plan()
+        for row in rows:
+            yield {
+                "_op_type": action,
+                "_index": index_name,
+                "_id": row.pk,
+                "_source": {name: getattr(row, column) for name, column in plan} if action != "delete" else None,
+            }
+
     def _get_actions(self, object_list, action):
         for object_instance in object_list:
             if action == "delete" or self.should_index_object(object_instance):
                 yield self._prepare_action(object_instance, action)
 
+    async def _aget_actions(self, object_list, action):
+        """Async counterpart of _get_actions(), reading the querysets and async iterables with the async ORM."""
+        if isinstance(object_list, models.QuerySet) and object_list._result_cache is None:
+            queryset = self.apply_related_lookups(object_list)
+            if queryset._prefetch_related_lookups and django.VERSION < (5, 0):
+                # aiterator() doesn't support prefetch_related() before Django 5.0, load all the objects at once
+                object_list = [object_instance async for object_instance in queryset]
+            else:
+                object_list = queryset.aiterator(chunk_size=self.django.queryset_pagination or DEFAULT_CHUNK_SIZE)
+
+        if isinstance(object_list, models.QuerySet) or not hasattr(object_list, "__aiter__"):
+            for action_data in self._get_actions(object_list, action):
+                yield action_data
+            return
+
+        async for object_instance in object_list:
+            if action == "delete" or self.should_index_object(object_instance):
+                yield self._prepare_action(object_instance, action)
+
     def get_actions(self, object_list, action):
         """Generate the OpenSearch payload."""
         return self._get_actions(object_list, action)
@@ -205,16 +645,222 @@ class DocType(OSDocument):
         """Determine, whether the object should be indexed."""
         return True
 
-    def update(self, thing, refresh=None, action="index", parallel=False, **kwargs):
-        """Update each document in OpenSearch for a model, iterable of models or queryset."""
+    @classmethod
+    def get_source_hash_store(cls):
+        """Return the store of the hashes of the indexed sources, if the `skip_unchanged` option uses one."""
+        if cls.django.skip_unchanged in {"cache", "local"}:
+            return get_source_hash_store(cls.django.skip_unchanged)
+        return None
+
+    @classmethod
+    def _source_hash_namespace(cls):
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    @classmethod
+    def clear_source_hashes(cls):
+        """Forget the hashes of the indexed sources, so that the next updates send every document."""
+        store = cls.get_source_hash_store()
+        if store is not None:
+            store.invalidate(cls._source_hash_namespace())
+
+    def _forget_source_hashes(self, actions):
+        """Forget the hashes of the sources of `actions` (deletions, partial updates) as they are sent."""
+        store = self.get_source_hash_store()
+        if store is None:
+            yield from actions
+            return
+
+        namespace = self._source_hash_namespace()
+        actions = iter(actions)
+        while batch := list(islice(actions, SOURCE_HASH_BATCH_SIZE)):
+            store.delete_many(namespace, [str(action["_id"]) for action in batch])
+            yield from batch
+
+    def _bulk_changed(self, actions, parallel=False, **kwargs):
+        """
+        Send only the actions whose source changed since it was last indexed, per the `skip_unchanged` option.
+
+        The hash of the source of each action is compared to the one stored when it was last
+        indexed, and stored once the action is acknowledged. In the 'detect_noop' mode, the actions
+        are sent as scripted updates replacing the whole source, which OpenSearch ignores when they
+        don't change the document.
+        """
+        store = self.get_source_hash_store()
+        if store is None:
+            updates = (
+                {
+                    **action,
+                    "_op_type": "update",
+                    "_source": {
+                        "script": {
+                            "source": REPLACE_SOURCE_SCRIPT,
+                            "lang": "painless",
+                            "params": {"source": action["_source"]},
+                        },
+                        "upsert": action["_source"],
+                    },
+                }
+                for action in actions
+            )
+            return self._bulk(updates, parallel=parallel, **kwargs)
+
+        namespace = self._source_hash_namespace()
+        dumps = self.get_serializer().dumps
+        hashes = {}
+
+        def changed_actions():
+            actions_iter = iter(actions)
+            while batch := list(islice(actions_iter, SOURCE_HASH_BATCH_SIZE)):
+                batch_hashes = {
+                    str(action["_id"]): hashlib.blake2b(
+                        dumps(action["_source"]).encode("utf-8"), digest_size=16
+                    ).hexdigest()
+                    for action in batch
+                }
+                indexed_hashes = store.get_many(namespace, list(batch_hashes))
+                for action in batch:
+                    id_ = str(action["_id"])
+                    if indexed_hashes.get(id_) != batch_hashes[id_]:
+                        hashes[id_] = batch_hashes[id_]
+                        yield action
+
+        def forget_failed(error):
+            for info in error.values():
+                hashes.pop(str(info.get("_id")), None)
+
+        if parallel:
+            # parallel_bulk() only returns a sample of the errors, they're forgotten as they're streamed
+            kwargs["on_error"] = forget_failed
+        success, errors = self._bulk(changed_actions(), parallel=parallel, **kwargs)
+
+        if isinstance(errors, list):
+            for error in errors:
+                forget_failed(error)
+        elif errors and not parallel:
+            # Only counted with stats_only, the failed actions are unknown
+            hashes.clear()
+        if hashes:
+            store.set_many(namespace, hashes)
+        return success, errors
+
+    def _partial_update(self, instance, update_fields, **kwargs):
+        """
+        Send only the document fields affected by saving the `update_fields` of `instance`.
+
+        The whole document is indexed instead if it's missing from the index.
+        """
+        names = set(self.get_update_field_names(update_fields))
+        if not names or not self.should_index_object(instance):
+            return 0, []
+
+        action = {
+            "_op_type": "update",
+            "_index": self._index._name,
+            "_id": self.generate_id(instance),
+            "_source": {"doc": self._prepare_fields(instance, names)},
+        }
+        raise_on_error = kwargs.pop("raise_on_error", True)
+        success, errors = self._bulk(list(self._forget_source_hashes([action])), raise_on_error=False, **kwargs)
+
+        statuses = [info.get("status") for error in errors for info in error.values()]
+        if statuses and all(status == NOT_FOUND for status in statuses):
+            return self.update(instance, raise_on_error=raise_on_error, **kwargs)
+        if errors and raise_on_error:
+            msg = f"{len(errors)} document(s) failed to index."
+            raise BulkIndexError(msg, errors)
+        return success, errors
+
+    def update(
+        self, thing, refresh=None, action="index", parallel=False, update_fields=None, skip_unchanged=True, **kwargs
+    ):
+        """
+        Update each document in OpenSearch for a model, iterable of models or queryset.
+
+        With the `partial_updates` Django option, a model instance saved with `update_fields`
+        is sent as a partial update of the document fields depending on them. With the
+        `skip_unchanged` Django option, documents whose source didn't change since they were
+        last indexed are skipped, unless `skip_unchanged` is False.
+        """
+        if refresh is not None:
+            kwargs["refresh"] = refresh
+        elif self.django.auto_refresh:
+            kwargs["refresh"] = self.django.auto_refresh
+
+        if (
+            update_fields is not None
+            and action == "index"
+            and self.django.partial_updates
+            and isinstance(thing, models.Model)
+            and type(self).prepare is DocType.prepare
+        ):
+            return self._partial_update(thing, update_fields, **kwargs)
+
+        if isinstance(thing, _ValuesRows):
+            actions = self._get_values_actions(thing, action)
+        else:
+            if isinstance(thing, models.Model):
+                object_list = [thing]
+            elif isinstance(thing, models.QuerySet) and thing._result_cache is None:
+                object_list = self.apply_related_lookups(thing)
+            else:
+                object_list = thing
+            actions = self._get_actions(object_list, action)
+
+        if self.django.skip_unchanged:
+            if skip_unchanged and action == "index":
+                return self._bulk_changed(actions, parallel=parallel, **kwargs)
+            if action != "index":
+                actions = self._forget_source_hashes(actions)
+        return self._bulk(actions, parallel=parallel, **kwargs)
+
+    def delete_ids(self, ids, index=None, refresh=None, **kwargs):
+        """
+        Delete the documents `ids` from `index` (the index of the document by default).
+
+        Unlike update(), no model instance is needed, e.g. once their rows are deleted.
+        """
+        if refresh is not None:
+            kwargs["refresh"] = refresh
+        elif self.django.auto_refresh:
+            kwargs["refresh"] = self.django.auto_refresh
+
+        index_name = index or self._index._name
+        actions = ({"_op_type": "delete", "_index": index_name, "_id": id_, "_source": None} for id_ in ids)
+        return self._bulk(self._forget_source_hashes(actions), **kwargs)
+
+    async def aupdate(self, thing, refresh=None, action="index", **kwargs):
+        """
+        Async counterpart of update(), for ASGI views and tasks.
+
+        `thing` may also be an async iterable of models. Querysets are read with the async ORM and
+        the actions sent with the async client, so prepare() must not query the database: load the
+        relations used by the document with the `select_related` and `prefetch_related` options.
+        The arguments of update() only supported by the sync methods raise a TypeError.
+        """
+        _check_async_arguments("aupdate", kwargs)
         if refresh is not None:
             kwargs["refresh"] = refresh
         elif self.django.auto_refresh:
             kwargs["refresh"] = self.django.auto_refresh
 
         object_list = [thing] if isinstance(thing, models.Model) else thing
+        actions = self._aget_actions(object_list, action)
+        store = self.get_source_hash_store()
+        if store is None:
+            return await self.abulk(actions, **kwargs)
+
+        # The source hashes aren't stored by the async methods, forget the ones of the sent documents
+        ids = []
 
-        return self._bulk(self._get_actions(object_list, action), parallel=parallel, **kwargs)
+        async def tracked_actions():
+            async for action_data in actions:
+                ids.append(str(action_data["_id"]))
+                yield action_data
+
+        try:
+            return await self.abulk(tracked_actions(), **kwargs)
+        finally:
+            await sync_to_async(store.delete_many)(self._source_hash_namespace(), ids)
 
 
 # Alias of DocType. Need to remove DocType in 7.x
@@ -1,3 +1,4 @@
+from operator import attrgetter, itemgetter
 from types import MethodType
 
 from django.core.exceptions import ObjectDoesNotExist
@@ -29,11 +30,19 @@ from opensearchpy import (
 
 from .exceptions import VariableLookupError
 
+_LOOKUP_ERRORS = (TypeError, AttributeError, KeyError, ValueError, IndexError)
+_MISSING = object()
+
+# Maximum number of accessors cached by a field
+_MAX_ACCESSORS = 64
+
 
 class DEDField(Field):
     def __init__(self, attr=None, **kwargs):
         super().__init__(**kwargs)
         self._path = attr.split(".") if attr else []
+        # Accessor resolved for each (path position, class of the object looked up)
+        self._accessors = {}
 
     def __setattr__(self, key, value):
         if key == "get_value_from_instance":
@@ -41,28 +50,66 @@ class DEDField(Field):
         else:
             super().__setattr__(key, value)
 
+    def _resolve_attr(self, instance, attr, position):
+        """
+        Look up `attr` on `instance` trying a key, an attribute then an index.
+
+        For models (without ``__getitem__``) and plain dicts, whose lookup can't change from one
+        object to the next, the kind of lookup that succeeded is cached for the class of
+        `instance`, so the following lookups at that position of the path are direct. The other
+        objects always go through the lookups in order.
+        """
+        try:
+            value = instance[attr]
+        except _LOOKUP_ERRORS:
+            try:
+                value = getattr(instance, attr)
+            except ObjectDoesNotExist:
+                raise
+            except (TypeError, AttributeError):
+                try:
+                    value = instance[int(attr)]
+                except (IndexError, ValueError, KeyError, TypeError) as e:
+                    if self._required:
+                        msg = f"Failed lookup for key [{attr}] in {instance!r}"
+                        raise VariableLookupError(msg) from e
+                    return _MISSING
+                accessor = itemgetter(int(attr))
+            else:
+                accessor = attrgetter(attr)
+        else:
+            accessor = itemgetter(attr)
+
+        cls = type(instance)
+        cacheable = cls is dict or (issubclass(cls, models.Model) and not hasattr(cls, "__getitem__"))
+        if cacheable and len(self._accessors) < _MAX_ACCESSORS:
+            self._accessors[position, cls] = accessor
+        return value
+
     def get_value_from_instance(self, instance, field_value_to_ignore=None):
         """Given an model instance to index with ES, return the value that should be put into ES for this field."""
         if not instance:
             return None
 
-        for attr in self._path:
+        accessors = self._accessors
+        for position, attr in enumerate(self._path):
+            accessor = accessors.get((position, type(instance)))
             try:
-                instance = instance[attr]
-            except (TypeError, AttributeError, KeyError, ValueError, IndexError):
-                try:
-                    instance = getattr(instance, attr)
-                except ObjectDoesNotExist:
-                    return None
-                except (TypeError, AttributeError):
+                if accessor is None:
+                    instance = self._resolve_attr(instance, attr, position)
+                else:
                     try:
-                        instance = instance[int(attr)]
-                    except (IndexError, ValueError, KeyError, TypeError) as e:
-                        if self._required:
-                            msg = f"Failed lookup for key [{attr}] in {instance!r}"
-                            raise VariableLookupError(msg) from e
-                        return None
+                        instance = accessor(instance)
+                    except ObjectDoesNotExist:
+                        raise
+                    except _LOOKUP_ERRORS:
+                        # The cached accessor doesn't fit this object, fall back to the generic lookup
+                        instance = self._resolve_attr(instance, attr, position)
+            except ObjectDoesNotExist:
+                return None
 
+            if instance is _MISSING:
+                return None
             if isinstance(instance, models.manager.Manager):
                 instance = instance.all()
             elif callable(instance):
@@ -81,11 +128,17 @@ class DEDField(Field):
 
 
 class ObjectField(DEDField, Object):
+    def _get_inner_fields(self):
+        """Return the mapping of inner field names to field instances."""
+        if hasattr(self, "properties"):
+            return self.properties.to_dict()
+        return self._doc_class._doc_type.mapping.properties._params.get("properties", {})
+
     def _get_inner_field_data(self, obj, field_value_to_ignore=None):
         data = {}
 
         if hasattr(self, "properties"):
-            for name, field in self.properties.to_dict().items():
+            for name, field in self._get_inner_fields().items():
                 if not isinstance(field, DEDField):
                     continue
 
@@ -95,7 +148,7 @@ class ObjectField(DEDField, Object):
                 data[name] = field.get_value_from_instance(obj, field_value_to_ignore)
         else:
             doc_instance = self._doc_class()
-            for name, field in self._doc_class._doc_type.mapping.properties._params.get("properties", {}).items():
+            for name, field in self._get_inner_fields().items():
                 if not isinstance(field, DEDField):
                     continue
 
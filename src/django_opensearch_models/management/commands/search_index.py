@@ -1,9 +1,124 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import django
+from django.apps import apps
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections as db_connections
 from django.utils import timezone
 from opensearchpy import connections
-
-from django_opensearch_models.registries import registry
+from opensearchpy.exceptions import NotFoundError
+from opensearchpy.helpers import streaming_bulk
+
+from django_opensearch_models.apps import DEDConfig
+from django_opensearch_models.bulk import AdaptiveChunkSizer, BulkRetrier, MemoryDeadLetterSink, describe_requests
+from django_opensearch_models.registries import get_document_key, registry
+
+# Number of errors reported by a '--processes' worker
+MAX_SHARD_ERRORS = 10
+
+
+def _get_mp_context():
+    """
+    Return the start method of the '--processes' workers: fork where available.
+
+    Forked workers inherit the configured Django project, including settings configured
+    without ``DJANGO_SETTINGS_MODULE``. Spawned workers set Django up from ``DJANGO_SETTINGS_MODULE``.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_worker():
+    """Set up Django and new database and OpenSearch connections in a '--processes' worker."""
+    if not apps.ready:
+        django.setup()
+    # Connections inherited from the parent process must not be shared
+    db_connections.close_all()
+    for alias, kwargs in settings.OPENSEARCH.items():
+        connections.create_connection(alias, **kwargs)
+
+
+def _populate_shard(doc_key, index_name, lower, upper, refresh, parallel=False, adaptive_bulk=False):
+    """
+    Index the objects of a document with ``lower <= pk < upper`` in a '--processes' worker.
+
+    Returns the number of indexed objects, the number of errors, a sample of the errors and the
+    ``(docs, size)`` of the sent bulk requests with `adaptive_bulk`.
+    """
+    doc = next(doc for doc in registry.get_documents() if get_document_key(doc) == doc_key)
+    doc._index._name = index_name
+
+    doc_instance = doc()
+    qs = doc_instance.get_queryset()
+    if lower is not None:
+        qs = qs.filter(pk__gte=lower)
+    if upper is not None:
+        qs = qs.filter(pk__lt=upper)
+
+    update_kwargs = {"refresh": refresh, "raise_on_error": False, "parallel": parallel}
+    chunk_sizer = None
+    if adaptive_bulk:
+        chunk_sizer = update_kwargs["chunk_sizer"] = AdaptiveChunkSizer.from_settings()
+    elif doc.django.adaptive_bulk:
+        update_kwargs["chunk_sizer"] = False
+    if doc.django.skip_unchanged:
+        update_kwargs["skip_unchanged"] = False
+    success, errors = doc_instance.update(doc_instance.get_indexing_iterator(qs), **update_kwargs)
+    requests = chunk_sizer.requests if chunk_sizer is not None else []
+    return success, len(errors), errors[:MAX_SHARD_ERRORS], requests
+
+
+class Checkpoint:
+    """
+    Progress of a resumable populate/rebuild, persisted in a JSON file.
+
+    It records the concrete index name used for each index and, for each document,
+    the concrete index it is populating (never an alias, which may be moved between
+    runs) and the primary key of the last acknowledged chunk.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.indices = {}
+        self.documents = {}
+
+    def exists(self):
+        return self.path.exists()
+
+    def load(self):
+        data = json.loads(self.path.read_text())
+        self.indices = data.get("indices", {})
+        self.documents = data.get("documents", {})
+
+    def save(self):
+        data = {"indices": self.indices, "documents": self.documents}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, cls=DjangoJSONEncoder))
+        # Replace the file atomically so that a crash never leaves a truncated checkpoint
+        tmp_path.replace(self.path)
+
+    def clear(self):
+        self.indices = {}
+        self.documents = {}
+        self.path.unlink(missing_ok=True)
+
+    def get_document(self, doc, index_name):
+        """Return the checkpoint of `doc`, or None if it has none for the concrete index `index_name`."""
+        checkpoint = self.documents.get(get_document_key(doc))
+        if checkpoint is None or checkpoint["index"] != index_name:
+            return None
+        return checkpoint
+
+    def set_document(self, doc, index_name, last_pk, done=False):
+        self.documents[get_document_key(doc)] = {"index": index_name, "last_pk": last_pk, "done": done}
+        self.save()
 
 
 class Command(BaseCommand):
@@ -41,6 +156,20 @@ class Command(BaseCommand):
             const="rebuild",
             help="Delete the indices and then recreate and populate them",
         )
+        parser.add_argument(
+            "--replay-failed",
+            action="store_const",
+            dest="action",
+            const="replay_failed",
+            help="Send again the actions stored in the dead-letter sink (OPENSEARCH_DEAD_LETTER_SINK)",
+        )
+        parser.add_argument(
+            "--drain-outbox",
+            action="store_const",
+            dest="action",
+            const="drain_outbox",
+            help="Send the index updates written to the outbox by the OutboxSignalProcessor",
+        )
         parser.add_argument("-f", action="store_true", dest="force", help="Force operations without asking")
         parser.add_argument(
             "--parallel", action="store_true", dest="parallel", help="Run populate/rebuild update multi threaded"
@@ -59,6 +188,20 @@ class Command(BaseCommand):
             """,
         )
         parser.set_defaults(parallel=getattr(settings, "OPENSEARCH_PARALLEL", False))
+        parser.add_argument(
+            "--adaptive-bulk",
+            action="store_true",
+            dest="adaptive_bulk",
+            help="Size the bulk requests by bytes, adapting the size to the response times of the cluster",
+        )
+        parser.add_argument(
+            "--no-adaptive-bulk",
+            action="store_false",
+            dest="adaptive_bulk",
+            help="Size the bulk requests by number of documents",
+        )
+        # None: the `adaptive_bulk` option of each document, OPENSEARCH_ADAPTIVE_BULK by default
+        parser.set_defaults(adaptive_bulk=None)
         parser.add_argument(
             "--refresh",
             action="store_true",
@@ -66,6 +209,32 @@ class Command(BaseCommand):
             default=None,
             help="Refresh indices after populate/rebuild",
         )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            dest="resume",
+            help="""
+                Populate/rebuild in primary key order, saving a checkpoint after each
+                indexed chunk, and continue from the checkpoint of a previous
+                interrupted run if there is one
+            """,
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            dest="checkpoint_file",
+            default=getattr(settings, "OPENSEARCH_CHECKPOINT_FILE", ".search_index_checkpoint.json"),
+            help="File where the '--resume' checkpoint is stored",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            dest="processes",
+            default=getattr(settings, "OPENSEARCH_PROCESSES", 1),
+            help="""
+                Split the objects of each document into primary key ranges and
+                populate/rebuild them in this number of worker processes
+            """,
+        )
         parser.add_argument(
             "--no-count",
             action="store_false",
@@ -73,6 +242,20 @@ class Command(BaseCommand):
             dest="count",
             help="Do not include a total count in the summary log line",
         )
+        parser.add_argument(
+            "--outbox-batch-size",
+            type=int,
+            dest="outbox_batch_size",
+            default=1000,
+            help="Number of outbox entries claimed and sent at once by '--drain-outbox'",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            dest="poll_interval",
+            default=None,
+            help="Keep draining the outbox, checking for new entries every this number of seconds",
+        )
 
     def _get_models(self, args):
         """Get Models from registry that match the --models args."""
@@ -111,9 +294,22 @@ class Command(BaseCommand):
                     "alias to make index name available."
                 )
 
-    def _populate(self, models, options):
+    def _populate(self, models, options, checkpoint=None):
         parallel = options["parallel"]
+        # The checkpoint of a rebuild is cleared by _rebuild once the aliases are updated
+        clear_checkpoint = checkpoint is None
+        if options["resume"] and checkpoint is None:
+            checkpoint = self._get_checkpoint(options)
+
         for doc in registry.get_documents(models):
+            index_name = doc_checkpoint = None
+            if checkpoint is not None:
+                index_name = self._get_concrete_index(doc._index._name)
+                doc_checkpoint = checkpoint.get_document(doc, index_name)
+            if doc_checkpoint and doc_checkpoint["done"]:
+                self.stdout.write(f"Skipping '{doc.django.model.__name__}' objects, already indexed")
+                continue
+
             self.stdout.write(
                 "Indexing {} '{}' objects {}".format(
                     doc().get_queryset().count() if options["count"] else "all",
@@ -121,8 +317,168 @@ class Command(BaseCommand):
                     "(parallel)" if parallel else "",
                 )
             )
-            qs = doc().get_indexing_queryset()
-            doc().update(qs, parallel=parallel, refresh=options["refresh"])
+            update_kwargs = {"parallel": parallel, "refresh": options["refresh"]}
+            chunk_sizer = None
+            adaptive_bulk = options["adaptive_bulk"]
+            if adaptive_bulk is None:
+                adaptive_bulk = doc.django.adaptive_bulk
+            if adaptive_bulk:
+                # Shared by all the bulk requests of the document so that they report their sizes
+                chunk_sizer = update_kwargs["chunk_sizer"] = AdaptiveChunkSizer.from_settings()
+            elif doc.django.adaptive_bulk:
+                # --no-adaptive-bulk
+                update_kwargs["chunk_sizer"] = False
+            if doc.django.skip_unchanged:
+                # The index may have been recreated or the documents changed since the source hashes were stored
+                doc.clear_source_hashes()
+                update_kwargs["skip_unchanged"] = False
+
+            if checkpoint is not None:
+                self._populate_resumable(doc, index_name, checkpoint, doc_checkpoint, update_kwargs)
+            elif options["processes"] > 1:
+                self._populate_processes(doc, options, adaptive_bulk=chunk_sizer is not None)
+                # The bulk requests sent by the workers are summarized by _populate_processes()
+                chunk_sizer = None
+            else:
+                qs = doc().get_indexing_queryset()
+                success, errors = doc().update(qs, **update_kwargs)
+                self.stdout.write(f"Indexed {success} '{doc.django.model.__name__}' objects, {len(errors)} errors")
+
+            if chunk_sizer is not None:
+                self.stdout.write(f"Sent {chunk_sizer.summary()}")
+
+        if checkpoint is not None and clear_checkpoint:
+            checkpoint.clear()
+
+    def _get_shard_ranges(self, doc, shards):
+        """Split the objects of `doc` in up to `shards` ``(lower, upper)`` primary key ranges of similar sizes."""
+        pks = doc().get_queryset().order_by("pk").values_list("pk", flat=True)
+        count = pks.count()
+        bounds = [None]
+        for i in range(1, shards):
+            position = count * i // shards
+            if position == 0:
+                continue
+            bound = pks[position]
+            if bound != bounds[-1]:
+                bounds.append(bound)
+        bounds.append(None)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _populate_processes(self, doc, options, adaptive_bulk=False):
+        """Index the objects of `doc` in worker processes, each one handling a range of primary keys."""
+        ranges = self._get_shard_ranges(doc, options["processes"])
+        doc_key = get_document_key(doc)
+
+        # Don't share the database connection of this process with the workers
+        db_connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options["processes"], mp_context=_get_mp_context(), initializer=_init_worker
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _populate_shard,
+                    doc_key,
+                    doc._index._name,
+                    lower,
+                    upper,
+                    options["refresh"],
+                    options["parallel"],
+                    adaptive_bulk,
+                )
+                for lower, upper in ranges
+            ]
+            results = [future.result() for future in futures]
+
+        model_name = doc.django.model.__name__
+        success = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        self.stdout.write(f"Indexed {success} '{model_name}' objects in {len(ranges)} processes, {failed} errors")
+        if adaptive_bulk:
+            requests = [request for result in results for request in result[3]]
+            self.stdout.write(f"Sent {describe_requests(requests)}")
+        if failed:
+            errors = [error for result in results for error in result[2]]
+            msg = f"{failed} '{model_name}' objects failed to be indexed, for example: {errors}"
+            raise CommandError(msg)
+
+    def _get_checkpoint(self, options):
+        checkpoint = Checkpoint(options["checkpoint_file"])
+        if checkpoint.exists():
+            checkpoint.load()
+        return checkpoint
+
+    def _populate_resumable(self, doc, index_name, checkpoint, doc_checkpoint, update_kwargs):
+        """
+        Index the objects of `doc` chunk by chunk, recording the last indexed primary key after each chunk.
+
+        The chunks are read from ``get_queryset()`` by primary key: an overridden
+        ``get_indexing_queryset()`` and the ``use_values`` rows are not used in this mode.
+        """
+        last_pk = None
+        if doc_checkpoint:
+            last_pk = doc_checkpoint["last_pk"]
+            self.stdout.write(f"Resuming after primary key {last_pk} into index '{index_name}'")
+
+        doc_instance = doc()
+        qs = doc_instance.apply_related_lookups(doc_instance.get_queryset())
+        for chunk in doc_instance.get_keyset_chunks(qs, start_after=last_pk):
+            doc_instance.update(chunk, **update_kwargs)
+            last_pk = chunk[-1].pk
+            checkpoint.set_document(doc, index_name, last_pk)
+
+        checkpoint.set_document(doc, index_name, last_pk, done=True)
+
+    def _replay_failed(self, options):
+        """Send again the actions of the dead-letter sink, keeping there only the ones which fail again."""
+        sink = DEDConfig.dead_letter_sink()
+        if sink is None:
+            msg = "No dead-letter sink configured, set OPENSEARCH_DEAD_LETTER_SINK."
+            raise CommandError(msg)
+
+        records = sink.read()
+        self.stdout.write(f"Replaying {len(records)} failed actions")
+
+        # The sink is only rewritten at the end so that an interrupted replay loses nothing
+        failed = MemoryDeadLetterSink()
+        retrier = BulkRetrier(
+            max_retries=DEDConfig.bulk_max_retries(),
+            initial_backoff=DEDConfig.bulk_initial_backoff(),
+            max_backoff=DEDConfig.bulk_max_backoff(),
+            dead_letter_sink=failed,
+        )
+        kwargs = {"refresh": options["refresh"]} if options["refresh"] is not None else {}
+        send = partial(streaming_bulk, self.es_conn, **kwargs)
+        success, _errors = retrier.bulk(send, [record["action"] for record in records])
+
+        sink.clear()
+        for record in failed.read():
+            sink.add(record["action"], record["error"])
+        self.stdout.write(f"Replayed {success} actions, {len(failed.records)} failed again")
+
+    def _drain_outbox(self, options):
+        if not apps.is_installed("django_opensearch_models.outbox"):
+            msg = "The outbox isn't installed, add 'django_opensearch_models.outbox' to INSTALLED_APPS."
+            raise CommandError(msg)
+        # Not imported with the module: spawned '--processes' workers import it before Django is set up
+        from django_opensearch_models.outbox.signals import drain_outbox  # noqa: PLC0415
+
+        count = drain_outbox(options["outbox_batch_size"], poll_interval=options["poll_interval"])
+        self.stdout.write(f"Sent {count} outbox entries")
+
+    def _get_concrete_index(self, name):
+        """Return the concrete index written through the alias `name`, or `name` if it isn't an alias."""
+        try:
+            alias_indices = self.es_conn.indices.get_alias(name=name)
+        except NotFoundError:
+            return name
+        if len(alias_indices) <= 1:
+            return next(iter(alias_indices), name)
+        write_indices = [index for index, info in alias_indices.items() if info["aliases"][name].get("is_write_index")]
+        if len(write_indices) != 1:
+            msg = f"The alias '{name}' points to several indices, the index to resume into is ambiguous."
+            raise CommandError(msg)
+        return write_indices[0]
 
     def _get_alias_indices(self, alias):
         alias_indices = self.es_conn.indices.get_alias(name=alias)
@@ -211,6 +567,11 @@ class Command(BaseCommand):
                     self.stdout.write(f"Deleted index '{index}'")
 
     def _rebuild(self, models, aliases, options):
+        checkpoint = self._get_checkpoint(options) if options["resume"] else None
+        if checkpoint and checkpoint.indices:
+            self._resume_rebuild(models, aliases, checkpoint, options)
+            return
+
         if not options["use_alias"] and not self._delete(models, aliases, options):
             return
 
@@ -228,8 +589,15 @@ class Command(BaseCommand):
                 alias_index_pairs.append({"alias": index._name, "index": new_index})
                 index._name = new_index
 
+        if checkpoint is not None:
+            if options["use_alias"]:
+                checkpoint.indices = {pair["alias"]: pair["index"] for pair in alias_index_pairs}
+            else:
+                checkpoint.indices = {index._name: index._name for index in registry.get_indices(models)}
+            checkpoint.save()
+
         self._create(models, aliases, options)
-        self._populate(models, options)
+        self._populate(models, options, checkpoint)
 
         if options["use_alias"]:
             for alias_index_pair in alias_index_pairs:
@@ -237,14 +605,59 @@ class Command(BaseCommand):
                 alias_exists = alias in aliases
                 self._update_alias(alias, alias_index_pair["index"], alias_exists, options)
 
+        if checkpoint is not None:
+            checkpoint.clear()
+
+    def _resume_rebuild(self, models, aliases, checkpoint, options):
+        """Continue an interrupted rebuild into the indices recorded in `checkpoint`."""
+        indices = registry.get_indices(models)
+        missing = [index._name for index in indices if index._name not in checkpoint.indices]
+        if missing:
+            msg = (
+                f"The checkpoint in '{checkpoint.path}' doesn't cover the indices {', '.join(missing)}. "
+                "Run the same '--rebuild' command again, or delete the checkpoint file to start over."
+            )
+            raise CommandError(msg)
+
+        alias_index_pairs = []
+        for index in indices:
+            alias, new_index = index._name, checkpoint.indices[index._name]
+            self.stdout.write(f"Resuming rebuild of index '{new_index}'")
+            if alias != new_index:
+                alias_index_pairs.append({"alias": alias, "index": new_index})
+                index._name = new_index
+            if not self.es_conn.indices.exists(index=index._name):
+                self.stdout.write(f"Creating index '{index._name}'")
+                index.create()
+
+        self._populate(models, options, checkpoint)
+
+        for alias_index_pair in alias_index_pairs:
+            alias = alias_index_pair["alias"]
+            self._update_alias(alias, alias_index_pair["index"], alias in aliases, options)
+
+        checkpoint.clear()
+
     def handle(self, *args, **options):
         if not options["action"]:
-            msg = "No action specified. Must be one of '--create','--populate', '--delete' or '--rebuild'."
+            msg = (
+                "No action specified. Must be one of '--create','--populate', '--delete', '--rebuild', "
+                "'--replay-failed' or '--drain-outbox'."
+            )
             raise CommandError(msg)
 
         action = options["action"]
+        if action == "drain_outbox":
+            # Neither the models nor the aliases are needed
+            self._drain_outbox(options)
+            return
+
         models = self._get_models(options["models"])
 
+        if options["processes"] > 1 and options["resume"]:
+            msg = "'--processes' cannot be used with '--resume'."
+            raise CommandError(msg)
+
         # We need to know if and which aliases exist to mitigate naming
         # conflicts with indices, therefore this is needed regardless
         # of using the '--use-alias' arg.
@@ -260,6 +673,11 @@ class Command(BaseCommand):
             self._delete(models, aliases, options)
         elif action == "rebuild":
             self._rebuild(models, aliases, options)
+        elif action == "replay_failed":
+            self._replay_failed(options)
         else:
-            msg = "Invalid action. Must be one of '--create','--populate', '--delete' or '--rebuild'."
+            msg = (
+                "Invalid action. Must be one of '--create','--populate', '--delete', '--rebuild', "
+                "'--replay-failed' or '--drain-outbox'."
+            )
             raise CommandError(msg)
@@ -0,0 +1,6 @@
+"""
+A durable outbox of the index updates, written in the transaction of the model changes.
+
+Opt-in: add ``django_opensearch_models.outbox`` to ``INSTALLED_APPS`` and run ``migrate`` to use the
+``django_opensearch_models.outbox.signals.OutboxSignalProcessor``.
+"""
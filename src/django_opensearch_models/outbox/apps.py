@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class OutboxConfig(AppConfig):
+    name = "django_opensearch_models.outbox"
+    label = "django_opensearch_models_outbox"
+    verbose_name = "Django opensearch models outbox"
+    default_auto_field = "django.db.models.BigAutoField"
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("model", models.CharField(max_length=255)),
+                ("object_pk", models.CharField(max_length=255)),
+                ("document", models.CharField(max_length=255)),
+                ("action", models.CharField(choices=[("index", "Index"), ("delete", "Delete")], max_length=6)),
+                ("index", models.CharField(max_length=255)),
+                ("document_id", models.CharField(blank=True, max_length=255)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "outbox entries",
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import models
+
+
+class OutboxEntry(models.Model):
+    """
+    Index update written by the OutboxSignalProcessor in the transaction of the model change.
+
+    The entries are sent to OpenSearch and deleted by ``search_index --drain-outbox``. The
+    `document_id` is only computed for the deletions, the indexed objects are fetched again.
+    """
+
+    ACTION_CHOICES = (
+        ("index", "Index"),
+        ("delete", "Delete"),
+    )
+
+    model = models.CharField(max_length=255)
+    object_pk = models.CharField(max_length=255)
+    document = models.CharField(max_length=255)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    index = models.CharField(max_length=255)
+    document_id = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "outbox entries"
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_pk}"
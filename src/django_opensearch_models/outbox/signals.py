@@ -0,0 +1,187 @@
+"""The outbox signal processor and the sending of the outbox entries."""
+
+import logging
+import time
+
+from django.db import connections, transaction
+from opensearchpy.exceptions import TransportError
+
+from django_opensearch_models.apps import DEDConfig
+from django_opensearch_models.bulk import NOT_FOUND, REJECTED_STATUS_CODES, RETRY_STATUS_CODES, BulkRetrier
+from django_opensearch_models.registries import get_document_key, registry
+from django_opensearch_models.signals import TransactionBatch, TransactionSignalProcessor
+
+from .models import OutboxEntry
+
+# Number of outbox entries claimed and sent at once by drain_outbox
+OUTBOX_BATCH_SIZE = 1000
+
+# Maximum number of seconds waited by a polling drain_outbox before sending failed entries again
+OUTBOX_MAX_BACKOFF = 300
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxError(Exception):
+    """Raised when outbox entries couldn't be sent and must be sent again."""
+
+
+class OutboxBatch(TransactionBatch):
+    """Index updates written to the outbox table instead of being sent."""
+
+    def __init__(self, using="default"):
+        super().__init__()
+        self.using = using
+
+    def flush(self):
+        """Write an outbox entry per document and object, in the transaction in progress if any."""
+        self._collect_related()
+        entries = []
+        for doc, pks in self.documents.items():
+            for pk, deleted in pks.items():
+                entries.append(
+                    OutboxEntry(
+                        model=doc.django.model._meta.label_lower,
+                        object_pk=str(pk),
+                        document=get_document_key(doc),
+                        action="index" if deleted is None else "delete",
+                        index=doc._index._name if deleted is None else deleted[0],
+                        document_id="" if deleted is None else str(deleted[1]),
+                    )
+                )
+        if entries:
+            OutboxEntry.objects.using(self.using).bulk_create(entries)
+        self.documents = {}
+
+
+class OutboxSignalProcessor(TransactionSignalProcessor):
+    """
+    Outbox signal processor.
+
+    Writes the index updates of the saved and deleted objects to the OutboxEntry table, in the same
+    transaction as the changes of the objects, so that no update is lost when OpenSearch is
+    unavailable. They are sent by ``search_index --drain-outbox``.
+    """
+
+    batch_class = OutboxBatch
+
+    def _record(self, instance, record):
+        batch = self.batch_class(using=instance._state.db or "default")
+        record(batch)
+        batch.flush()
+
+
+def send_outbox_entries(entries):
+    """
+    Send the `entries` with a bulk request per document and action, the last entry of an object winning.
+
+    Raises OutboxError if some of them failed with a status worth retrying. The other failed entries
+    won't be sent again: they're added to the dead-letter sink by the BulkRetrier if there is one, or
+    logged.
+    """
+    latest = {}
+    for entry in sorted(entries, key=lambda entry: entry.pk):
+        latest[entry.document, entry.object_pk] = entry
+
+    grouped = {}
+    for entry in latest.values():
+        grouped.setdefault((entry.document, entry.action, entry.index), []).append(entry)
+
+    documents = {get_document_key(doc): doc for doc in registry.get_documents()}
+    errors = []
+    for (doc_key, action, index_name), doc_entries in grouped.items():
+        doc = documents.get(doc_key)
+        if doc is None:
+            continue
+        doc_instance = doc()
+        if action == "index":
+            queryset = doc.django.model._default_manager.filter(pk__in=[entry.object_pk for entry in doc_entries])
+            _success, doc_errors = doc_instance.update(
+                doc_instance.get_indexing_iterator(queryset), raise_on_error=False
+            )
+        else:
+            _success, doc_errors = doc_instance.delete_ids(
+                [entry.document_id for entry in doc_entries], index=index_name, raise_on_error=False
+            )
+        errors.extend(doc_errors)
+
+    retry_errors = [error for error in errors if BulkRetrier.is_retryable(error)]
+    if retry_errors:
+        msg = f"{len(retry_errors)} outbox entries failed and will be sent again."
+        raise OutboxError(msg, retry_errors)
+    if errors and DEDConfig.dead_letter_sink() is None:
+        _log_dropped(errors)
+
+
+def _log_dropped(errors):
+    """Log the failed `errors` items which won't be sent again."""
+    for error in errors:
+        op_type, info = next(iter(error.items()))
+        # Deleted documents which are already gone aren't errors
+        if op_type == "delete" and info.get("status") == NOT_FOUND:
+            continue
+        logger.error(
+            "Dropped the outbox %s of %s/%s: %s",
+            op_type,
+            info.get("_index"),
+            info.get("_id"),
+            info.get("error", info.get("status")),
+        )
+
+
+def drain_outbox_batch(batch_size=OUTBOX_BATCH_SIZE, using="default"):
+    """
+    Claim up to `batch_size` outbox entries, send them and delete them. Return the number of entries.
+
+    The entries are locked until they're sent (skipping the ones claimed by other workers when the
+    database supports it) and kept if sending them fails, so they are sent at least once.
+    """
+    features = connections[using].features
+    with transaction.atomic(using=using):
+        queryset = OutboxEntry.objects.using(using).order_by("pk")
+        if features.has_select_for_update:
+            queryset = queryset.select_for_update(skip_locked=features.has_select_for_update_skip_locked)
+        entries = list(queryset[:batch_size])
+        if entries:
+            send_outbox_entries(entries)
+            OutboxEntry.objects.using(using).filter(pk__in=[entry.pk for entry in entries]).delete()
+    return len(entries)
+
+
+def _is_transient(error):
+    """Return whether sending the outbox entries again may succeed after an `error`."""
+    if isinstance(error, TransportError):
+        # The connection errors are transport errors with the "N/A" status
+        return error.status_code in RETRY_STATUS_CODES or error.status_code in REJECTED_STATUS_CODES
+    return True
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, using="default", poll_interval=None):
+    """
+    Send the outbox entries by batches until the outbox is empty. Return the number of entries.
+
+    With a `poll_interval`, keep waiting for new entries, checking every `poll_interval` seconds. The
+    entries which failed to be sent, or couldn't be sent because OpenSearch is unreachable or rejected
+    the whole request with a transient status (e.g. 503), are then sent again after `poll_interval`
+    seconds, doubled after each failure up to ``OUTBOX_MAX_BACKOFF``.
+    """
+    total = 0
+    failures = 0
+    while True:
+        try:
+            count = drain_outbox_batch(batch_size, using)
+        except (OutboxError, ConnectionError, TransportError) as e:
+            if poll_interval is None or not _is_transient(e):
+                raise
+            delay = min(OUTBOX_MAX_BACKOFF, poll_interval * 2**failures)
+            failures += 1
+            logger.warning("Failed to send the outbox entries, retrying in %s seconds", delay, exc_info=True)
+            time.sleep(delay)
+            continue
+        failures = 0
+        total += count
+        if count:
+            continue
+        if poll_interval is None:
+            return total
+        time.sleep(poll_interval)
@@ -1,14 +1,28 @@
 from collections import defaultdict
 from copy import deepcopy
+from functools import partial
 from itertools import chain
 
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.db import connections, transaction
+from django.db.models import QuerySet
 from opensearchpy import AttrDict
 
 from django_opensearch_models.exceptions import RedeclaredFieldError
 
 from .apps import DEDConfig
 
+# Strategies of Document.get_indexing_queryset to walk the indexed queryset
+PAGINATION_MODES = ("iterator", "keyset")
+
+# Ways of Document.update to avoid reindexing unchanged documents
+SKIP_UNCHANGED_MODES = ("cache", "local", "detect_noop")
+
+
+def get_document_key(doc):
+    """Return a string identifying a document class across processes."""
+    return f"{doc.__module__}.{doc.__qualname__}"
+
 
 class DocumentRegistry:
     """Registry of models classes to a set of Document classes."""
@@ -65,6 +79,20 @@ class DocumentRegistry:
         django_attr.auto_refresh = getattr(django_meta, "auto_refresh", DEDConfig.auto_refresh_enabled())
         django_attr.related_models = getattr(django_meta, "related_models", [])
         django_attr.queryset_pagination = getattr(django_meta, "queryset_pagination", None)
+        django_attr.skip_unchanged = getattr(django_meta, "skip_unchanged", None)
+        if django_attr.skip_unchanged and django_attr.skip_unchanged not in SKIP_UNCHANGED_MODES:
+            msg = (
+                f"Invalid skip_unchanged '{django_attr.skip_unchanged}' on {document.__name__}, "
+                f"use one of {SKIP_UNCHANGED_MODES}"
+            )
+            raise ImproperlyConfigured(msg)
+        django_attr.partial_updates = getattr(django_meta, "partial_updates", False)
+        django_attr.use_values = getattr(django_meta, "use_values", False)
+        django_attr.adaptive_bulk = getattr(django_meta, "adaptive_bulk", DEDConfig.adaptive_bulk_enabled())
+        django_attr.pagination = getattr(django_meta, "pagination", "iterator")
+        if django_attr.pagination not in PAGINATION_MODES:
+            msg = f"Invalid pagination '{django_attr.pagination}' on {document.__name__}, use one of {PAGINATION_MODES}"
+            raise ImproperlyConfigured(msg)
 
         # Add django attribute in the document class with all the django attribute
         document.django = django_attr
@@ -72,6 +100,15 @@ class DocumentRegistry:
         # Set the fields of the mappings
         fields = document._doc_type.mapping.properties.properties.to_dict()
         document._fields = fields
+        # The preparation plan is (re)built from the fields on first use
+        document._prepare_plan = None
+        document._values_plan = None
+        document._serializer = None
+
+        # Relations to load with the indexed queryset, derived from the fields unless declared
+        select_related, prefetch_related = document.get_related_lookups()
+        django_attr.select_related = getattr(django_meta, "select_related", select_related)
+        django_attr.prefetch_related = getattr(django_meta, "prefetch_related", prefetch_related)
 
         # Update settings of the document index
         default_index_settings = deepcopy(DEDConfig.default_index_settings())
@@ -101,7 +138,7 @@ class DocumentRegistry:
                 related = None
 
             if related is not None:
-                doc_instance.update(related, **kwargs)
+                self._update_related_objects(instance, doc_instance, related, **kwargs)
 
     def delete_related(self, instance, **kwargs):
         """Remove `instance` from related models."""
@@ -116,16 +153,80 @@ class DocumentRegistry:
                 related = None
 
             if related is not None:
-                doc_instance.update(related, **kwargs)
+                self._update_related_objects(instance, doc_instance, related, **kwargs)
+
+    def _update_related_objects(self, instance, doc_instance, related, **kwargs):
+        """
+        Index the objects `related` to a saved or deleted `instance`.
+
+        Querysets go through the indexing pipeline of the document, in chunks. Past
+        ``OPENSEARCH_RELATED_UPDATE_THRESHOLD`` objects, the rest of the queryset, ordered by
+        primary key, is handed to the ``OPENSEARCH_RELATED_UPDATE_HANDLER`` instead of being
+        indexed inline, once the transaction is committed.
+        """
+        if not isinstance(related, QuerySet) or related._result_cache is not None:
+            doc_instance.update(related, **kwargs)
+            return
+
+        threshold = DEDConfig.related_update_threshold()
+        handler = DEDConfig.related_update_handler()
+        if threshold is not None and handler is not None:
+            related = related.order_by("pk")
+            if threshold <= 0:
+                self._defer_related_update(handler, instance, doc_instance, related)
+                return
+            pks = list(related.values_list("pk", flat=True)[: threshold + 1])
+            if len(pks) > threshold:
+                last_pk = pks[threshold - 1]
+                self._defer_related_update(handler, instance, doc_instance, related.filter(pk__gt=last_pk))
+                related = related.filter(pk__lte=last_pk)
+
+        doc_instance.update(doc_instance.get_indexing_iterator(related), **kwargs)
+
+    def _defer_related_update(self, handler, instance, doc_instance, queryset):
+        """
+        Hand `queryset` to the related update `handler` once the transaction saving `instance` is committed.
+
+        The relations of a deleted `instance` are gone by then, so the primary keys of its related
+        objects are read right away and handed by batches the database can filter on, along with
+        the instance to leave out of the documents.
+        """
+        using = instance._state.db or "default"
+        doc_class = type(doc_instance)
+        ignored = doc_instance._related_instance_to_ignore
+        if ignored is None:
+            transaction.on_commit(partial(handler, doc_class, queryset, related_instance_to_ignore=None), using=using)
+            return
+
+        pks = list(queryset.values_list("pk", flat=True))
+        if not pks:
+            return
+        batch_size = connections[queryset.db].features.max_query_params or len(pks)
+        manager = queryset.model._default_manager
+
+        def handle():
+            for start in range(0, len(pks), batch_size):
+                batch = manager.filter(pk__in=pks[start : start + batch_size]).order_by("pk")
+                handler(doc_class, batch, related_instance_to_ignore=ignored)
+
+        transaction.on_commit(handle, using=using)
+
+    def update(self, instance, update_fields=None, **kwargs):
+        """
+        Update all the opensearch documents attached to this model (if their ignore_signals flag allows it).
 
-    def update(self, instance, **kwargs):
-        """Update all the opensearch documents attached to this model (if their ignore_signals flag allows it)."""
+        `update_fields` is only passed to the documents using the `partial_updates` option.
+        """
         if not DEDConfig.autosync_enabled():
             return
 
         if instance.__class__ in self._models:
             for doc in self._models[instance.__class__]:
-                if not doc.django.ignore_signals:
+                if doc.django.ignore_signals:
+                    continue
+                if update_fields is not None and doc.django.partial_updates:
+                    doc().update(instance, update_fields=update_fields, **kwargs)
+                else:
                     doc().update(instance, **kwargs)
 
     def delete(self, instance, **kwargs):
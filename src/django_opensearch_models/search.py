@@ -1,32 +1,150 @@
+from contextlib import suppress
+
 from django.db.models import Case, When
 from django.db.models.fields import IntegerField
 from opensearchpy import Search as OSSearch
+from opensearchpy.connection.connections import get_connection
+from opensearchpy.exceptions import NotFoundError
+
+from .apps import DEDConfig
+from .cache import get_instance_store, get_search_cache
+from .connections import get_async_connection
 
 
 class Search(OSSearch):
     def __init__(self, **kwargs):
         self._model = kwargs.pop("model", None)
+        self._cache_timeout = None
         super().__init__(**kwargs)
 
     def _clone(self):
         s = super()._clone()
         s._model = self._model
+        s._cache_timeout = self._cache_timeout
         return s
 
-    def filter_queryset(self, queryset, keep_search_order=True):
-        """Filter an existing django queryset using the opensearch result. It costs a query to the sql db."""
-        s = self
-        if s._model is not queryset.model:
-            msg = f"Unexpected queryset model (should be: {s._model}, got: {queryset.model})"
+    def cache(self, timeout=None):
+        """
+        Keep the response of the search in the ``OPENSEARCH_SEARCH_CACHE`` Django cache for `timeout` seconds.
+
+        The responses of the searches of an index are invalidated when documents of this index are
+        indexed by this application. Without the ``OPENSEARCH_SEARCH_CACHE`` setting, the search is
+        sent every time.
+        """
+        s = self._clone()
+        s._cache_timeout = timeout if timeout is not None else DEDConfig.search_cache_timeout()
+        return s
+
+    def _get_cache_data(self):
+        return {"body": self.to_dict(), "params": self._params}
+
+    def execute(self, ignore_cache=False):
+        search_cache = get_search_cache() if self._cache_timeout is not None else None
+        if search_cache is None or ignore_cache or hasattr(self, "_response"):
+            return super().execute(ignore_cache)
+
+        key = search_cache.get_key(self._index, self._get_cache_data())
+        raw_response = search_cache.cache.get(key)
+        if raw_response is None:
+            opensearch = get_connection(self._using)
+            raw_response = opensearch.search(index=self._index, body=self.to_dict(), **self._params)
+            search_cache.cache.set(key, raw_response, timeout=self._cache_timeout)
+        self._response = self._response_class(self, raw_response)
+        return self._response
+
+    async def aexecute(self, ignore_cache=False):
+        """Async counterpart of execute(), sending the search with the async client of the connection."""
+        if not ignore_cache and hasattr(self, "_response"):
+            return self._response
+
+        search_cache = get_search_cache() if self._cache_timeout is not None and not ignore_cache else None
+        raw_response = None
+        if search_cache is not None:
+            key = await search_cache.aget_key(self._index, self._get_cache_data())
+            raw_response = await search_cache.cache.aget(key)
+        if raw_response is None:
+            opensearch = await get_async_connection(self._using)
+            raw_response = await opensearch.search(index=self._index, body=self.to_dict(), **self._params)
+            if search_cache is not None:
+                await search_cache.cache.aset(key, raw_response, timeout=self._cache_timeout)
+        self._response = self._response_class(self, raw_response)
+        return self._response
+
+    def _get_pks_search(self, queryset):
+        """Return the search whose results are the ids of the objects of `queryset` to keep."""
+        if self._model is not queryset.model:
+            msg = f"Unexpected queryset model (should be: {self._model}, got: {queryset.model})"
             raise TypeError(msg)
 
         # Do not query again if the es result is already cached
-        if not hasattr(self, "_response"):
-            # We only need the meta fields with the models ids
-            s = self.source(excludes=["*"])
-            s = s.execute()
+        if hasattr(self, "_response"):
+            return self
+        # We only need the meta fields with the models ids
+        return self.source(excludes=["*"])
+
+    def filter_queryset(self, queryset, keep_search_order=True):
+        """Filter an existing django queryset using the opensearch result. It costs a query to the sql db."""
+        response = self._get_pks_search(queryset).execute()
+        return self._filter_by_response(queryset, response, keep_search_order)
+
+    async def afilter_queryset(self, queryset, keep_search_order=True):
+        """Async counterpart of filter_queryset(), the returned queryset is meant to be read with the async ORM."""
+        response = await self._get_pks_search(queryset).aexecute()
+        return self._filter_by_response(queryset, response, keep_search_order)
+
+    def filter_instances(self, queryset):
+        """
+        Return the objects of `queryset` matching the opensearch result, as a list in the order of the hits.
+
+        Unlike filter_queryset(), the objects are fetched with ``in_bulk()``, which splits the primary
+        keys under the parameters limit of the database, and reordered in Python instead of with a
+        ``CASE WHEN`` expression with a branch per hit. The hits whose object doesn't exist are skipped.
+        """
+        response = self._get_pks_search(queryset).execute()
+        return self._get_objects(queryset, [result.meta.id for result in response])
+
+    async def afilter_instances(self, queryset):
+        """Async counterpart of filter_instances()."""
+        response = await self._get_pks_search(queryset).aexecute()
+        return await self._aget_objects(queryset, [result.meta.id for result in response])
+
+    def _to_pks(self, queryset, ids):
+        to_python = queryset.model._meta.pk.to_python
+        return [to_python(id_) for id_ in ids]
 
-        pks = [result.meta.id for result in s]
+    def _get_objects(self, queryset, ids, instance_store=None):
+        """
+        Return the objects of `queryset` whose primary keys are the hits `ids`, in the same order.
+
+        With an `instance_store`, the objects are read from it first, and the ones missing from it
+        fetched from the database and added to it.
+        """
+        pks = self._to_pks(queryset, ids)
+        objects = instance_store.get_many(queryset.model, pks) if instance_store is not None else {}
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            fetched = queryset.in_bulk(missing)
+            if instance_store is not None and fetched:
+                instance_store.set_many(queryset.model, fetched)
+            objects.update(fetched)
+        return [objects[pk] for pk in pks if pk in objects]
+
+    async def _aget_objects(self, queryset, ids, instance_store=None):
+        """Async counterpart of _get_objects()."""
+        pks = self._to_pks(queryset, ids)
+        objects = await instance_store.aget_many(queryset.model, pks) if instance_store is not None else {}
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            fetched = await queryset.ain_bulk(missing)
+            if instance_store is not None and fetched:
+                await instance_store.aset_many(queryset.model, fetched)
+            objects.update(fetched)
+        return [objects[pk] for pk in pks if pk in objects]
+
+    def _filter_by_response(self, queryset, response, keep_search_order):
+        return self._filter_by_pks(queryset, [result.meta.id for result in response], keep_search_order)
+
+    def _filter_by_pks(self, queryset, pks, keep_search_order):
         queryset = queryset.filter(pk__in=pks)
 
         if keep_search_order:
@@ -35,6 +153,78 @@ class Search(OSSearch):
 
         return queryset
 
+    def _get_sort_fields(self):
+        return {key.lstrip("-") if isinstance(key, str) else next(iter(key)) for key in self._sort}
+
+    def iter_pages(self, page_size=1000, keep_alive="1m", tiebreaker="_id", hydrate=False):
+        """
+        Yield every hit of the search, page by page, with a point in time and ``search_after``.
+
+        Unlike ``from``/``size``, it isn't limited by ``max_result_window`` and every page costs the
+        same. The point in time keeps the results consistent while iterating, each page renews its
+        `keep_alive` and it is deleted at the end. The hits are sorted by the sort of the search, then
+        by `tiebreaker`, a unique field, so that no hit is skipped or repeated.
+
+        With `hydrate`, the pages are lists of the model instances of the hits, in the same order,
+        without the hits whose object doesn't exist anymore. It costs a query to the SQL db per page.
+        """
+        s = self._clone()
+        s._extra.pop("from", None)
+        s._extra["size"] = page_size
+        if tiebreaker and tiebreaker not in s._get_sort_fields():
+            s._sort.append(tiebreaker)
+
+        opensearch = get_connection(self._using)
+        pit_id = opensearch.create_pit(index=self._index or "_all", keep_alive=keep_alive)["pit_id"]
+        body = s.to_dict()
+        body.setdefault("track_total_hits", False)
+        try:
+            while True:
+                body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                response = opensearch.search(body=body, **s._params)
+                # The id of the point in time may change with each response
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                if not hits:
+                    break
+
+                page = [self._get_result(hit) for hit in hits]
+                if hydrate:
+                    page = self._get_objects(self._get_queryset(), [hit.meta.id for hit in page], get_instance_store())
+                yield page
+                if len(hits) < page_size:
+                    break
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            # The point in time may have already expired
+            with suppress(NotFoundError):
+                opensearch.delete_pit(body={"pit_id": [pit_id]})
+
+    def iter_querysets(self, chunk_size=1000, keep_order=False, **kwargs):
+        """
+        Yield a queryset of the objects of each chunk of `chunk_size` hits of the search.
+
+        Every hit of the search is walked with iter_pages() (`kwargs` are passed to it) and each
+        queryset costs a single query to the SQL db once evaluated, so that the memory stays
+        bounded whatever the number of hits. The querysets aren't ordered like the hits unless
+        `keep_order` is True, which sorts them with a ``CASE WHEN`` of `chunk_size` branches,
+        iter_instances() keeps the order of the hits in Python instead.
+        """
+        s = self.source(excludes=["*"])
+        for page in s.iter_pages(page_size=chunk_size, **kwargs):
+            yield self._filter_by_pks(self._get_queryset(), [hit.meta.id for hit in page], keep_order)
+
+    def iter_instances(self, chunk_size=1000, **kwargs):
+        """
+        Yield the model instance of every hit of the search, in the order of the hits.
+
+        The instances are loaded by chunks of `chunk_size` with a query to the SQL db each, see
+        iter_querysets(). The hits whose object doesn't exist anymore are skipped.
+        """
+        s = self.source(excludes=["*"])
+        for page in s.iter_pages(page_size=chunk_size, hydrate=True, **kwargs):
+            yield from page
+
     def _get_queryset(self):
         """Get a queryset that will be filtered by to_queryset method."""
         return self._model._default_manager.all()
@@ -43,3 +233,30 @@ class Search(OSSearch):
         """Get a queryset from the opensearch result. It costs a query to the SQL db."""
         qs = self._get_queryset()
         return self.filter_queryset(qs, keep_order)
+
+    def to_instances(self):
+        """
+        Get the model instances of the opensearch result as a list, see filter_instances().
+
+        With the ``OPENSEARCH_HYDRATION_CACHE`` setting, the instances are read from and kept in
+        a cache, so that the hot objects don't cost any query to the SQL db.
+        """
+        queryset = self._get_queryset()
+        response = self._get_pks_search(queryset).execute()
+        return self._get_objects(queryset, [result.meta.id for result in response], get_instance_store())
+
+    async def ato_instances(self):
+        """Async counterpart of to_instances()."""
+        queryset = self._get_queryset()
+        response = await self._get_pks_search(queryset).aexecute()
+        return await self._aget_objects(queryset, [result.meta.id for result in response], get_instance_store())
+
+    async def ato_queryset(self, keep_order=True):
+        """
+        Async counterpart of to_queryset(), e.g. ``[obj async for obj in await search.ato_queryset()]``.
+
+        The search is sent with the async client and the returned queryset is lazy, so that it
+        can be read with the async ORM without any thread hop.
+        """
+        qs = self._get_queryset()
+        return await self.afilter_queryset(qs, keep_order)
@@ -0,0 +1,33 @@
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.serializer import JSONSerializer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DjangoJSONSerializer(JSONSerializer):
+    """
+    JSON serializer of the bulk actions of documents, aware of the Django types.
+
+    Lazy objects like lazy translations are serialized as strings, the other types
+    (dates, decimals, UUIDs...) like opensearchpy's JSONSerializer. The much faster
+    orjson is used to encode when it is installed.
+    """
+
+    def default(self, data):
+        if isinstance(data, Promise):
+            return force_str(data)
+        return super().default(data)
+
+    def dumps(self, data):
+        if orjson is None or isinstance(data, (str, bytes)):
+            return super().dumps(data)
+
+        try:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError as e:
+            raise SerializationError(data, e) from e
@@ -1,14 +1,31 @@
 """A convenient way to attach django-opensearch-models to Django's signals and cause things to index."""
 
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from functools import partial
+from itertools import islice
+
 from django.apps import apps
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, models, transaction
 from django.dispatch import Signal
 
-from .registries import registry
+from .apps import DEDConfig
+from .registries import get_document_key, registry
 
 # Sent after document indexing is completed
 post_index = Signal()
 
+# Maximum number of primary keys sent to a Celery task
+CELERY_TASK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
 
 class BaseSignalProcessor:
     """
@@ -52,7 +69,7 @@ class BaseSignalProcessor:
         Given an individual model instance, update the object in the index.
         Update the related objects as well.
         """
-        registry.update(instance)
+        registry.update(instance, update_fields=kwargs.get("update_fields"))
         registry.update_related(instance)
 
     def handle_pre_delete(self, sender, instance, **kwargs):
@@ -98,24 +115,382 @@ class RealTimeSignalProcessor(BaseSignalProcessor):
         models.signals.pre_delete.disconnect(self.handle_pre_delete)
 
 
+class TransactionBatch:
+    """
+    Index updates collected during a transaction, sent once it's committed.
+
+    The objects to index are recorded by document and primary key, so that the repeated saves
+    of an object are merged, and fetched again when the batch is sent to index their last state.
+    The deleted objects are recorded with the index and id of their documents, computed when they
+    are deleted: Django resets the primary key of the deleted instances.
+    """
+
+    def __init__(self):
+        # {document: {pk: None to index the object, or the (index, id) of its deleted document}}
+        self.documents = {}
+        # {model: {pk: None}} of the instances whose related documents are updated
+        self.related_pks = {}
+
+    def add(self, doc, pk, deleted=None):
+        self.documents.setdefault(doc, {})[pk] = deleted
+
+    def add_related(self, model, pk):
+        self.related_pks.setdefault(model, {})[pk] = None
+
+    def merge(self, batch):
+        """Move the updates of a later `batch` (e.g. of a released savepoint) to this one."""
+        for doc, pks in batch.documents.items():
+            self.documents.setdefault(doc, {}).update(pks)
+        for model, pks in batch.related_pks.items():
+            self.related_pks.setdefault(model, {}).update(pks)
+        batch.documents = {}
+        batch.related_pks = {}
+
+    def _collect_related(self):
+        for model, pks in self.related_pks.items():
+            for instance in model._default_manager.in_bulk(list(pks)).values():
+                for doc in registry._get_related_doc(instance):
+                    try:
+                        related = doc().get_instances_from_related(instance)
+                    except ObjectDoesNotExist:
+                        related = None
+                    for obj in _as_instances(related):
+                        self.documents.setdefault(doc, {}).setdefault(obj.pk, None)
+        self.related_pks = {}
+
+    def flush(self):
+        """Send a bulk request per document with the objects to index, and per index with the deleted ones."""
+        self._collect_related()
+        for doc, pks in self.documents.items():
+            doc_instance = doc()
+            index_pks = [pk for pk, deleted in pks.items() if deleted is None]
+            if index_pks:
+                doc_instance.update(doc.django.model._default_manager.filter(pk__in=index_pks))
+            for index_name, ids in _group_deleted(pks).items():
+                doc_instance.delete_ids(ids, index=index_name, raise_on_error=False)
+        self.documents = {}
+
+
+def _group_deleted(pks):
+    """Return the ids of the deleted documents of a batch, by index."""
+    deleted_ids = {}
+    for deleted in pks.values():
+        if deleted is not None:
+            index_name, doc_id = deleted
+            deleted_ids.setdefault(index_name, []).append(doc_id)
+    return deleted_ids
+
+
+def _as_instances(related):
+    """Return the model instances of the result of `Document.get_instances_from_related()`."""
+    if related is None:
+        return []
+    if isinstance(related, models.Model):
+        return [related]
+    return related
+
+
+class TransactionSignalProcessor(RealTimeSignalProcessor):
+    """
+    Transaction signal processor.
+
+    Collects the index updates of the saved and deleted objects while a transaction is in progress
+    and sends them once it's committed, with a bulk request per document instead of a request per
+    object. The repeated saves of an object are merged, the objects are fetched again at commit to
+    index their last state and nothing is sent when the transaction, or the savepoint recording
+    them, is rolled back. Outside of a transaction, the updates are sent right away.
+    """
+
+    batch_class = TransactionBatch
+
+    def __init__(self, connections):
+        self._local = threading.local()
+        super().__init__(connections)
+
+    def get_batch(self, using):
+        """
+        Return the batch of the transaction or savepoint in progress on the database `using`.
+
+        Each savepoint has its own batch, sent by an on_commit callback registered in the savepoint,
+        so that its updates are dropped with the callback if it's rolled back. The batches of the
+        released savepoints are merged in the batch of their parent.
+        """
+        # The batches are only referenced by their on_commit callbacks, so the ones of the rolled
+        # back transactions and savepoints are forgotten along with them
+        batches = self._local.__dict__.setdefault("batches", {}).setdefault(using, weakref.WeakValueDictionary())
+        key = tuple(transaction.get_connection(using).savepoint_ids)
+        while exited := [savepoint for savepoint in list(batches.keys()) if key[: len(savepoint)] != savepoint]:
+            savepoint = max(exited, key=len)
+            released = batches.pop(savepoint, None)
+            parent = batches.get(savepoint[:-1])
+            if released is None:
+                continue
+            if parent is None:
+                batches[savepoint[:-1]] = released
+            else:
+                parent.merge(released)
+
+        batch = batches.get(key)
+        if batch is None:
+            batch = batches[key] = self.batch_class()
+            transaction.on_commit(batch.flush, using=using)
+        return batch
+
+    def _record(self, instance, record):
+        using = instance._state.db or "default"
+        if not transaction.get_connection(using).in_atomic_block:
+            batch = self.batch_class()
+            record(batch)
+            batch.flush()
+        else:
+            record(self.get_batch(using))
+
+    def handle_save(self, sender, instance, **kwargs):
+        """Record the object and the related objects of `instance` to index once the transaction is committed."""
+        if not DEDConfig.autosync_enabled():
+            return
+
+        # Read now, the batch may be filled later, from another thread
+        model, pk = instance.__class__, instance.pk
+        docs = [doc for doc in registry._models.get(model, []) if not doc.django.ignore_signals]
+        is_related = model in registry._related_models
+
+        def record(batch):
+            for doc in docs:
+                batch.add(doc, pk)
+            if is_related:
+                batch.add_related(model, pk)
+
+        self._record(instance, record)
+
+    def handle_pre_delete(self, sender, instance, **kwargs):
+        """
+        Record the related objects of `instance` to index once the transaction is committed.
+
+        They are looked up before the real delete, while the relation still exists.
+        """
+        if not DEDConfig.autosync_enabled():
+            return
+
+        related_objects = []
+        for doc in registry._get_related_doc(instance):
+            try:
+                related = doc(related_instance_to_ignore=instance).get_instances_from_related(instance)
+            except ObjectDoesNotExist:
+                related = None
+            related_objects.extend((doc, obj.pk) for obj in _as_instances(related))
+
+        def record(batch):
+            for doc, pk in related_objects:
+                batch.add(doc, pk)
+
+        self._record(instance, record)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        """Record the object of `instance` to delete from the index once the transaction is committed."""
+        if not DEDConfig.autosync_enabled():
+            return
+
+        # Computed now, Django resets the primary key of the instance once it's deleted
+        pk = instance.pk
+        deleted = [
+            (doc, (doc._index._name, doc.generate_id(instance)))
+            for doc in registry._models.get(instance.__class__, [])
+            if not doc.django.ignore_signals
+        ]
+
+        def record(batch):
+            for doc, index_and_id in deleted:
+                batch.add(doc, pk, deleted=index_and_id)
+
+        self._record(instance, record)
+
+
+# Tells a worker of the ThreadedSignalProcessor to stop
+_STOP = object()
+
+
+class ThreadedSignalProcessor(TransactionSignalProcessor):
+    """
+    Threaded signal processor.
+
+    Sends the index updates from a small pool of background threads of the process, so that the
+    requests don't wait for OpenSearch. The updates are queued once their transaction is committed
+    and each worker merges the ones it takes from the queue into a batch like the
+    TransactionSignalProcessor, sent after `batch_size` updates or `flush_interval` seconds. The
+    updates are only merged within a worker: the saves of an object taken by two workers are sent
+    twice. A batch which fails to be sent is sent again up to `max_retries` times, waiting
+    `retry_backoff` seconds doubled after each attempt, then added to the dead-letter sink if there
+    is one. Saving blocks while the queue is full (`queue_size`), and the queued updates are sent
+    when the process exits. The primary keys, and the index and id of the deleted documents, are
+    read in the request and only these values are queued: the instances may have changed, or been
+    deleted, by the time a worker takes them. The related objects of a deleted object are still
+    looked up in the request, the others are fetched again by the workers.
+    """
+
+    def __init__(self, connections, **options):
+        options = {**DEDConfig.threaded_processor_options(), **options}
+        self.queue_size = options.get("queue_size", 10000)
+        self.workers = options.get("workers", 2)
+        self.batch_size = options.get("batch_size", 500)
+        self.flush_interval = options.get("flush_interval", 1.0)
+        self.max_retries = options.get("max_retries", 3)
+        self.retry_backoff = options.get("retry_backoff", 1.0)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = []
+        super().__init__(connections)
+
+    def teardown(self):
+        super().teardown()
+        atexit.unregister(self.shutdown)
+        self.shutdown()
+
+    def _start(self):
+        """Start the workers, again in a forked process whose threads didn't survive the fork."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._threads = [
+                    threading.Thread(target=self._work, name=f"opensearch-signal-processor-{i}", daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+                # Registered once, including in a forked process which inherited the registration
+                atexit.unregister(self.shutdown)
+                atexit.register(self.shutdown)
+            return self._queue
+
+    def enqueue(self, record):
+        """Queue `record(batch)` to be applied to the batch of a worker, waiting while the queue is full."""
+        self._start().put(record)
+
+    def _record(self, instance, record):
+        transaction.on_commit(partial(self.enqueue, record), using=instance._state.db or "default")
+
+    def _work(self):
+        batch = self.batch_class()
+        size = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            if record is not None and record is not _STOP:
+                record(batch)
+                size += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if size < self.batch_size:
+                    continue
+
+            self._flush(batch)
+            for _ in range(size):
+                self._queue.task_done()
+            batch = self.batch_class()
+            size = 0
+            deadline = None
+            if record is _STOP:
+                self._queue.task_done()
+                return
+
+    def _flush(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch.flush()
+            except Exception as e:
+                if attempt < self.max_retries:
+                    logger.warning(
+                        "Failed to send the index updates of %s, retrying", type(self).__name__, exc_info=True
+                    )
+                    time.sleep(self.retry_backoff * 2**attempt)
+                    continue
+                logger.exception("Failed to send the index updates of %s", type(self).__name__)
+                self._add_dead_letters(batch, e)
+            finally:
+                close_old_connections()
+            return
+
+    def _add_dead_letters(self, batch, error):
+        """Add the actions of a batch which couldn't be sent to the dead-letter sink, if there is one."""
+        sink = DEDConfig.dead_letter_sink()
+        if sink is None:
+            return
+        try:
+            for doc, pks in batch.documents.items():
+                doc_instance = doc()
+                index_pks = [pk for pk, deleted in pks.items() if deleted is None]
+                queryset = doc.django.model._default_manager.filter(pk__in=index_pks)
+                for action in doc_instance._get_actions(queryset, "index"):
+                    sink.add(action, {"error": repr(error)})
+                for index_name, ids in _group_deleted(pks).items():
+                    for doc_id in ids:
+                        sink.add({"_op_type": "delete", "_index": index_name, "_id": doc_id}, {"error": repr(error)})
+        except Exception:
+            logger.exception("Failed to add the index updates of %s to the dead-letter sink", type(self).__name__)
+
+    def join(self):
+        """Wait until the queued updates are sent."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def shutdown(self, timeout=None):
+        """Send the queued updates and stop the workers."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            threads, self._threads, self._pid = self._threads, [], None
+            for _ in threads:
+                self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+
 try:
     from celery import shared_task
 except ImportError:
     pass
 else:
 
-    class CelerySignalProcessor(RealTimeSignalProcessor):
+    class CeleryTransactionBatch(TransactionBatch):
+        """Index updates collected during a transaction, sent to Celery tasks once it's committed."""
+
+        def flush(self):
+            """
+            Send a task per document with the objects to index and per model with the related instances.
+
+            The deleted objects are sent by id, their rows are gone by the time a worker runs.
+            """
+            for model, pks in self.related_pks.items():
+                _delay_in_chunks(update_related_instances, pks, model._meta.app_label, model.__name__)
+            self.related_pks = {}
+
+            for doc, pks in self.documents.items():
+                index_pks = [pk for pk, deleted in pks.items() if deleted is None]
+                _delay_in_chunks(update_documents, index_pks, get_document_key(doc))
+                for index_name, ids in _group_deleted(pks).items():
+                    _delay_in_chunks(delete_documents, ids, get_document_key(doc), index_name)
+            self.documents = {}
+
+    class CelerySignalProcessor(TransactionSignalProcessor):
         """
         Celery signal processor.
 
         Allows automatic updates on the index as delayed background tasks using Celery.
 
-        NB: We cannot process deletes as background tasks.
-        By the time the Celery worker would pick up the delete job, the model instance would be already deleted.
-        We can get around this by setting Celery to use `pickle` and sending the object to the worker,
-        but using `pickle` opens the application up to security concerns.
+        By the time the Celery worker would pick up a delete job, the model instance would be already
+        deleted, so the index and id of its documents are computed with `generate_id()` when it's
+        deleted and the worker deletes them by id, without accessing the database. The deletions
+        are collected like with the TransactionSignalProcessor and sent once the transaction is
+        committed, with a task per document and chunk of ``CELERY_TASK_SIZE`` ids.
         """
 
+        batch_class = CeleryTransactionBatch
+
         def handle_save(self, sender, instance, **kwargs):
             """
             Handle save with a Celery task.
@@ -136,15 +511,6 @@ else:
             if self.is_instance_indexed(instance):
                 self.delete_related.delay(*self.serialize_instance(instance))
 
-        def handle_delete(self, sender, instance, **kwargs):
-            """
-            Handle the deletion.
-
-            Given an individual model instance, delete the object from the index.
-            """
-            if self.is_instance_indexed(instance):
-                self.delete.delay(*self.serialize_instance(instance))
-
         @staticmethod
         def serialize_instance(instance) -> tuple[str, str, int]:
             """Get app label, model name and primary key from an instance."""
@@ -186,7 +552,79 @@ else:
         @staticmethod
         @shared_task()
         def delete(app_label, model_name, pk):
-            """Handle the update on the registry as a Celery task."""
+            """Handle the update on the registry as a Celery task (queued before deletes were sent by id)."""
             instance = CelerySignalProcessor.deserialize_instance(app_label, model_name, pk)
             if instance:
                 registry.delete(instance)
+
+    def _delay_in_chunks(task, pks, *args, **kwargs):
+        """Call `task` in the background with the `args` and chunks of ``CELERY_TASK_SIZE`` of the `pks`."""
+        pks = iter(pks)
+        while chunk := list(islice(pks, CELERY_TASK_SIZE)):
+            task.delay(*args, chunk, **kwargs)
+
+    @shared_task()
+    def update_documents(doc_key, pks, related_instance_to_ignore=None):
+        """
+        Index the objects `pks` of a document with a bulk request as a Celery task.
+
+        `related_instance_to_ignore` is the ``[model label, pk]`` of a deleted related instance
+        left out of the documents.
+        """
+        doc = next((doc for doc in registry.get_documents() if get_document_key(doc) == doc_key), None)
+        if doc is not None:
+            ignored = None
+            if related_instance_to_ignore is not None:
+                label, pk = related_instance_to_ignore
+                # Compared by model and primary key, the row is already deleted
+                ignored = apps.get_model(label)(pk=pk)
+            doc_instance = doc(related_instance_to_ignore=ignored)
+            queryset = doc.django.model._default_manager.filter(pk__in=pks)
+            doc_instance.update(doc_instance.get_indexing_iterator(queryset))
+
+    @shared_task()
+    def delete_documents(doc_key, index_name, ids):
+        """Delete the documents `ids` of a document from `index_name` as a Celery task."""
+        doc = next((doc for doc in registry.get_documents() if get_document_key(doc) == doc_key), None)
+        if doc is not None:
+            doc().delete_ids(ids, index=index_name, raise_on_error=False)
+
+    @shared_task()
+    def update_related_instances(app_label, model_name, pks):
+        """Index the objects related to the instances `pks` of a model as a Celery task."""
+        try:
+            model = apps.get_model(app_label, model_name)
+        except LookupError:
+            return
+        for instance in model._default_manager.in_bulk(pks).values():
+            registry.update_related(instance)
+
+    def defer_related_update(doc_class, queryset, related_instance_to_ignore=None):
+        """
+        Index the related objects past ``OPENSEARCH_RELATED_UPDATE_THRESHOLD`` with Celery tasks.
+
+        Used as the ``OPENSEARCH_RELATED_UPDATE_HANDLER``, the primary keys of `queryset` are
+        sent in chunks of ``CELERY_TASK_SIZE`` to `update_documents` tasks, along with the deleted
+        `related_instance_to_ignore` if any.
+        """
+        kwargs = {}
+        if related_instance_to_ignore is not None:
+            kwargs["related_instance_to_ignore"] = [
+                related_instance_to_ignore._meta.label_lower,
+                related_instance_to_ignore.pk,
+            ]
+        pks = queryset.values_list("pk", flat=True).iterator(chunk_size=CELERY_TASK_SIZE)
+        _delay_in_chunks(update_documents, pks, get_document_key(doc_class), **kwargs)
+
+    class BatchedCelerySignalProcessor(TransactionSignalProcessor):
+        """
+        Batched Celery signal processor.
+
+        Collects the saved objects like the TransactionSignalProcessor and, once the transaction
+        is committed, sends a Celery task per document with the primary keys of its objects (by
+        chunks of ``CELERY_TASK_SIZE``) instead of a task per saved object. The workers fetch them
+        with a single query and index them with a bulk request. With ``ATOMIC_REQUESTS``, the
+        objects saved during a whole request are batched.
+        """
+
+        batch_class = CeleryTransactionBatch
@@ -48,7 +48,7 @@ class WithFixturesMixin:
             index_.document(Doc)
             self.registry.register_document(Doc)
 
-        Doc.update = Mock()
+        Doc.update = Mock(return_value=(0, []))
         if mock_qs:
             Doc.get_queryset = Mock(return_value=mock_qs)
         if _related_models:
@@ -0,0 +1,232 @@
+import datetime
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from opensearchpy.exceptions import TransportError
+from opensearchpy.helpers import BulkIndexError
+from opensearchpy.serializer import JSONSerializer
+
+from django_opensearch_models.bulk import (
+    AdaptiveChunkSizer,
+    BulkRetrier,
+    DeadLetterSink,
+    JSONLinesDeadLetterSink,
+    MemoryDeadLetterSink,
+)
+
+
+def make_client(responses=None):
+    """Return a client mock answering each bulk request with a success for each of its actions."""
+    client = Mock()
+    client.transport.serializer = JSONSerializer()
+
+    def bulk(body, **kwargs):
+        if responses:
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        lines = body.splitlines()
+        return {"items": [{"index": {"_id": json.loads(line)["index"]["_id"], "status": 201}} for line in lines[::2]]}
+
+    client.bulk = Mock(side_effect=bulk)
+    return client
+
+
+def make_actions(count, size=100):
+    return [{"_index": "foo", "_id": i, "_source": {"text": "x" * size}} for i in range(count)]
+
+
+class AdaptiveChunkSizerTestCase(TestCase):
+    def test_chunks_by_bytes(self):
+        sizer = AdaptiveChunkSizer(initial_bytes=500)
+        chunks = list(sizer.chunks(make_actions(10), JSONSerializer()))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+        self.assertTrue(all(sum(item[2] for item in chunk) <= sizer.chunk_bytes for chunk in chunks))
+
+    def test_chunks_by_max_docs(self):
+        sizer = AdaptiveChunkSizer(max_docs=4)
+        chunks = list(sizer.chunks(make_actions(10), JSONSerializer()))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+    def test_record(self):
+        sizer = AdaptiveChunkSizer(initial_bytes=1000, min_bytes=400, max_bytes=2000, target_latency=1)
+        sizer.record(10, 1000, 0.1)
+        self.assertEqual(sizer.chunk_bytes, 1500)
+        # Requests smaller than the budget don't make it grow
+        sizer.record(1, 100, 0.1)
+        self.assertEqual(sizer.chunk_bytes, 1500)
+        sizer.record(10, 1500, 0.1)
+        self.assertEqual(sizer.chunk_bytes, 2000)
+        sizer.record(10, 2000, 1.5)
+        self.assertEqual(sizer.chunk_bytes, 2000)
+        sizer.record(10, 2000, 3)
+        self.assertEqual(sizer.chunk_bytes, 1000)
+        sizer.record(10, 1000, 0.1, rejected=True)
+        self.assertEqual(sizer.chunk_bytes, 500)
+        sizer.record(10, 500, 0.1, rejected=True)
+        self.assertEqual(sizer.chunk_bytes, 400)
+        self.assertEqual(len(sizer.requests), 7)
+
+    def test_bulk_grows_chunks(self):
+        client = make_client()
+        sizer = AdaptiveChunkSizer(initial_bytes=500)
+        self.assertEqual(sizer.bulk(client, make_actions(30), refresh=True), (30, []))
+        self.assertEqual([request[0] for request in sizer.requests], [3, 5, 7, 11, 4])
+        self.assertEqual(client.bulk.call_args[1], {"body": client.bulk.call_args[1]["body"], "refresh": True})
+        self.assertIn("5 bulk requests of 3-11 documents", sizer.summary())
+
+    def test_bulk_rejected_request_is_split(self):
+        client = make_client([TransportError(429, "rejected")])
+        sizer = AdaptiveChunkSizer(initial_bytes=1000, min_bytes=100, backoff=0)
+        self.assertEqual(sizer.bulk(client, make_actions(6)), (6, []))
+        self.assertEqual([request[0] for request in sizer.requests], [6, 3, 3])
+        self.assertEqual(client.bulk.call_count, 3)
+
+    def test_bulk_error(self):
+        client = make_client([TransportError(400, "bad request")])
+        sizer = AdaptiveChunkSizer()
+        with self.assertRaises(TransportError):
+            sizer.bulk(client, make_actions(2))
+
+        client = make_client([TransportError(400, "bad request")])
+        success, errors = sizer.bulk(client, make_actions(2), raise_on_error=False, raise_on_exception=False)
+        self.assertEqual(success, 0)
+        self.assertEqual([error["index"]["_id"] for error in errors], [0, 1])
+
+    def test_bulk_item_errors(self):
+        items = [{"index": {"_id": 0, "status": 201}}, {"index": {"_id": 1, "status": 429, "error": "rejected"}}]
+        sizer = AdaptiveChunkSizer(initial_bytes=1000, min_bytes=100, max_rejections=0)
+        with self.assertRaises(BulkIndexError):
+            sizer.bulk(make_client([{"items": items}]), make_actions(2))
+
+        items = [{"index": {"_id": 0, "status": 201}}, {"index": {"_id": 1, "status": 429, "error": "rejected"}}]
+        response = sizer.bulk(make_client([{"items": items}]), make_actions(2), stats_only=True, raise_on_error=False)
+        self.assertEqual(response, (1, 1))
+        # Rejected items shrink the next requests
+        self.assertEqual(sizer.chunk_bytes, 250)
+
+    def test_bulk_rejected_items_are_sent_again(self):
+        items = [{"index": {"_id": 0, "status": 201}}, {"index": {"_id": 1, "status": 429, "error": "rejected"}}]
+        client = make_client([{"items": items}])
+        sizer = AdaptiveChunkSizer(initial_bytes=1000, min_bytes=100, backoff=0)
+        self.assertEqual(sizer.bulk(client, make_actions(2)), (2, []))
+        self.assertEqual(client.bulk.call_count, 2)
+        self.assertEqual(client.bulk.call_args[1]["body"].count("\n"), 2)
+        self.assertEqual(sizer.chunk_bytes, 500)
+
+    def test_streaming_bulk_threads(self):
+        client = make_client()
+        sizer = AdaptiveChunkSizer(initial_bytes=500)
+        results = list(sizer.streaming_bulk(client, make_actions(30), thread_count=3))
+        self.assertEqual(len(results), 30)
+        self.assertTrue(all(ok for ok, _ in results))
+        self.assertEqual(sum(request[0] for request in sizer.requests), 30)
+
+    @patch("django_opensearch_models.apps.settings")
+    def test_from_settings(self, settings):
+        settings.OPENSEARCH_ADAPTIVE_BULK_OPTIONS = {"initial_bytes": 100, "target_latency": 5}
+        sizer = AdaptiveChunkSizer.from_settings()
+        self.assertEqual(sizer.chunk_bytes, 100)
+        self.assertEqual(sizer.target_latency, 5)
+
+
+def make_send(*statuses):
+    """Return a send() mock answering each call with the next list of statuses, one per action."""
+    statuses = list(statuses)
+    sent_ids = []
+
+    def send(actions, **kwargs):
+        actions = list(actions)
+        sent_ids.append([action["_id"] for action in actions])
+        for action, status in zip(actions, statuses.pop(0)):
+            ok = status in {200, 201}
+            info = {"_id": action["_id"], "status": status}
+            if not ok:
+                info["error"] = "failed"
+            yield ok, {action.get("_op_type", "index"): info}
+
+    mock = Mock(side_effect=send)
+    mock.sent_ids = sent_ids
+    return mock
+
+
+class BulkRetrierTestCase(TestCase):
+    def setUp(self):
+        patcher = patch("django_opensearch_models.bulk.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_failed_items(self):
+        send = make_send([201, 429, 503, 201], [201, 429], [201])
+        retrier = BulkRetrier(max_retries=3, initial_backoff=2, max_backoff=3)
+        self.assertEqual(retrier.bulk(send, make_actions(4)), (4, []))
+
+        self.assertEqual(send.sent_ids, [[0, 1, 2, 3], [1, 2], [2]])
+        self.assertEqual(send.call_args[1], {"raise_on_error": False, "raise_on_exception": False})
+        self.assertEqual([call[0][0] for call in self.sleep.call_args_list], [2, 3])
+
+    def test_permanent_errors_are_not_retried(self):
+        send = make_send([201, 400])
+        with self.assertRaises(BulkIndexError):
+            BulkRetrier(max_retries=3).bulk(send, make_actions(2))
+        self.assertEqual(send.call_count, 1)
+
+        send = make_send([201, 400])
+        success, errors = BulkRetrier(max_retries=3).bulk(send, make_actions(2), raise_on_error=False)
+        self.assertEqual(success, 1)
+        self.assertEqual(errors, [{"index": {"_id": 1, "status": 400, "error": "failed"}}])
+
+    def test_dead_letter_sink(self):
+        sink = MemoryDeadLetterSink()
+        send = make_send([201, 429, 400], [429])
+        actions = make_actions(3)
+        self.assertEqual(BulkRetrier(max_retries=1, dead_letter_sink=sink).bulk(send, actions, stats_only=True), (1, 2))
+        self.assertEqual([record["action"] for record in sink.read()], [actions[2], actions[1]])
+        self.assertEqual(sink.read()[1]["error"], {"_id": 1, "status": 429, "error": "failed"})
+
+    def test_dead_letter_sink_is_abstract(self):
+        with self.assertRaises(TypeError):
+            DeadLetterSink()
+
+    def test_dead_letter_sink_ignores_deleted(self):
+        sink = MemoryDeadLetterSink()
+        send = make_send([404])
+        BulkRetrier(max_retries=0, dead_letter_sink=sink).bulk(send, [{"_op_type": "delete", "_id": 1}])
+        self.assertEqual(sink.read(), [])
+
+    @patch("django_opensearch_models.apps.settings")
+    def test_from_settings(self, settings):
+        settings.OPENSEARCH_BULK_MAX_RETRIES = 0
+        settings.OPENSEARCH_DEAD_LETTER_SINK = None
+        self.assertIsNone(BulkRetrier.from_settings())
+
+        settings.OPENSEARCH_BULK_MAX_RETRIES = 5
+        settings.OPENSEARCH_BULK_INITIAL_BACKOFF = 1
+        settings.OPENSEARCH_BULK_MAX_BACKOFF = 10
+        settings.OPENSEARCH_DEAD_LETTER_SINK = "django_opensearch_models.bulk.MemoryDeadLetterSink"
+        retrier = BulkRetrier.from_settings()
+        self.assertEqual((retrier.max_retries, retrier.initial_backoff, retrier.max_backoff), (5, 1, 10))
+        self.assertIsInstance(retrier.dead_letter_sink, MemoryDeadLetterSink)
+
+
+class JSONLinesDeadLetterSinkTestCase(TestCase):
+    def test_add_read_clear(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sink = JSONLinesDeadLetterSink(Path(tmp_dir) / "failed.jsonl")
+            self.assertEqual(sink.read(), [])
+
+            action = {"_index": "foo", "_id": 1, "_source": {"date": datetime.date(2020, 1, 2)}}
+            sink.add(action, {"status": 400})
+            sink.add({"_op_type": "delete", "_index": "foo", "_id": 2}, {"status": 503})
+            records = sink.read()
+            self.assertEqual(len(records), 2)
+            self.assertEqual(records[0]["action"], {"_index": "foo", "_id": 1, "_source": {"date": "2020-01-02"}})
+            self.assertEqual(records[1]["error"], {"status": 503})
+            self.assertIn("failed_at", records[0])
+
+            sink.clear()
+            self.assertEqual(sink.read(), [])
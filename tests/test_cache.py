@@ -0,0 +1,107 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.core.cache import cache
+
+from django_opensearch_models.cache import (
+    DjangoCacheInstanceStore,
+    DjangoCacheSourceHashStore,
+    LocalInstanceStore,
+    LocalSourceHashStore,
+)
+
+from .models import Car, Manufacturer
+
+
+class DjangoCacheSourceHashStoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = DjangoCacheSourceHashStore(alias="default")
+
+    def test_get_set_delete(self):
+        self.assertEqual(self.store.get_many("foo", ["1", "2"]), {})
+        self.store.set_many("foo", {"1": "a", "2": "b"})
+        self.store.set_many("bar", {"1": "c"})
+        self.assertEqual(self.store.get_many("foo", ["1", "2", "3"]), {"1": "a", "2": "b"})
+
+        self.store.delete_many("foo", ["2"])
+        self.assertEqual(self.store.get_many("foo", ["1", "2"]), {"1": "a"})
+        self.assertEqual(self.store.get_many("bar", ["1"]), {"1": "c"})
+
+    def test_invalidate(self):
+        self.store.set_many("foo", {"1": "a"})
+        self.store.set_many("bar", {"1": "c"})
+        self.store.invalidate("foo")
+        self.assertEqual(self.store.get_many("foo", ["1"]), {})
+        self.assertEqual(self.store.get_many("bar", ["1"]), {"1": "c"})
+
+        self.store.set_many("foo", {"1": "b"})
+        self.store.invalidate("foo")
+        self.assertEqual(self.store.get_many("foo", ["1"]), {})
+
+
+class LocalSourceHashStoreTestCase(TestCase):
+    def test_least_recently_used_are_dropped(self):
+        store = LocalSourceHashStore(max_size=2)
+        store.set_many("foo", {"1": "a", "2": "b"})
+        self.assertEqual(store.get_many("foo", ["1"]), {"1": "a"})
+        store.set_many("foo", {"3": "c"})
+        self.assertEqual(store.get_many("foo", ["1", "2", "3"]), {"1": "a", "3": "c"})
+
+    def test_delete_invalidate(self):
+        store = LocalSourceHashStore(max_size=10)
+        store.set_many("foo", {"1": "a", "2": "b"})
+        store.set_many("bar", {"1": "c"})
+        store.delete_many("foo", ["1"])
+        self.assertEqual(store.get_many("foo", ["1", "2"]), {"2": "b"})
+        store.invalidate("foo")
+        self.assertEqual(store.get_many("foo", ["1", "2"]), {})
+        self.assertEqual(store.get_many("bar", ["1"]), {"1": "c"})
+
+
+class DjangoCacheInstanceStoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = DjangoCacheInstanceStore(alias="default", timeout=60)
+
+    def test_get_set_delete(self):
+        manufacturer = Manufacturer(pk=1, name="Peugeot")
+        self.store.set_many(Manufacturer, {1: manufacturer})
+        self.store.set_many(Car, {1: Car(pk=1, name="508")})
+        self.assertEqual(self.store.get_many(Manufacturer, [1, 2]), {1: manufacturer})
+        self.assertEqual(self.store.get_many(Manufacturer, [1])[1].name, "Peugeot")
+
+        self.store.delete(Manufacturer, 1)
+        self.assertEqual(self.store.get_many(Manufacturer, [1]), {})
+        self.assertEqual(list(self.store.get_many(Car, [1])), [1])
+
+
+class LocalInstanceStoreTestCase(TestCase):
+    def test_get_returns_copies(self):
+        store = LocalInstanceStore(max_size=10, timeout=60)
+        manufacturer = Manufacturer(pk=1, name="Peugeot")
+        store.set_many(Manufacturer, {1: manufacturer})
+        manufacturer.name = "Renault"
+
+        instance = store.get_many(Manufacturer, [1])[1]
+        self.assertEqual(instance.name, "Peugeot")
+        instance.name = "Citroën"
+        self.assertEqual(store.get_many(Manufacturer, [1])[1].name, "Peugeot")
+
+    def test_expiration(self):
+        store = LocalInstanceStore(max_size=10, timeout=60)
+        with patch("django_opensearch_models.cache.time.monotonic", return_value=100):
+            store.set_many(Manufacturer, {1: Manufacturer(pk=1), 2: Manufacturer(pk=2)})
+        with patch("django_opensearch_models.cache.time.monotonic", return_value=159):
+            self.assertEqual(list(store.get_many(Manufacturer, [1, 2])), [1, 2])
+        with patch("django_opensearch_models.cache.time.monotonic", return_value=160):
+            self.assertEqual(store.get_many(Manufacturer, [1, 2]), {})
+
+    def test_least_recently_used_are_dropped(self):
+        store = LocalInstanceStore(max_size=2, timeout=60)
+        store.set_many(Manufacturer, {1: Manufacturer(pk=1), 2: Manufacturer(pk=2)})
+        store.get_many(Manufacturer, [1])
+        store.set_many(Car, {1: Car(pk=1)})
+        self.assertEqual(list(store.get_many(Manufacturer, [1, 2])), [1])
+        store.delete(Manufacturer, 1)
+        self.assertEqual(store.get_many(Manufacturer, [1]), {})
@@ -1,15 +1,23 @@
+import json
+import tempfile
+from concurrent.futures import Future
 from io import StringIO
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import DEFAULT, Mock, patch
 
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.test import TestCase as DjangoTestCase
+from opensearchpy.exceptions import NotFoundError
 
-from django_opensearch_models import Index
-from django_opensearch_models.management.commands.search_index import Command
+from django_opensearch_models import Document, Index
+from django_opensearch_models.bulk import AdaptiveChunkSizer, MemoryDeadLetterSink
+from django_opensearch_models.management.commands.search_index import Command, get_document_key
 from django_opensearch_models.registries import DocumentRegistry
 
 from .fixtures import WithFixturesMixin
+from .models import Article
 
 
 class SearchIndexTestCase(WithFixturesMixin, TestCase):
@@ -104,6 +112,56 @@ class SearchIndexTestCase(WithFixturesMixin, TestCase):
         self.doc_b1.update.assert_called_once_with(self.doc_b1_qs.iterator(), **expected_kwargs)
         self.doc_c1.update.assert_called_once_with(self.doc_c1_qs.iterator(), **expected_kwargs)
 
+    def test_populate_adaptive_bulk(self):
+        call_command("search_index", stdout=self.out, action="populate", adaptive_bulk=True)
+        chunk_sizer = self.doc_a1.update.call_args[1]["chunk_sizer"]
+        self.assertIsInstance(chunk_sizer, AdaptiveChunkSizer)
+        self.assertIsNot(self.doc_c1.update.call_args[1]["chunk_sizer"], chunk_sizer)
+        self.assertIn("Sent 0 bulk requests", self.out.getvalue())
+
+    def test_populate_no_adaptive_bulk(self):
+        self.doc_a1.django.adaptive_bulk = True
+        call_command("search_index", stdout=self.out, action="populate", models=["foo.ModelA"])
+        self.assertIsInstance(self.doc_a1.update.call_args[1]["chunk_sizer"], AdaptiveChunkSizer)
+        self.assertNotIn("chunk_sizer", self.doc_a2.update.call_args[1])
+
+        self.doc_a1.update.reset_mock()
+        call_command("search_index", stdout=self.out, action="populate", models=["foo.ModelA"], adaptive_bulk=False)
+        self.assertFalse(self.doc_a1.update.call_args[1]["chunk_sizer"])
+
+    def test_populate_skip_unchanged(self):
+        self.doc_a1.django.skip_unchanged = "local"
+        with patch.object(self.doc_a1, "clear_source_hashes") as clear_source_hashes:
+            call_command("search_index", stdout=self.out, action="populate")
+        clear_source_hashes.assert_called_once_with()
+        self.assertFalse(self.doc_a1.update.call_args[1]["skip_unchanged"])
+        self.assertNotIn("skip_unchanged", self.doc_a2.update.call_args[1])
+
+    def test_replay_failed(self):
+        sink = MemoryDeadLetterSink()
+        sink.add({"_index": "foo", "_id": 1, "_source": {}}, {"status": 429})
+        sink.add({"_index": "foo", "_id": 2, "_source": {}}, {"status": 400})
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                ok = action["_id"] == 1
+                yield ok, {"index": {"_id": action["_id"], "status": 201 if ok else 400}}
+
+        module = "django_opensearch_models.management.commands.search_index"
+        with (
+            patch(f"{module}.DEDConfig.dead_letter_sink", return_value=sink),
+            patch(f"{module}.streaming_bulk", side_effect=streaming_bulk),
+        ):
+            call_command("search_index", stdout=self.out, action="replay_failed")
+
+        self.assertEqual([record["action"]["_id"] for record in sink.read()], [2])
+        self.assertEqual(sink.read()[0]["error"], {"_id": 2, "status": 400})
+        self.assertIn("Replayed 1 actions, 1 failed again", self.out.getvalue())
+
+    def test_replay_failed_without_sink(self):
+        with self.assertRaises(CommandError):
+            call_command("search_index", stdout=self.out, action="replay_failed")
+
     def test_rebuild_indices(self):
         with patch.multiple(Command, _create=DEFAULT, _delete=DEFAULT, _populate=DEFAULT) as handles:
             handles["_delete"].return_value = True
@@ -119,3 +177,238 @@ class SearchIndexTestCase(WithFixturesMixin, TestCase):
             handles["_delete"].assert_called()
             handles["_create"].assert_not_called()
             handles["_populate"].assert_not_called()
+
+
+class SearchIndexResumeTestCase(WithFixturesMixin, TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.registry = DocumentRegistry()
+        self.index = Index("foo")
+        self.doc = self._generate_doc_mock(self.ModelA, self.index, Mock())
+        self.objects = [Mock(pk=1), Mock(pk=2), Mock(pk=3)]
+        self.doc.get_keyset_chunks = Mock(return_value=iter([self.objects[:2], self.objects[2:]]))
+
+        patch("django_opensearch_models.management.commands.search_index.registry", self.registry).start()
+        # "foo" is an index, not an alias
+        self.es_conn = Mock()
+        self.es_conn.indices.get_alias.side_effect = NotFoundError(404, "aliases_not_found_exception")
+        patch(
+            "django_opensearch_models.management.commands.search_index.connections.get_connection",
+            return_value=self.es_conn,
+        ).start()
+        self.addCleanup(patch.stopall)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.checkpoint_file = Path(tmp_dir.name) / "checkpoint.json"
+        self.options = {
+            "parallel": False,
+            "refresh": None,
+            "count": False,
+            "resume": True,
+            "checkpoint_file": self.checkpoint_file,
+            "adaptive_bulk": False,
+        }
+
+    def test_populate_by_chunk(self):
+        Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.doc.get_keyset_chunks.assert_called_once()
+        self.assertIsNone(self.doc.get_keyset_chunks.call_args[1]["start_after"])
+        self.assertEqual(self.doc.update.call_count, 2)
+        self.doc.update.assert_called_with(self.objects[2:], parallel=False, refresh=None)
+        self.assertFalse(self.checkpoint_file.exists())
+
+    def test_populate_interrupted(self):
+        self.doc.update.side_effect = [None, RuntimeError]
+        with self.assertRaises(RuntimeError):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        data = json.loads(self.checkpoint_file.read_text())
+        self.assertEqual(data["documents"][get_document_key(self.doc)], {"index": "foo", "last_pk": 2, "done": False})
+
+    def test_populate_resume(self):
+        key = get_document_key(self.doc)
+        self.checkpoint_file.write_text(
+            json.dumps({"indices": {}, "documents": {key: {"index": "foo", "last_pk": 2, "done": False}}})
+        )
+        self.doc.get_keyset_chunks.return_value = iter([self.objects[2:]])
+
+        Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.assertEqual(self.doc.get_keyset_chunks.call_args[1]["start_after"], 2)
+        self.doc.update.assert_called_once_with(self.objects[2:], parallel=False, refresh=None)
+        self.assertIn("Resuming after primary key 2", self.out.getvalue())
+        self.assertFalse(self.checkpoint_file.exists())
+
+    def test_populate_resume_ignores_other_index(self):
+        key = get_document_key(self.doc)
+        self.checkpoint_file.write_text(
+            json.dumps({"indices": {}, "documents": {key: {"index": "bar", "last_pk": 2, "done": True}}})
+        )
+
+        Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.assertIsNone(self.doc.get_keyset_chunks.call_args[1]["start_after"])
+        self.assertEqual(self.doc.update.call_count, 2)
+
+    def test_populate_resume_records_concrete_index(self):
+        self.es_conn.indices.get_alias.side_effect = None
+        self.es_conn.indices.get_alias.return_value = {"foo-1": {"aliases": {"foo": {}}}}
+        self.doc.update.side_effect = [None, RuntimeError]
+        with self.assertRaises(RuntimeError):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.es_conn.indices.get_alias.assert_called_with(name="foo")
+        data = json.loads(self.checkpoint_file.read_text())
+        self.assertEqual(data["documents"][get_document_key(self.doc)]["index"], "foo-1")
+
+        # The alias was moved to another index since
+        self.es_conn.indices.get_alias.return_value = {"foo-2": {"aliases": {"foo": {}}}}
+        self.doc.update.side_effect = None
+        self.doc.get_keyset_chunks.return_value = iter([self.objects])
+        Command(stdout=self.out)._populate([self.ModelA], self.options)
+        self.assertIsNone(self.doc.get_keyset_chunks.call_args[1]["start_after"])
+
+    def test_populate_resume_through_alias_of_several_indices(self):
+        self.es_conn.indices.get_alias.side_effect = None
+        self.es_conn.indices.get_alias.return_value = {
+            "foo-1": {"aliases": {"foo": {}}},
+            "foo-2": {"aliases": {"foo": {"is_write_index": True}}},
+        }
+        self.assertEqual(Command(stdout=self.out)._get_concrete_index("foo"), "foo-2")
+
+        self.es_conn.indices.get_alias.return_value = {
+            "foo-1": {"aliases": {"foo": {}}},
+            "foo-2": {"aliases": {"foo": {}}},
+        }
+        with self.assertRaises(CommandError):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+    def test_rebuild_resume(self):
+        key = get_document_key(self.doc)
+        self.checkpoint_file.write_text(
+            json.dumps({
+                "indices": {"foo": "foo-20240101"},
+                "documents": {key: {"index": "foo-20240101", "last_pk": 2, "done": False}},
+            })
+        )
+        self.doc.get_keyset_chunks.return_value = iter([self.objects[2:]])
+
+        cmd = Command(stdout=self.out)
+        with (
+            patch.object(cmd, "es_conn") as es_conn,
+            patch.object(self.index, "create") as create,
+            patch.multiple(Command, _delete=DEFAULT, _update_alias=DEFAULT) as handles,
+        ):
+            es_conn.indices.exists.return_value = True
+            cmd._rebuild([self.ModelA], [], {**self.options, "use_alias": True})
+
+        handles["_delete"].assert_not_called()
+        create.assert_not_called()
+        self.assertEqual(self.doc.get_keyset_chunks.call_args[1]["start_after"], 2)
+        handles["_update_alias"].assert_called_once()
+        self.assertEqual(handles["_update_alias"].call_args[0][:3], ("foo", "foo-20240101", False))
+        self.assertFalse(self.checkpoint_file.exists())
+        self.index._name = "foo"
+
+
+class InlineExecutor:
+    """Stand-in for ProcessPoolExecutor running the submitted calls in the current process."""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class SearchIndexProcessesTestCase(WithFixturesMixin, TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.registry = DocumentRegistry()
+        self.index = Index("foo")
+        self.qs = Mock()
+        self.doc = self._generate_doc_mock(self.ModelA, self.index, self.qs)
+        self.doc.update = Mock(return_value=(2, []))
+
+        module = "django_opensearch_models.management.commands.search_index"
+        patch(f"{module}.registry", self.registry).start()
+        patch(f"{module}.ProcessPoolExecutor", InlineExecutor).start()
+        self.addCleanup(patch.stopall)
+
+        self.options = {
+            "parallel": False,
+            "refresh": None,
+            "count": False,
+            "resume": False,
+            "processes": 3,
+            "adaptive_bulk": False,
+        }
+
+    def test_populate_processes(self):
+        with patch.object(Command, "_get_shard_ranges", return_value=[(None, 10), (10, 20), (20, None)]):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.assertEqual(self.doc.update.call_count, 3)
+        self.qs.filter.assert_any_call(pk__lt=10)
+        self.qs.filter.assert_any_call(pk__gte=20)
+        self.assertIn("Indexed 6 'ModelA' objects in 3 processes, 0 errors", self.out.getvalue())
+
+    def test_populate_processes_forwards_options(self):
+        self.options.update(parallel=True, adaptive_bulk=True)
+        with patch.object(Command, "_get_shard_ranges", return_value=[(None, None)]):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        kwargs = self.doc.update.call_args[1]
+        self.assertTrue(kwargs["parallel"])
+        self.assertIsInstance(kwargs["chunk_sizer"], AdaptiveChunkSizer)
+
+    def test_populate_processes_summarizes_bulk_requests(self):
+        self.options.update(adaptive_bulk=True)
+
+        def update(actions, chunk_sizer, **kwargs):
+            chunk_sizer.record(3, 1000, 0.1)
+            chunk_sizer.record(5, 1500, 0.1)
+            return 8, []
+
+        self.doc.update.side_effect = update
+        with patch.object(Command, "_get_shard_ranges", return_value=[(None, 10), (10, None)]):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.assertIn("Sent 4 bulk requests of 3-5 documents and 1000-1500 bytes", self.out.getvalue())
+
+    def test_populate_processes_errors(self):
+        self.doc.update.return_value = (1, [{"index": {"_id": 1, "status": 400}}])
+        with (
+            patch.object(Command, "_get_shard_ranges", return_value=[(None, 10), (10, None)]),
+            self.assertRaises(CommandError),
+        ):
+            Command(stdout=self.out)._populate([self.ModelA], self.options)
+
+        self.assertIn("Indexed 2 'ModelA' objects in 2 processes, 2 errors", self.out.getvalue())
+
+
+class ShardRangesTestCase(DjangoTestCase):
+    def test_get_shard_ranges(self):
+        # bulk_create doesn't send the signals that would index the articles
+        articles = Article.objects.bulk_create(Article(slug=f"article-{i}") for i in range(10))
+        pks = sorted(article.pk for article in articles)
+
+        @DocumentRegistry().register_document
+        class ArticleDocument(Document):
+            class Django:
+                model = Article
+
+        cmd = Command()
+        self.assertEqual(cmd._get_shard_ranges(ArticleDocument, 1), [(None, None)])
+        self.assertEqual(cmd._get_shard_ranges(ArticleDocument, 3), [(None, pks[3]), (pks[3], pks[6]), (pks[6], None)])
+        self.assertEqual(len(cmd._get_shard_ranges(ArticleDocument, 20)), 10)
@@ -1,18 +1,26 @@
+import asyncio
 import json
 import operator
 from unittest import SkipTest, TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
+from django.test import TestCase as DjangoTestCase
 from django.utils.translation import gettext_lazy as _
 from opensearchpy import GeoPoint, InnerDoc
+from opensearchpy.helpers import BulkIndexError
+from opensearchpy.serializer import JSONSerializer
 
 from django_opensearch_models import fields
-from django_opensearch_models.documents import DocType
+from django_opensearch_models.bulk import BulkRetrier
+from django_opensearch_models.documents import REPLACE_SOURCE_SCRIPT, DocType
 from django_opensearch_models.exceptions import ModelFieldNotMappedError, RedeclaredFieldError
-from django_opensearch_models.registries import registry
+from django_opensearch_models.registries import DocumentRegistry, registry
+from django_opensearch_models.signals import post_index
 
+from . import models as test_models
 from .models import Article
 
 
@@ -110,6 +118,25 @@ class BaseDocTypeTestCase:
         self.assertIsNone(CarDocument.django.queryset_pagination)
         self.assertEqual(CarDocument2.django.queryset_pagination, 120)
 
+    def test_pagination_added(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                pagination = "keyset"
+
+        self.assertEqual(CarDocument.django.pagination, "iterator")
+        self.assertEqual(CarDocument2.django.pagination, "keyset")
+
+    def test_invalid_pagination(self):
+        with self.assertRaises(ImproperlyConfigured):
+
+            @registry.register_document
+            class CarDocument2(DocType):
+                class Django:
+                    model = Car
+                    pagination = "offset"
+
     def test_fields_populated(self):
         mapping = CarDocument._doc_type.mapping
         self.assertEqual(set(mapping.properties.properties.to_dict().keys()), {"color", "name", "price", "type"})
@@ -161,6 +188,62 @@ class BaseDocTypeTestCase:
         self.assertIsInstance(qs, models.QuerySet)
         self.assertEqual(qs.model, Car)
 
+    def test_related_lookups_added(self):
+        @DocumentRegistry().register_document
+        class CarDocumentWithRelations(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField(), "country": fields.TextField()})
+            ads = fields.NestedField(properties={"title": fields.TextField()})
+            categories = fields.NestedField(properties={"title": fields.TextField()})
+
+            class Django:
+                model = test_models.Car
+                fields = ["name"]
+
+        @DocumentRegistry().register_document
+        class ManufacturerDocumentWithCars(DocType):
+            cars = fields.NestedField(
+                attr="car_set",
+                properties={
+                    "name": fields.TextField(),
+                    "ads": fields.NestedField(properties={"title": fields.TextField()}),
+                },
+            )
+
+            class Django:
+                model = test_models.Manufacturer
+
+        self.assertEqual(CarDocument.django.select_related, [])
+        self.assertEqual(CarDocument.django.prefetch_related, [])
+        self.assertEqual(CarDocumentWithRelations.django.select_related, ["manufacturer"])
+        self.assertEqual(CarDocumentWithRelations.django.prefetch_related, ["ads", "categories"])
+        self.assertEqual(ManufacturerDocumentWithCars.django.select_related, [])
+        self.assertEqual(ManufacturerDocumentWithCars.django.prefetch_related, ["car_set", "car_set__ads"])
+
+    def test_related_lookups_declared(self):
+        @DocumentRegistry().register_document
+        class CarDocumentWithManufacturer(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField()})
+
+            class Django:
+                model = test_models.Car
+                select_related = []
+
+        self.assertEqual(CarDocumentWithManufacturer.django.select_related, [])
+
+    def test_update_queryset_applies_related_lookups(self):
+        @DocumentRegistry().register_document
+        class CarDocumentWithManufacturer(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField()})
+
+            class Django:
+                model = test_models.Car
+
+        doc = CarDocumentWithManufacturer()
+        with patch("django_opensearch_models.documents.bulk"), patch.object(DocType, "_get_actions") as get_actions:
+            doc.update(test_models.Car.objects.all())
+        qs = get_actions.call_args[0][0]
+        self.assertEqual(qs.query.select_related, {"manufacturer": {}})
+
     def test_prepare(self):
         car = Car(name="Type 57", price=5400000.0, not_indexed="not_indexex")
         doc = CarDocument()
@@ -247,6 +330,18 @@ class BaseDocTypeTestCase:
             self.assertTrue(mock.call_args_list[0][1]["refresh"])
             self.assertEqual(doc._index.connection, mock.call_args_list[0][1]["client"])
 
+    def test_delete_ids(self):
+        doc = CarDocument()
+        with patch("django_opensearch_models.documents.bulk") as mock:
+            doc.delete_ids([51, 52], index="car_index_v2", raise_on_error=False)
+            actions = [
+                {"_op_type": "delete", "_index": "car_index_v2", "_id": 51, "_source": None},
+                {"_op_type": "delete", "_index": "car_index_v2", "_id": 52, "_source": None},
+            ]
+            self.assertEqual(actions, list(mock.call_args[1]["actions"]))
+            self.assertTrue(mock.call_args[1]["refresh"])
+            self.assertFalse(mock.call_args[1]["raise_on_error"])
+
     def test_model_instance_iterable_update(self):
         doc = CarDocument()
         car = Car(name="Type 57", price=5400000.0, not_indexed="not_indexex", pk=51)
@@ -357,6 +452,115 @@ class BaseDocTypeTestCase:
             self.assertEqual(mock_bulk.call_count, 0, "bulk is not called")
             self.assertEqual(mock_parallel_bulk.call_count, 1, "parallel bulk is called")
 
+    def test_model_instance_iterable_update_with_parallel_response(self):
+        doc = CarDocument()
+        error = {"index": {"_id": 2, "status": 400, "error": "mapper_parsing_exception"}}
+        results = [(True, {"index": {"_id": 1}}), (False, error), (True, {"index": {"_id": 3}}), (False, error)]
+        receiver = Mock()
+        post_index.connect(receiver)
+        self.addCleanup(post_index.disconnect, receiver)
+
+        with patch("django_opensearch_models.documents.parallel_bulk", return_value=iter(results)):
+            self.assertEqual(doc.update([Car(), Car(), Car(), Car()], parallel=True), (2, [error, error]))
+        receiver.assert_called_once()
+        self.assertEqual(receiver.call_args[1]["response"], (2, [error, error]))
+
+        with patch("django_opensearch_models.documents.parallel_bulk", return_value=iter(results)):
+            self.assertEqual(doc.update([Car()], parallel=True, max_errors=1), (2, [error]))
+
+        with patch("django_opensearch_models.documents.parallel_bulk", return_value=iter(results)):
+            self.assertEqual(doc.update([Car()], parallel=True, stats_only=True), (2, 2))
+
+    def test_model_instance_update_with_adaptive_bulk(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                adaptive_bulk = True
+
+        self.assertFalse(CarDocument.django.adaptive_bulk)
+        self.assertTrue(CarDocument2.django.adaptive_bulk)
+
+        with patch("django_opensearch_models.documents.AdaptiveChunkSizer") as sizer_class:
+            sizer_class.from_settings.return_value.bulk.return_value = (1, [])
+            self.assertEqual(CarDocument2().update(Car(), refresh=True), (1, []))
+        sizer_class.from_settings.return_value.bulk.assert_called_once()
+        self.assertTrue(sizer_class.from_settings.return_value.bulk.call_args[1]["refresh"])
+
+    def test_model_instance_update_with_chunk_sizer(self):
+        chunk_sizer = Mock()
+        chunk_sizer.streaming_bulk.return_value = iter([(True, {}), (True, {})])
+        with patch("django_opensearch_models.documents.parallel_bulk") as mock_parallel_bulk:
+            response = CarDocument().update([Car(), Car()], parallel=True, chunk_sizer=chunk_sizer)
+        self.assertEqual(response, (2, []))
+        mock_parallel_bulk.assert_not_called()
+        self.assertEqual(chunk_sizer.streaming_bulk.call_args[1]["thread_count"], 4)
+
+    def test_model_instance_update_pre_serialized(self):
+        doc = CarDocument()
+        car = Car(name=_("Type 57"), price=5400000.0, pk=51)
+        with patch("django_opensearch_models.documents.bulk") as mock:
+            doc.update(car)
+        expand = mock.call_args[1]["expand_action_callback"]
+        action = next(iter(mock.call_args[1]["actions"]))
+        self.assertEqual(
+            expand(action),
+            (
+                '{"index":{"_id":51,"_index":"car_index"}}',
+                '{"color":"blue","type":"break","name":"Type 57","price":5400000.0}',
+            ),
+        )
+        self.assertEqual(expand({"_op_type": "delete", "_id": 51}), ('{"delete":{"_id":51}}', None))
+
+    def test_get_serializer(self):
+        serializer = Mock()
+        serializer.dumps.return_value = "{}"
+        with (
+            patch.object(CarDocument, "get_serializer", return_value=serializer),
+            patch("django_opensearch_models.documents.bulk") as mock,
+        ):
+            CarDocument().update(Car(pk=51))
+        self.assertEqual(mock.call_args[1]["expand_action_callback"]({"_id": 51}), ("{}", "{}"))
+
+    def test_serializer_is_created_once(self):
+        CarDocument._serializer = None
+        self.addCleanup(setattr, CarDocument, "_serializer", None)
+        with patch("django_opensearch_models.documents.DEDConfig.serializer") as serializer:
+            self.assertIs(CarDocument.get_serializer(), CarDocument.get_serializer())
+        serializer.assert_called_once_with()
+
+    def test_bulk_errors_keep_the_sources(self):
+        def streaming_bulk(client, actions, expand_action_callback, **kwargs):
+            for action in actions:
+                _action, data = expand_action_callback(action)
+                yield False, {"index": {"_id": action["_id"], "status": 400, "data": data}}
+
+        car = Car(name="Type 57", price=5400000.0, pk=51)
+        with (
+            patch("django_opensearch_models.documents.streaming_bulk", side_effect=streaming_bulk),
+            self.assertRaises(BulkIndexError) as cm,
+        ):
+            CarDocument().update(car, retrier=BulkRetrier(max_retries=0))
+        self.assertEqual(
+            cm.exception.errors[0]["index"]["data"],
+            {"color": "blue", "type": "break", "name": "Type 57", "price": 5400000.0},
+        )
+
+    def test_model_instance_update_with_retries(self):
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                ok, status = statuses.pop(0)
+                yield ok, {"index": {"_id": action["_id"], "status": status}}
+
+        statuses = [(True, 201), (False, 429), (True, 201)]
+        car1, car2 = Car(pk=1), Car(pk=2)
+        retrier = BulkRetrier(max_retries=1, initial_backoff=0)
+        with patch("django_opensearch_models.documents.streaming_bulk", side_effect=streaming_bulk) as mock_bulk:
+            self.assertEqual(CarDocument().update([car1, car2], retrier=retrier, refresh=True), (2, []))
+        self.assertEqual(mock_bulk.call_count, 2)
+        self.assertTrue(mock_bulk.call_args[1]["refresh"])
+        self.assertFalse(mock_bulk.call_args[1]["raise_on_error"])
+
     def test_init_prepare_correct(self):
         """Check if init_prepare() runs and collects the right preparation functions."""
         d = CarDocument()
@@ -387,6 +591,43 @@ class BaseDocTypeTestCase:
             self.assertTrue("__call__" in dir(prep), "prep function should be callable")
             self.assertTrue(str(type(prep)) in e[1], "prep function is correct partial or method")
 
+    def test_prepare_plan_computed_once(self):
+        """Check that the preparation plan is built once per class and not on instantiation."""
+        plan = CarDocument.get_prepare_plan()
+        self.assertIs(CarDocument().get_prepare_plan(), plan)
+        self.assertEqual(
+            sorted((name, method_name, with_related) for name, field, method_name, with_related in plan),
+            [("color", "prepare_color", False), ("name", None, False), ("price", None, False), ("type", None, False)],
+        )
+
+        with patch.object(CarDocument, "get_prepare_plan", return_value=plan) as get_prepare_plan:
+            CarDocument()
+            get_prepare_plan.assert_not_called()
+
+    def test_prepare_related_instance_to_ignore(self):
+        @registry.register_document
+        class CarDocumentWithManufacturer(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField()})
+            manufacturer_name = fields.TextField()
+
+            class Django:
+                model = Car
+
+            def prepare_manufacturer_name_with_related(self, car, related_to_ignore):
+                return None if car.manufacturer == related_to_ignore else car.manufacturer.name
+
+        manufacturer = Manufacturer(pk=1, name="Bugatti")
+        car = Car(name="Type 57", manufacturer=manufacturer)
+
+        self.assertEqual(
+            CarDocumentWithManufacturer().prepare(car),
+            {"manufacturer": {"name": "Bugatti"}, "manufacturer_name": "Bugatti"},
+        )
+        self.assertEqual(
+            CarDocumentWithManufacturer(related_instance_to_ignore=manufacturer).prepare(car),
+            {"manufacturer": {}, "manufacturer_name": None},
+        )
+
     def test_init_prepare_results(self):
         """Check if the results from init_prepare() are actually used in prepare()."""
         d = CarDocument()
@@ -522,3 +763,413 @@ class RealTimeDocTypeTestCase(BaseDocTypeTestCase, TestCase):
 
 class CeleryDocTypeTestCase(BaseDocTypeTestCase, TestCase):
     TARGET_PROCESSOR = "django_opensearch_models.signals.CelerySignalProcessor"
+
+
+class KeysetPaginationTestCase(DjangoTestCase):
+    def setUp(self):
+        # bulk_create doesn't send the signals that would index the articles
+        self.articles = test_models.Article.objects.bulk_create(
+            test_models.Article(slug=f"article-{i}") for i in range(5)
+        )
+
+        @DocumentRegistry().register_document
+        class ArticleDocument(DocType):
+            class Django:
+                model = test_models.Article
+                fields = ["slug"]
+                pagination = "keyset"
+                queryset_pagination = 2
+
+        self.doc = ArticleDocument()
+
+    def test_get_indexing_queryset(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(list(self.doc.get_indexing_queryset()), sorted(self.articles, key=lambda a: a.pk))
+
+    def test_get_keyset_chunks(self):
+        articles = sorted(self.articles, key=lambda a: a.pk)
+        chunks = list(self.doc.get_keyset_chunks(self.doc.get_queryset().order_by("-slug")))
+        self.assertEqual(chunks, [articles[:2], articles[2:4], articles[4:]])
+
+        chunks = list(self.doc.get_keyset_chunks(self.doc.get_queryset(), start_after=articles[1].pk))
+        self.assertEqual(chunks, [articles[2:4], articles[4:]])
+
+
+class ValuesFastPathTestCase(DjangoTestCase):
+    def setUp(self):
+        # bulk_create doesn't send the signals that would index the manufacturers
+        self.manufacturers = test_models.Manufacturer.objects.bulk_create(
+            test_models.Manufacturer(name=f"manufacturer-{i}", country_code="FR", created=f"2020-01-0{i + 1}")
+            for i in range(3)
+        )
+
+        @DocumentRegistry().register_document
+        class ManufacturerDocument(DocType):
+            brand = fields.TextField(attr="name")
+
+            class Django:
+                model = test_models.Manufacturer
+                fields = ["name", "country_code", "created"]
+                use_values = True
+
+        self.doc_class = ManufacturerDocument
+
+    def get_actions(self, doc):
+        with patch.object(type(doc), "bulk") as mock_bulk:
+            doc.update(doc.get_indexing_queryset())
+        return list(mock_bulk.call_args[0][0])
+
+    def test_values_plan(self):
+        self.assertEqual(
+            self.doc_class.get_values_plan(),
+            [("brand", "name"), ("name", "name"), ("country_code", "country_code"), ("created", "created")],
+        )
+
+    def test_values_plan_with_prepare_method(self):
+        class ManufacturerDocument(self.doc_class):
+            def prepare_brand(self, instance):
+                return instance.name.upper()
+
+        self.assertIsNone(ManufacturerDocument.get_values_plan())
+        self.assertIsNotNone(self.doc_class.get_values_plan())
+
+    def test_values_plan_with_unsupported_fields(self):
+        for field in (
+            fields.TextField(attr="country"),
+            fields.FileField(attr="logo"),
+            fields.ObjectField(attr="car_set", properties={"name": fields.TextField()}),
+        ):
+
+            @DocumentRegistry().register_document
+            class ManufacturerDocument(DocType):
+                other = field
+
+                class Django:
+                    model = test_models.Manufacturer
+                    fields = ["name"]
+                    use_values = True
+
+            self.assertIsNone(ManufacturerDocument.get_values_plan(), field)
+
+    def test_update_from_values(self):
+        doc = self.doc_class()
+        with self.assertNumQueries(1):
+            actions = self.get_actions(doc)
+
+        manufacturers = test_models.Manufacturer.objects.order_by("pk")
+        self.assertEqual(actions, [doc._prepare_action(manufacturer, "index") for manufacturer in manufacturers])
+
+    def test_update_from_values_with_keyset_pagination(self):
+        self.doc_class.django.pagination = "keyset"
+        self.doc_class.django.queryset_pagination = 2
+        with self.assertNumQueries(2):
+            actions = self.get_actions(self.doc_class())
+        self.assertEqual([action["_id"] for action in actions], sorted(m.pk for m in self.manufacturers))
+
+    def test_update_from_values_skips_unchanged(self):
+        self.doc_class.django.skip_unchanged = "local"
+        self.doc_class.clear_source_hashes()
+        self.addCleanup(self.doc_class.clear_source_hashes)
+        doc = self.doc_class()
+        pks = [manufacturer.pk for manufacturer in self.manufacturers]
+
+        def update(**kwargs):
+            sent = []
+
+            def bulk(actions, **bulk_kwargs):
+                sent.extend(actions)
+                return len(sent), []
+
+            with patch.object(type(doc), "bulk", side_effect=bulk):
+                doc.update(doc.get_indexing_queryset(), **kwargs)
+            return [action["_id"] for action in sent]
+
+        self.assertEqual(update(), pks)
+        test_models.Manufacturer.objects.filter(pk=pks[1]).update(name="renamed")
+        self.assertEqual(update(), pks[1:2])
+
+        self.assertEqual(update(action="delete"), pks)
+        self.assertEqual(update(), pks)
+
+    def test_fallback_to_instances(self):
+        class ManufacturerDocument(self.doc_class):
+            def should_index_object(self, obj):
+                return obj.name != "manufacturer-1"
+
+        actions = self.get_actions(ManufacturerDocument())
+        self.assertEqual([action["_source"]["name"] for action in actions], ["manufacturer-0", "manufacturer-2"])
+
+
+class PartialUpdateTestCase(TestCase):
+    def setUp(self):
+        @DocumentRegistry().register_document
+        class CarDocument(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField()})
+            categories = fields.NestedField(properties={"title": fields.TextField()})
+            ads = fields.NestedField(properties={"title": fields.TextField()})
+            type_label = fields.TextField(attr="get_type_display")
+            summary = fields.TextField()
+
+            class Django:
+                model = test_models.Car
+                fields = ["name", "launched"]
+                partial_updates = True
+
+            def prepare_summary(self, instance):
+                return f"{instance.name} ({instance.launched})"
+
+        self.doc_class = CarDocument
+        self.car = test_models.Car(pk=51, name="Type 57", launched="1934-01-01", type="co")
+
+    def test_get_update_field_names(self):
+        self.assertEqual(set(self.doc_class.get_update_field_names(["name"])), {"name", "type_label", "summary"})
+        self.assertEqual(
+            set(self.doc_class.get_update_field_names(["manufacturer_id"])), {"manufacturer", "type_label", "summary"}
+        )
+        self.assertEqual(set(self.doc_class.get_update_field_names([])), {"type_label", "summary"})
+
+    def test_partial_update(self):
+        with patch.object(self.doc_class, "_bulk", return_value=(1, [])) as mock_bulk:
+            self.assertEqual(self.doc_class().update(self.car, update_fields=["name"]), (1, []))
+
+        actions = mock_bulk.call_args[0][0]
+        self.assertEqual(
+            actions,
+            [
+                {
+                    "_op_type": "update",
+                    "_index": self.doc_class._index._name,
+                    "_id": 51,
+                    "_source": {"doc": {"name": "Type 57", "type_label": "Coupé", "summary": "Type 57 (1934-01-01)"}},
+                }
+            ],
+        )
+        self.assertFalse(mock_bulk.call_args[1]["raise_on_error"])
+
+    def test_partial_update_of_missing_document(self):
+        missing = {"update": {"_id": 51, "status": 404, "error": "document_missing_exception"}}
+        with (
+            patch.object(self.doc_class, "_bulk", side_effect=[(0, [missing]), (1, [])]) as mock_bulk,
+            patch.object(self.doc_class, "_get_actions", return_value=[{"_op_type": "index"}]),
+        ):
+            self.assertEqual(self.doc_class().update(self.car, update_fields=["name"]), (1, []))
+
+        self.assertEqual(mock_bulk.call_count, 2)
+        self.assertEqual([action["_op_type"] for action in mock_bulk.call_args[0][0]], ["index"])
+
+    def test_partial_update_error(self):
+        error = {"update": {"_id": 51, "status": 400, "error": "mapper_parsing_exception"}}
+        with patch.object(self.doc_class, "_bulk", return_value=(0, [error])), self.assertRaises(BulkIndexError):
+            self.doc_class().update(self.car, update_fields=["name"])
+
+    def test_full_update_without_partial_updates(self):
+        self.doc_class.django.partial_updates = False
+        with (
+            patch.object(self.doc_class, "_bulk", return_value=(1, [])) as mock_bulk,
+            patch.object(self.doc_class, "_get_actions", return_value=[{"_op_type": "index"}]),
+        ):
+            self.doc_class().update(self.car, update_fields=["name"])
+            actions = list(mock_bulk.call_args[0][0])
+        self.assertEqual(actions[0]["_op_type"], "index")
+
+
+class SkipUnchangedTestCase(TestCase):
+    def setUp(self):
+        @DocumentRegistry().register_document
+        class CarDocument(DocType):
+            class Django:
+                model = test_models.Car
+                fields = ["name"]
+                skip_unchanged = "local"
+
+        self.doc_class = CarDocument
+        self.doc_class.clear_source_hashes()
+        self.addCleanup(self.doc_class.clear_source_hashes)
+        self.cars = [test_models.Car(pk=1, name="Type 57"), test_models.Car(pk=2, name="Type 35")]
+
+    def update(self, cars, response=(2, []), **kwargs):
+        sent = []
+
+        def bulk(actions, **bulk_kwargs):
+            sent.extend(actions)
+            return response
+
+        with patch.object(self.doc_class, "_bulk", side_effect=bulk):
+            self.doc_class().update(cars, **kwargs)
+        return sent
+
+    def test_unchanged_documents_are_skipped(self):
+        self.assertEqual([action["_id"] for action in self.update(self.cars)], [1, 2])
+        self.assertEqual(self.update(self.cars), [])
+
+        self.cars[1].name = "Type 59"
+        self.assertEqual([action["_id"] for action in self.update(self.cars)], [2])
+
+        self.assertEqual([action["_id"] for action in self.update(self.cars, skip_unchanged=False)], [1, 2])
+
+    def test_failed_documents_are_not_skipped(self):
+        error = {"index": {"_id": "2", "status": 400, "error": "mapper_parsing_exception"}}
+        self.update(self.cars, response=(1, [error]))
+        self.assertEqual([action["_id"] for action in self.update(self.cars)], [2])
+
+    def test_failed_documents_of_a_parallel_bulk_are_not_skipped(self):
+        def streaming_bulk(actions, **kwargs):
+            for action in actions:
+                yield False, {"index": {"_id": str(action["_id"]), "status": 400}}
+
+        self.cars = [test_models.Car(pk=pk, name="Type 57") for pk in range(1, 6)]
+        with patch.object(self.doc_class, "_streaming_bulk", side_effect=streaming_bulk):
+            _success, errors = self.doc_class().update(self.cars, parallel=True, raise_on_error=False, max_errors=2)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(len(self.update(self.cars)), len(self.cars))
+
+    def test_deleted_documents_are_not_skipped(self):
+        self.update(self.cars)
+        self.update(self.cars[:1], action="delete")
+        self.assertEqual([action["_id"] for action in self.update(self.cars)], [1])
+
+    def test_clear_source_hashes(self):
+        self.update(self.cars)
+        self.doc_class.clear_source_hashes()
+        self.assertEqual(len(self.update(self.cars)), len(self.cars))
+
+    def test_detect_noop(self):
+        self.doc_class.django.skip_unchanged = "detect_noop"
+        actions = self.update(self.cars[:1])
+        self.assertEqual(
+            actions,
+            [
+                {
+                    "_op_type": "update",
+                    "_index": self.doc_class._index._name,
+                    "_id": 1,
+                    "_source": {
+                        "script": {
+                            "source": REPLACE_SOURCE_SCRIPT,
+                            "lang": "painless",
+                            "params": {"source": {"name": "Type 57"}},
+                        },
+                        "upsert": {"name": "Type 57"},
+                    },
+                }
+            ],
+        )
+
+    def test_detect_noop_replaces_cleared_fields(self):
+        @DocumentRegistry().register_document
+        class CarDocument(DocType):
+            manufacturer = fields.ObjectField(properties={"name": fields.TextField()})
+
+            class Django:
+                model = test_models.Car
+                fields = ["name"]
+                skip_unchanged = "detect_noop"
+
+        def apply(source, action):
+            # What OpenSearch does with the update action of an indexed document
+            body = action["_source"]
+            if "script" in body:
+                self.assertEqual(body["script"]["source"], REPLACE_SOURCE_SCRIPT)
+                return body["script"]["params"]["source"]
+            # A partial document is merged in the indexed one
+            merged = dict(source)
+            for key, value in body["doc"].items():
+                merged[key] = apply(source[key], {"_source": {"doc": value}}) if isinstance(value, dict) else value
+            return merged
+
+        self.doc_class = CarDocument
+        car = test_models.Car(pk=1, name="Type 57", manufacturer=test_models.Manufacturer(name="Bugatti"))
+        (action,) = self.update([car])
+        indexed = action["_source"]["upsert"]
+        self.assertEqual(indexed["manufacturer"], {"name": "Bugatti"})
+
+        car.manufacturer = None
+        (action,) = self.update([car])
+        self.assertEqual(apply(indexed, action), {"manufacturer": {}, "name": "Type 57"})
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+
+            @DocumentRegistry().register_document
+            class CarDocument(DocType):
+                class Django:
+                    model = test_models.Car
+                    skip_unchanged = "always"
+
+
+class AsyncUpdateTestCase(DjangoTestCase):
+    def setUp(self):
+        self.manufacturers = test_models.Manufacturer.objects.bulk_create(
+            test_models.Manufacturer(name=f"manufacturer-{i}", country_code="FR", created=f"2020-01-0{i + 1}")
+            for i in range(3)
+        )
+
+        @DocumentRegistry().register_document
+        class ManufacturerDocument(DocType):
+            class Django:
+                model = test_models.Manufacturer
+                fields = ["name"]
+
+        self.doc_class = ManufacturerDocument
+
+        self.bodies = []
+
+        def bulk(body, **kwargs):
+            self.bodies.append(body)
+            lines = [json.loads(line) for line in body.splitlines()]
+            return {
+                "items": [{op: {"_id": info["_id"], "status": 200}} for line in lines[::2] for op, info in line.items()]
+            }
+
+        self.client = Mock()
+        self.client.bulk = AsyncMock(side_effect=bulk)
+        self.client.transport.serializer = JSONSerializer()
+        patcher = patch("django_opensearch_models.documents.get_async_connection", AsyncMock(return_value=self.client))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_lines(self):
+        return [json.loads(line) for body in self.bodies for line in body.splitlines()]
+
+    async def test_aupdate_queryset(self):
+        response = await self.doc_class().aupdate(test_models.Manufacturer.objects.order_by("pk"), refresh=False)
+        self.assertEqual(response, (len(self.manufacturers), []))
+        self.assertEqual(self.sent_lines()[1::2], [{"name": manufacturer.name} for manufacturer in self.manufacturers])
+        self.assertEqual(self.client.bulk.call_args[1]["refresh"], False)
+
+    async def test_aupdate_instance_delete(self):
+        manufacturer = self.manufacturers[0]
+        await self.doc_class().aupdate(manufacturer, action="delete")
+        self.assertEqual(
+            self.sent_lines(), [{"delete": {"_index": self.doc_class._index._name, "_id": manufacturer.pk}}]
+        )
+
+    async def test_aupdate_async_iterable(self):
+        async def manufacturers():
+            for manufacturer in self.manufacturers[:2]:
+                await asyncio.sleep(0)
+                yield manufacturer
+
+        await self.doc_class().aupdate(manufacturers())
+        self.assertEqual(
+            [line["index"]["_id"] for line in self.sent_lines()[::2]], [m.pk for m in self.manufacturers[:2]]
+        )
+
+    async def test_aupdate_sync_only_arguments(self):
+        for kwargs in ({"parallel": True}, {"update_fields": ["name"]}, {"skip_unchanged": False}):
+            with self.assertRaisesMessage(TypeError, next(iter(kwargs))):
+                await self.doc_class().aupdate(self.manufacturers[0], **kwargs)
+        with self.assertRaisesMessage(TypeError, "retrier"):
+            await self.doc_class().abulk([], retrier=BulkRetrier())
+        self.client.bulk.assert_not_called()
+
+    async def test_abulk_post_index(self):
+        receiver = Mock()
+        post_index.connect(receiver, sender=self.doc_class)
+        self.addCleanup(post_index.disconnect, receiver, sender=self.doc_class)
+
+        doc = self.doc_class()
+        response = await doc.abulk([{"_index": "foo", "_id": 1, "_source": {"name": "foo"}}])
+        self.assertEqual(response, (1, []))
+        receiver.assert_called_once()
+        self.assertIs(receiver.call_args[1]["instance"], doc)
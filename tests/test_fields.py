@@ -1,3 +1,4 @@
+from collections import UserDict
 from unittest import TestCase
 from unittest.mock import Mock, NonCallableMock
 
@@ -28,6 +29,8 @@ from django_opensearch_models.fields import (
     TextField,
 )
 
+from .models import Car
+
 
 class DEDFieldTestCase(TestCase):
     def test_attr_to_path(self):
@@ -69,6 +72,38 @@ class DEDFieldTestCase(TestCase):
         instance = NonCallableMock(attr1="foo", related=None)
         self.assertEqual(field.get_value_from_instance(instance), None)
 
+    def test_get_value_from_instance_caches_accessor(self):
+        field = DEDField(attr="name")
+        self.assertEqual(field.get_value_from_instance(Car(name="foo")), "foo")
+        self.assertEqual(field.get_value_from_instance(Car(name="bar")), "bar")
+        self.assertEqual(set(field._accessors), {(0, Car)})
+
+        self.assertEqual(field.get_value_from_instance({"name": "baz"}), "baz")
+        self.assertEqual(set(field._accessors), {(0, Car), (0, dict)})
+
+        # The lookup of the other objects may change from one object to the next
+        class Dummy:
+            name = "qux"
+
+        self.assertEqual(field.get_value_from_instance(Dummy()), "qux")
+        self.assertEqual(set(field._accessors), {(0, Car), (0, dict)})
+
+    def test_get_value_from_instance_cached_accessor_fallback(self):
+        class Row(UserDict):
+            attr1 = "from attribute"
+
+        field = DEDField(attr="attr1")
+        self.assertEqual(field.get_value_from_instance(Row(attr1="from key")), "from key")
+        self.assertEqual(field.get_value_from_instance(Row(other="foo")), "from attribute")
+        # A key still wins over the attribute found for the previous object
+        self.assertEqual(field.get_value_from_instance(Row(attr1="from key")), "from key")
+
+    def test_get_value_from_instance_index(self):
+        field = DEDField(attr="items.1")
+        instance = NonCallableMock(items=["foo", "bar"])
+        self.assertEqual(field.get_value_from_instance(instance), "bar")
+        self.assertIsNone(field.get_value_from_instance(NonCallableMock(items=["foo"])))
+
     def test_get_value_from_lazy_object(self):
         field = DEDField(attr="translation")
         instance = NonCallableMock(translation=_("foo"))
@@ -363,6 +363,13 @@ class IntegrationTestCase(OSTestCase, TransactionTestCase):
                 {ad3.pk, self.ad1.pk, self.ad2.pk},
             )
 
+    def test_queryset_related_lookups_queries(self):
+        Ad(title="Ad 3", car=self.car1).save()
+
+        # One query for the cars and their manufacturer, one per prefetched relation (ads, categories)
+        with self.assertNumQueries(3):
+            CarDocument().update(Car.objects.all())
+
     def test_default_document_id(self):
         obj_id = 12458
         article_slug = "some-article"
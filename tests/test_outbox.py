@@ -0,0 +1,234 @@
+import json
+from http import HTTPStatus
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.test import TestCase
+from opensearchpy.exceptions import ConnectionError as OpenSearchConnectionError
+from opensearchpy.exceptions import TransportError
+
+from django_opensearch_models.bulk import MemoryDeadLetterSink
+from django_opensearch_models.documents import DocType
+from django_opensearch_models.outbox import signals as outbox
+from django_opensearch_models.outbox.models import OutboxEntry
+from django_opensearch_models.outbox.signals import OutboxError, OutboxSignalProcessor, drain_outbox
+from django_opensearch_models.registries import DocumentRegistry, get_document_key
+
+from .models import Car, Manufacturer
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+
+        @self.registry.register_document
+        class CarDocument(DocType):
+            class Index:
+                name = "cars"
+
+            class Django:
+                model = Car
+                fields = ["name"]
+                related_models = [Manufacturer]
+
+            def get_instances_from_related(self, related_instance):
+                return related_instance.car_set.all()
+
+            @classmethod
+            def generate_id(cls, object_instance):
+                return f"car-{object_instance.pk}"
+
+        self.doc_class = CarDocument
+        for target in ("signals", "outbox.signals"):
+            patcher = patch(f"django_opensearch_models.{target}.registry", self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # The bulk requests are answered by respond(), with the status of `self.statuses` by id
+        self.statuses = {}
+        patcher = patch("opensearchpy.OpenSearch.bulk", side_effect=self.respond)
+        self.bulk = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.processor = OutboxSignalProcessor(Mock())
+        # Only called directly by the tests
+        self.processor.teardown()
+
+        # bulk_create doesn't send the signals
+        (self.manufacturer,) = Manufacturer.objects.bulk_create([
+            Manufacturer(name="Peugeot", country_code="FR", created="2020-01-01")
+        ])
+        self.cars = Car.objects.bulk_create(
+            Car(name=f"car-{i}", launched="2020-01-01", manufacturer=self.manufacturer if i else None) for i in range(3)
+        )
+
+    def respond(self, body, **_params):
+        lines = [json.loads(line) for line in body.strip().split("\n")]
+        items = []
+        while lines:
+            ((op_type, meta),) = lines.pop(0).items()
+            if op_type != "delete":
+                lines.pop(0)
+            status = self.statuses.get(meta["_id"], HTTPStatus.OK)
+            item = {"_index": meta["_index"], "_id": meta["_id"], "status": status}
+            if status != HTTPStatus.OK:
+                item["error"] = {"type": "mapper_parsing_exception"}
+            items.append({op_type: item})
+        return {"took": 1, "errors": any("error" in item for item in items), "items": items}
+
+    def get_requests(self):
+        """Return the ``(op_type, _id)`` of the actions of each bulk request."""
+        requests = []
+        for call in self.bulk.call_args_list:
+            lines = [json.loads(line) for line in call.kwargs["body"].strip().split("\n")]
+            requests.append(
+                sorted((op_type, meta["_id"]) for line in lines for op_type, meta in line.items() if "_id" in meta)
+            )
+        return requests
+
+    def get_entries(self):
+        return list(OutboxEntry.objects.order_by("pk").values_list("object_pk", "action", "index", "document_id"))
+
+    def test_entries_are_written(self):
+        self.processor.handle_save(Car, self.cars[0])
+        self.processor.handle_delete(Car, self.cars[2])
+        self.assertEqual(
+            self.get_entries(),
+            [
+                (str(self.cars[0].pk), "index", "cars", ""),
+                (str(self.cars[2].pk), "delete", "cars", f"car-{self.cars[2].pk}"),
+            ],
+        )
+        entry = OutboxEntry.objects.first()
+        self.assertEqual((entry.model, entry.document), ("tests.car", get_document_key(self.doc_class)))
+        self.bulk.assert_not_called()
+
+    def test_related_objects(self):
+        self.processor.handle_save(Manufacturer, self.manufacturer)
+        self.assertEqual(
+            [entry[:2] for entry in self.get_entries()],
+            [(str(self.cars[1].pk), "index"), (str(self.cars[2].pk), "index")],
+        )
+
+    def test_rolled_back_entries(self):
+        def save_and_fail():
+            with transaction.atomic():
+                self.processor.handle_save(Car, self.cars[0])
+                raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            save_and_fail()
+        self.assertEqual(self.get_entries(), [])
+
+    def test_drain(self):
+        for car in (self.cars[0], self.cars[1], self.cars[0]):
+            self.processor.handle_save(Car, car)
+        self.processor.handle_save(Car, self.cars[2])
+        self.processor.handle_delete(Car, self.cars[2])
+
+        self.assertEqual(drain_outbox(batch_size=3), 5)
+        self.assertEqual(self.get_entries(), [])
+
+        # Each batch is sent on its own, the last entry of an object in a batch wins
+        self.assertEqual(
+            self.get_requests(),
+            [
+                [("index", f"car-{self.cars[0].pk}"), ("index", f"car-{self.cars[1].pk}")],
+                [("delete", f"car-{self.cars[2].pk}")],
+            ],
+        )
+
+    def test_failed_entries_are_kept(self):
+        self.processor.handle_save(Car, self.cars[0])
+        self.processor.handle_save(Car, self.cars[1])
+        self.statuses[f"car-{self.cars[1].pk}"] = 429
+        with self.assertRaises(OutboxError):
+            drain_outbox()
+        self.assertEqual(len(self.get_entries()), 2)
+
+        self.bulk.side_effect = OpenSearchConnectionError("N/A", "Connection refused", Exception())
+        with self.assertRaises(OpenSearchConnectionError):
+            drain_outbox()
+        self.assertEqual(len(self.get_entries()), 2)
+
+    def test_permanent_errors_are_logged(self):
+        self.processor.handle_save(Car, self.cars[0])
+        self.processor.handle_save(Car, self.cars[1])
+        self.statuses[f"car-{self.cars[1].pk}"] = 400
+        with self.assertLogs("django_opensearch_models.outbox.signals", "ERROR") as logs:
+            self.assertEqual(drain_outbox(), 2)
+        self.assertEqual(self.get_entries(), [])
+        self.assertIn(f"cars/car-{self.cars[1].pk}", logs.output[0])
+
+    def test_permanent_errors_are_dead_lettered(self):
+        self.processor.handle_save(Car, self.cars[0])
+        self.processor.handle_delete(Car, self.cars[2])
+        self.statuses[f"car-{self.cars[0].pk}"] = 400
+        # Deleted documents which are already gone aren't errors
+        self.statuses[f"car-{self.cars[2].pk}"] = 404
+        sink = MemoryDeadLetterSink()
+        with patch.object(outbox.DEDConfig, "dead_letter_sink", return_value=sink):
+            self.assertEqual(drain_outbox(), 2)
+        self.assertEqual(self.get_entries(), [])
+        (record,) = sink.read()
+        self.assertEqual(
+            record["action"],
+            {"_op_type": "index", "_index": "cars", "_id": f"car-{self.cars[0].pk}", "_source": {"name": "car-0"}},
+        )
+        self.assertEqual(record["error"]["status"], 400)
+
+    def test_polling_retries_failed_entries(self):
+        self.processor.handle_save(Car, self.cars[0])
+        responses = iter([
+            OpenSearchConnectionError("N/A", "Connection refused", Exception()),
+            TransportError(HTTPStatus.SERVICE_UNAVAILABLE, "cluster_block_exception"),
+            HTTPStatus.TOO_MANY_REQUESTS,
+        ])
+
+        def respond(body, **params):
+            response = next(responses, None)
+            if isinstance(response, Exception):
+                raise response
+            self.statuses[f"car-{self.cars[0].pk}"] = response or HTTPStatus.OK
+            return self.respond(body, **params)
+
+        self.bulk.side_effect = respond
+        # The worker is stopped by the sleep once the outbox is sent
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if not self.get_entries():
+                raise KeyboardInterrupt
+
+        with (
+            patch.object(outbox.time, "sleep", side_effect=sleep),
+            self.assertLogs("django_opensearch_models.outbox.signals", "WARNING"),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            drain_outbox(poll_interval=5)
+        self.assertEqual(sleeps, [5, 10, 20, 5])
+
+    def test_polling_raises_permanent_request_errors(self):
+        self.processor.handle_save(Car, self.cars[0])
+        self.bulk.side_effect = TransportError(HTTPStatus.BAD_REQUEST, "illegal_argument_exception")
+        with patch.object(outbox.time, "sleep") as sleep, self.assertRaises(TransportError):
+            drain_outbox(poll_interval=5)
+        sleep.assert_not_called()
+        self.assertEqual(len(self.get_entries()), 1)
+
+    def test_drain_outbox_command(self):
+        self.processor.handle_save(Car, self.cars[0])
+        out = StringIO()
+        call_command("search_index", "--drain-outbox", stdout=out)
+        self.assertEqual(out.getvalue(), "Sent 1 outbox entries\n")
+        self.assertEqual(self.get_entries(), [])
+        self.bulk.assert_called_once()
+
+    def test_drain_outbox_command_without_app(self):
+        with (
+            self.modify_settings(INSTALLED_APPS={"remove": "django_opensearch_models.outbox"}),
+            self.assertRaisesMessage(CommandError, "add 'django_opensearch_models.outbox' to INSTALLED_APPS"),
+        ):
+            call_command("search_index", "--drain-outbox", stdout=StringIO())
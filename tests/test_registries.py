@@ -1,12 +1,18 @@
+import datetime
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
 
 from django_opensearch_models import Index
+from django_opensearch_models.documents import DocType
 from django_opensearch_models.registries import DocumentRegistry
 
 from .fixtures import WithFixturesMixin
+from .models import Car, Manufacturer
 
 
 class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
@@ -66,6 +72,14 @@ class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
         self.doc_a1.update.assert_called_once_with(instance)
         self.doc_a2.update.assert_called_once_with(instance)
 
+    def test_update_instance_with_update_fields(self):
+        instance = self.ModelA()
+        with patch.object(self.doc_a1.django, "partial_updates", new=True):
+            self.registry.update(instance, update_fields=frozenset({"name"}))
+
+        self.doc_a1.update.assert_called_once_with(instance, update_fields=frozenset({"name"}))
+        self.doc_a2.update.assert_called_once_with(instance)
+
     def test_update_related_instances(self):
         doc_d1 = self._generate_doc_mock(self.ModelD, self.index_1, _related_models=[self.ModelE, self.ModelB])
         doc_d2 = self._generate_doc_mock(self.ModelD, self.index_1, _related_models=[self.ModelE])
@@ -124,3 +138,110 @@ class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
         self.assertFalse(self.doc_a1.update.called)
 
         settings.OPENSEARCH_AUTOSYNC = True
+
+
+related_update_handler = Mock()
+
+
+class RelatedUpdateTestCase(DjangoTestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+        index = Index(name="cars")
+
+        class CarDoc(DocType):
+            class Django:
+                model = Car
+                related_models = [Manufacturer]
+                queryset_pagination = 2
+
+        index.document(CarDoc)
+        self.registry.register_document(CarDoc)
+        CarDoc.update = Mock(return_value=(0, []))
+        CarDoc.get_instances_from_related = Mock(return_value=Car.objects.all())
+        self.doc = CarDoc
+
+        # bulk_create doesn't send the signals that would index the cars
+        self.cars = Car.objects.bulk_create(Car(name=f"Car {i}", launched=datetime.date(2020, 1, 1)) for i in range(5))
+        self.manufacturer = Manufacturer(pk=1, country_code="FR", created=datetime.date(2020, 1, 1))
+        related_update_handler.reset_mock()
+
+    def get_updated_pks(self):
+        self.doc.update.assert_called_once()
+        return [car.pk for car in self.doc.update.call_args[0][0]]
+
+    def test_update_related_iterates(self):
+        self.registry.update_related(self.manufacturer)
+        iterator = self.doc.update.call_args[0][0]
+        self.assertNotIsInstance(iterator, type(Car.objects.all()))
+        self.assertEqual(sorted(self.get_updated_pks()), sorted(car.pk for car in self.cars))
+
+    @override_settings(
+        OPENSEARCH_RELATED_UPDATE_THRESHOLD=3,
+        OPENSEARCH_RELATED_UPDATE_HANDLER="tests.test_registries.related_update_handler",
+    )
+    def test_update_related_threshold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.registry.update_related(self.manufacturer)
+            related_update_handler.assert_not_called()
+        pks = sorted(car.pk for car in self.cars)
+        self.assertEqual(self.get_updated_pks(), pks[:3])
+
+        related_update_handler.assert_called_once()
+        doc, queryset = related_update_handler.call_args[0]
+        self.assertIs(doc, self.doc)
+        self.assertEqual(list(queryset.values_list("pk", flat=True)), pks[3:])
+        self.assertIsNone(related_update_handler.call_args[1]["related_instance_to_ignore"])
+
+    @override_settings(
+        OPENSEARCH_RELATED_UPDATE_THRESHOLD=1,
+        OPENSEARCH_RELATED_UPDATE_HANDLER="tests.test_registries.related_update_handler",
+    )
+    def test_delete_related_threshold(self):
+        pks = sorted(car.pk for car in self.cars)
+        self.doc.get_instances_from_related.return_value = Car.objects.filter(name__startswith="Car")
+        with (
+            self.captureOnCommitCallbacks(execute=True),
+            patch.object(connection.features, "max_query_params", 3),
+        ):
+            self.registry.delete_related(self.manufacturer)
+            # The related objects are read before the relation is gone
+            Car.objects.update(name="Deleted")
+            related_update_handler.assert_not_called()
+
+        self.assertEqual(
+            [list(call[0][1].values_list("pk", flat=True)) for call in related_update_handler.call_args_list],
+            [pks[1:4], pks[4:]],
+        )
+        for call in related_update_handler.call_args_list:
+            self.assertIs(call[1]["related_instance_to_ignore"], self.manufacturer)
+
+    def test_related_update_dropped_on_rollback(self):
+        def update_and_fail():
+            with transaction.atomic():
+                self.registry.update_related(self.manufacturer)
+                raise RuntimeError
+
+        with (
+            override_settings(
+                OPENSEARCH_RELATED_UPDATE_THRESHOLD=0,
+                OPENSEARCH_RELATED_UPDATE_HANDLER="tests.test_registries.related_update_handler",
+            ),
+            self.captureOnCommitCallbacks(execute=True),
+            self.assertRaises(RuntimeError),
+        ):
+            update_and_fail()
+        related_update_handler.assert_not_called()
+
+    @override_settings(
+        OPENSEARCH_RELATED_UPDATE_THRESHOLD=5,
+        OPENSEARCH_RELATED_UPDATE_HANDLER="tests.test_registries.related_update_handler",
+    )
+    def test_update_related_under_threshold(self):
+        self.registry.delete_related(self.manufacturer)
+        self.assertEqual(len(self.get_updated_pks()), 5)
+        related_update_handler.assert_not_called()
+
+    @override_settings(OPENSEARCH_RELATED_UPDATE_THRESHOLD=3)
+    def test_update_related_threshold_without_handler(self):
+        self.registry.update_related(self.manufacturer)
+        self.assertEqual(len(self.get_updated_pks()), 5)
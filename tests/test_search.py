@@ -0,0 +1,277 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from opensearchpy.exceptions import NotFoundError
+
+from django_opensearch_models import cache
+from django_opensearch_models.search import Search
+
+from .models import Car, Manufacturer
+
+
+class AsyncSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturers = Manufacturer.objects.bulk_create(
+            Manufacturer(name=f"manufacturer-{i}", country_code="FR", created=f"2020-01-0{i + 1}") for i in range(3)
+        )
+
+    def setUp(self):
+        hits = [{"_index": "manufacturers", "_id": str(m.pk), "_source": {}} for m in self.manufacturers[:0:-1]]
+        self.client = Mock()
+        self.client.search = AsyncMock(return_value={"hits": {"total": {"value": len(hits)}, "hits": hits}})
+        patcher = patch("django_opensearch_models.search.get_async_connection", AsyncMock(return_value=self.client))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_aexecute(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        response = await s.aexecute()
+        self.assertEqual([hit.meta.id for hit in response], [str(m.pk) for m in self.manufacturers[:0:-1]])
+        self.assertIs(await s.aexecute(), response)
+        self.client.search.assert_awaited_once_with(index=["manufacturers"], body={})
+
+    async def test_ato_queryset(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        qs = await s.ato_queryset()
+        self.assertEqual([manufacturer async for manufacturer in qs], self.manufacturers[:0:-1])
+        self.assertEqual(self.client.search.call_args[1]["body"], {"_source": {"excludes": ["*"]}})
+
+    async def test_ato_instances(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        self.assertEqual(await s.ato_instances(), self.manufacturers[:0:-1])
+
+    async def test_afilter_queryset_model_error(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        with self.assertRaises(TypeError):
+            await s.afilter_queryset(Car.objects.all())
+        self.client.search.assert_not_awaited()
+
+
+class InstancesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturers = Manufacturer.objects.bulk_create(
+            Manufacturer(name=f"manufacturer-{i}", country_code="FR", created=f"2020-01-0{i + 1}") for i in range(5)
+        )
+
+    def setUp(self):
+        ids = [str(m.pk) for m in reversed(self.manufacturers)]
+        # Deleted from the database but not yet from the index
+        ids.insert(2, "999")
+        hits = [{"_index": "manufacturers", "_id": id_, "_source": {}} for id_ in ids]
+        self.client = Mock()
+        self.client.search.return_value = {"hits": {"total": {"value": len(hits)}, "hits": hits}}
+        patcher = patch("opensearchpy.helpers.search.get_connection", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_to_instances(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        with self.assertNumQueries(1):
+            self.assertEqual(s.to_instances(), self.manufacturers[::-1])
+        self.assertEqual(self.client.search.call_args[1]["body"], {"_source": {"excludes": ["*"]}})
+
+    def test_filter_instances_in_batches(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        with patch.object(connection.features, "max_query_params", 2), self.assertNumQueries(3):
+            instances = s.filter_instances(Manufacturer.objects.filter(country_code="FR"))
+        self.assertEqual(instances, self.manufacturers[::-1])
+
+    @override_settings(OPENSEARCH_HYDRATION_CACHE="local")
+    def test_to_instances_cache(self):
+        patcher = patch.dict(cache._instance_stores, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Only the existing objects are cached
+        hits = self.client.search.return_value["hits"]["hits"]
+        hits[:] = [hit for hit in hits if hit["_id"] != "999"]
+
+        s = Search(index="manufacturers", model=Manufacturer)
+        with self.assertNumQueries(1):
+            self.assertEqual(s.to_instances(), self.manufacturers[::-1])
+        with self.assertNumQueries(0):
+            instances = s.to_instances()
+        self.assertEqual(instances, self.manufacturers[::-1])
+        self.assertIsNot(instances[0], s.to_instances()[0])
+
+        cache.invalidate_instance(Manufacturer, self.manufacturers[0])
+        with self.assertNumQueries(1):
+            s.to_instances()
+
+    @override_settings(OPENSEARCH_HYDRATION_CACHE="local")
+    def test_instance_cache_invalidated_on_commit(self):
+        patcher = patch.dict(cache._instance_stores, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        store = cache.get_instance_store()
+        manufacturer = self.manufacturers[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate_instance(Manufacturer, manufacturer, using="default")
+            # Cached by a concurrent search before the commit
+            store.set_many(Manufacturer, {manufacturer.pk: manufacturer})
+            self.assertEqual(list(store.get_many(Manufacturer, [manufacturer.pk])), [manufacturer.pk])
+        self.assertEqual(store.get_many(Manufacturer, [manufacturer.pk]), {})
+
+    def test_filter_instances_model_error(self):
+        with self.assertRaises(TypeError):
+            Search(index="manufacturers", model=Manufacturer).filter_instances(Car.objects.all())
+
+
+class PointInTimeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturers = Manufacturer.objects.bulk_create(
+            Manufacturer(name=f"manufacturer-{i}", country_code="FR", created=f"2020-01-0{i + 1}") for i in range(5)
+        )
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.create_pit.return_value = {"pit_id": "pit-1"}
+        hits = [{"_index": "manufacturers", "_id": str(m.pk), "sort": [m.pk]} for m in self.manufacturers]
+        # Deleted from the database but not yet from the index
+        hits.insert(1, {"_index": "manufacturers", "_id": "999", "sort": [999]})
+        self.bodies = []
+
+        def search(body, **kwargs):
+            self.bodies.append({**body, "pit": dict(body["pit"])})
+            start = next(
+                (i + 1 for i, hit in enumerate(hits) if hit["sort"] == body.get("search_after")),
+                0,
+            )
+            return {"pit_id": "pit-2", "hits": {"hits": hits[start : start + body["size"]]}}
+
+        self.client.search = Mock(side_effect=search)
+        patcher = patch("django_opensearch_models.search.get_connection", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_iter_pages(self):
+        s = Search(index="manufacturers", model=Manufacturer).sort("-created")[10:20]
+        pages = list(s.iter_pages(page_size=2, keep_alive="5m"))
+
+        ids = [str(m.pk) for m in self.manufacturers]
+        self.assertEqual([[hit.meta.id for hit in page] for page in pages], [[ids[0], "999"], ids[1:3], ids[3:5]])
+        self.client.create_pit.assert_called_once_with(index=["manufacturers"], keep_alive="5m")
+        self.client.delete_pit.assert_called_once_with(body={"pit_id": ["pit-2"]})
+
+        self.assertEqual(self.bodies[0]["sort"], [{"created": {"order": "desc"}}, "_id"])
+        self.assertNotIn("from", self.bodies[0])
+        self.assertFalse(self.bodies[0]["track_total_hits"])
+        self.assertEqual(self.bodies[0]["pit"], {"id": "pit-1", "keep_alive": "5m"})
+        self.assertEqual(self.bodies[1]["pit"], {"id": "pit-2", "keep_alive": "5m"})
+        self.assertEqual(self.bodies[2]["search_after"], [self.manufacturers[2].pk])
+
+    def test_iter_pages_hydrate(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        pages = list(s.iter_pages(page_size=3, tiebreaker=None, hydrate=True))
+
+        self.assertEqual(pages, [self.manufacturers[:2], self.manufacturers[2:]])
+        self.assertNotIn("sort", self.bodies[0])
+
+    def test_iter_pages_closes_point_in_time(self):
+        self.client.delete_pit.side_effect = NotFoundError(404, "not found")
+        pages = Search(index="manufacturers", model=Manufacturer).iter_pages(page_size=2)
+        next(pages)
+        pages.close()
+        self.client.delete_pit.assert_called_once_with(body={"pit_id": ["pit-2"]})
+
+    def test_iter_querysets(self):
+        s = Search(index="manufacturers", model=Manufacturer).query("match", name="manufacturer")
+        querysets = list(s.iter_querysets(chunk_size=4))
+
+        self.assertEqual([list(qs) for qs in querysets], [self.manufacturers[:3], self.manufacturers[3:]])
+        self.assertNotIn("CASE", str(querysets[0].query))
+        self.assertEqual(self.bodies[0]["_source"], {"excludes": ["*"]})
+        self.assertEqual(self.bodies[0]["query"], {"match": {"name": "manufacturer"}})
+
+    def test_iter_querysets_keep_order(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        querysets = list(s.iter_querysets(chunk_size=4, keep_order=True))
+
+        self.assertEqual([list(qs) for qs in querysets], [self.manufacturers[:3], self.manufacturers[3:]])
+        self.assertIn("CASE", str(querysets[0].query))
+
+    def test_iter_instances(self):
+        s = Search(index="manufacturers", model=Manufacturer)
+        with self.assertNumQueries(2):
+            self.assertEqual(list(s.iter_instances(chunk_size=3)), self.manufacturers)
+
+
+@override_settings(OPENSEARCH_SEARCH_CACHE="default")
+class SearchCacheTestCase(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        patcher = patch.dict(cache._search_caches, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = Mock()
+        self.client.search.return_value = {"hits": {"total": {"value": 1}, "hits": [{"_id": "1", "_source": {}}]}}
+        for target in ("django_opensearch_models.search.get_connection", "opensearchpy.helpers.search.get_connection"):
+            patcher = patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        indices = [Mock(_name="manufacturers"), Mock(_name="cars")]
+        patcher = patch.object(cache.registry, "get_indices", return_value=indices)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, index="manufacturers"):
+        return Search(index=index, model=Manufacturer).filter("term", country_code="FR").cache(30)
+
+    def test_execute_cached(self):
+        response = self.search().execute()
+        self.assertEqual([hit.meta.id for hit in response], ["1"])
+        self.assertEqual([hit.meta.id for hit in self.search().execute()], ["1"])
+        self.assertEqual(self.client.search.call_count, 1)
+
+        self.search().filter("term", name="Peugeot").execute()
+        self.assertEqual(self.client.search.call_count, 2)
+
+    def test_execute_not_cached(self):
+        Search(index="manufacturers", model=Manufacturer).execute()
+        self.search().execute(ignore_cache=True)
+        self.search().execute()
+        with override_settings(OPENSEARCH_SEARCH_CACHE=None):
+            self.search().execute()
+        self.assertEqual(self.client.search.call_count, 4)
+
+    def test_invalidate(self):
+        self.search().execute()
+        self.search(index="cars").execute()
+        Search(model=Manufacturer).cache().execute()
+
+        cache.invalidate_search_cache(sender=Mock, instance=Mock(_index=Mock(_name="manufacturers")))
+        self.search().execute()
+        self.search(index="cars").execute()
+        Search(model=Manufacturer).cache().execute()
+        # Only the searches of the index and of all the indices are sent again
+        self.assertEqual(
+            [call[1]["index"] for call in self.client.search.call_args_list],
+            [["manufacturers"], ["cars"], None, ["manufacturers"], None],
+        )
+
+    def test_invalidate_aliases_and_wildcards(self):
+        for index in ("manufacturers-alias", "manu*", "manufacturers,cars"):
+            self.search(index=index).execute()
+        cache.invalidate_search_cache(sender=Mock, instance=Mock(_index=Mock(_name="manufacturers")))
+        for index in ("manufacturers-alias", "manu*", "manufacturers,cars"):
+            self.search(index=index).execute()
+        self.assertEqual(self.client.search.call_count, 6)
+
+    async def test_aexecute_cached(self):
+        async_client = Mock()
+        async_client.search = AsyncMock(return_value=self.client.search.return_value)
+        with patch("django_opensearch_models.search.get_async_connection", AsyncMock(return_value=async_client)):
+            await self.search().aexecute()
+            response = await self.search().aexecute()
+        self.assertEqual([hit.meta.id for hit in response], ["1"])
+        async_client.search.assert_awaited_once()
+
+        # Shared with the sync searches
+        self.search().execute()
+        self.client.search.assert_not_called()
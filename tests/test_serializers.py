@@ -0,0 +1,40 @@
+import datetime
+import decimal
+import uuid
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.utils.translation import gettext_lazy as _
+from opensearchpy.exceptions import SerializationError
+
+from django_opensearch_models.serializers import DjangoJSONSerializer
+
+
+class DjangoJSONSerializerTestCase(TestCase):
+    data = {
+        "name": _("Type 57"),
+        "price": decimal.Decimal("5400000.5"),
+        "launched": datetime.date(1934, 1, 2),
+        "updated": datetime.datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc),
+        "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "tags": ["a", 1, None, True],
+    }
+    expected = (
+        '{"name":"Type 57","price":5400000.5,"launched":"1934-01-02",'
+        '"updated":"2020-01-02T03:04:05.000006+00:00","uuid":"12345678-1234-5678-1234-567812345678",'
+        '"tags":["a",1,null,true]}'
+    )
+
+    def test_dumps(self):
+        self.assertEqual(DjangoJSONSerializer().dumps(self.data), self.expected)
+
+    def test_dumps_without_orjson(self):
+        with patch("django_opensearch_models.serializers.orjson", None):
+            self.assertEqual(DjangoJSONSerializer().dumps(self.data), self.expected)
+
+    def test_dumps_string(self):
+        self.assertEqual(DjangoJSONSerializer().dumps('{"a":1}'), '{"a":1}')
+
+    def test_dumps_unsupported_type(self):
+        with self.assertRaises(SerializationError):
+            DjangoJSONSerializer().dumps({"a": object()})
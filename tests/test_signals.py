@@ -1,11 +1,23 @@
+import contextlib
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+from django.apps import apps
+from django.db import transaction
+from django.test import TestCase as DjangoTestCase
+
+from django_opensearch_models import signals
+from django_opensearch_models.bulk import MemoryDeadLetterSink
 from django_opensearch_models.documents import DocType
-from django_opensearch_models.registries import registry
-from django_opensearch_models.signals import post_index
+from django_opensearch_models.registries import DocumentRegistry, get_document_key, registry
+from django_opensearch_models.signals import (
+    BaseSignalProcessor,
+    ThreadedSignalProcessor,
+    TransactionSignalProcessor,
+    post_index,
+)
 
-from .models import Car
+from .models import Car, Manufacturer
 
 
 class PostIndexSignalTestCase(TestCase):
@@ -33,3 +45,397 @@ class PostIndexSignalTestCase(TestCase):
         mock_receiver.assert_called_once_with(
             signal=post_index, sender=CarDocument, instance=doc, actions=get_actions(), response=(1, [])
         )
+
+
+class BaseSignalProcessorTestCase(TestCase):
+    @patch("django_opensearch_models.signals.registry")
+    def test_handle_save_passes_update_fields(self, mock_registry):
+        processor = BaseSignalProcessor(Mock())
+        car = Car(pk=51)
+
+        processor.handle_save(Car, car, update_fields=frozenset({"name"}))
+        mock_registry.update.assert_called_once_with(car, update_fields=frozenset({"name"}))
+        mock_registry.update_related.assert_called_once_with(car)
+
+        mock_registry.reset_mock()
+        processor.handle_save(Car, car)
+        mock_registry.update.assert_called_once_with(car, update_fields=None)
+
+
+class TransactionProcessorMixin:
+    processor_class = TransactionSignalProcessor
+
+    def setUp(self):
+        self.registry = DocumentRegistry()
+
+        @self.registry.register_document
+        class CarDocument(DocType):
+            class Index:
+                name = "cars"
+
+            class Django:
+                model = Car
+                fields = ["name"]
+                related_models = [Manufacturer]
+
+            def get_instances_from_related(self, related_instance):
+                return related_instance.car_set.all()
+
+        self.doc_class = CarDocument
+        patcher = patch.object(CarDocument, "update")
+        self.update = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(CarDocument, "delete_ids")
+        self.delete_ids = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("django_opensearch_models.signals.registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.processor = self.processor_class(Mock())
+        # Only called directly by the tests
+        self.processor.teardown()
+
+        # bulk_create doesn't send the signals
+        (self.manufacturer,) = Manufacturer.objects.bulk_create([
+            Manufacturer(name="Peugeot", country_code="FR", created="2020-01-01")
+        ])
+        self.cars = Car.objects.bulk_create(
+            Car(name=f"car-{i}", launched="2020-01-01", manufacturer=self.manufacturer if i else None) for i in range(3)
+        )
+
+    def get_indexed_pks(self):
+        return [
+            sorted(call[0][0].values_list("pk", flat=True)) for call in self.update.call_args_list if len(call[1]) == 0
+        ]
+
+    def get_deleted(self):
+        return [(call.kwargs["index"], call[0][0]) for call in self.delete_ids.call_args_list]
+
+    def connect_processor(self):
+        """Connect the processor to the signals instead of the one of the app."""
+        app_processor = apps.get_app_config("django_opensearch_models").signal_processor
+        app_processor.teardown()
+        self.addCleanup(app_processor.setup)
+        self.processor.setup()
+        self.addCleanup(self.processor.teardown)
+
+    def delete_in_transaction(self, instance):
+        """Really delete `instance` in a transaction, with the processor connected to the signals."""
+        self.connect_processor()
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            instance.delete()
+
+
+class TransactionSignalProcessorTestCase(TransactionProcessorMixin, DjangoTestCase):
+    def test_updates_are_sent_at_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for car in (self.cars[0], self.cars[1], self.cars[0]):
+                self.processor.handle_save(Car, car)
+            self.processor.handle_delete(Car, self.cars[2])
+            self.update.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk, self.cars[1].pk]])
+        self.assertEqual(self.get_deleted(), [("cars", [self.cars[2].pk])])
+
+    def test_last_update_of_an_object_wins(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[0])
+            self.processor.handle_delete(Car, self.cars[0])
+        self.assertEqual(self.get_indexed_pks(), [])
+        self.assertEqual(self.get_deleted(), [("cars", [self.cars[0].pk])])
+
+    def test_rolled_back_updates_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+
+            def save_and_fail():
+                with transaction.atomic():
+                    self.processor.handle_save(Car, self.cars[0])
+                    raise RuntimeError
+
+            with self.assertRaises(RuntimeError):
+                save_and_fail()
+            self.processor.handle_save(Car, self.cars[1])
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[1].pk]])
+
+    def test_rolled_back_savepoint_delete_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[0])
+            with contextlib.suppress(RuntimeError), transaction.atomic():
+                self.processor.handle_delete(Car, self.cars[0])
+                raise RuntimeError
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk]])
+        self.assertEqual(self.get_deleted(), [])
+
+    def test_released_savepoints_are_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for car in self.cars[:2]:
+                with transaction.atomic():
+                    self.processor.handle_save(Car, car)
+            self.processor.handle_delete(Car, self.cars[2])
+            with transaction.atomic():
+                self.processor.handle_save(Car, self.cars[2])
+        # The last savepoint is sent after the batch it followed
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk, self.cars[1].pk], [self.cars[2].pk]])
+        self.assertEqual(self.get_deleted(), [("cars", [self.cars[2].pk])])
+
+    def test_deleted_instance(self):
+        pk = self.cars[2].pk
+        self.delete_in_transaction(self.cars[2])
+        # The primary key of the instance is reset once it's deleted
+        self.assertIsNone(self.cars[2].pk)
+        self.assertEqual(self.get_deleted(), [("cars", [pk])])
+
+    def test_related_objects(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Manufacturer, self.manufacturer)
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[1].pk, self.cars[2].pk]])
+
+    def test_related_objects_of_deleted_instance(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_pre_delete(Manufacturer, self.manufacturer)
+            # The relation doesn't exist anymore at commit
+            Car.objects.filter(manufacturer=self.manufacturer).update(manufacturer=None)
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[1].pk, self.cars[2].pk]])
+
+    def test_ignore_signals(self):
+        self.doc_class.django.ignore_signals = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[0])
+        self.update.assert_not_called()
+
+
+class BatchedCelerySignalProcessorTestCase(TransactionProcessorMixin, DjangoTestCase):
+    processor_class = signals.BatchedCelerySignalProcessor
+
+    def setUp(self):
+        super().setUp()
+        for task in ("update_documents", "update_related_instances", "delete_documents"):
+            patcher = patch.object(getattr(signals, task), "delay")
+            setattr(self, task, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_tasks_are_sent_at_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for car in (self.cars[0], self.cars[1], self.cars[0]):
+                self.processor.handle_save(Car, car)
+            self.processor.handle_delete(Car, self.cars[2])
+            self.update_documents.assert_not_called()
+
+        self.update_documents.assert_called_once_with(
+            get_document_key(self.doc_class), [self.cars[0].pk, self.cars[1].pk]
+        )
+        # The deleted objects are sent by id, they can't be fetched by a worker
+        self.delete_documents.assert_called_once_with(get_document_key(self.doc_class), "cars", [self.cars[2].pk])
+        self.update.assert_not_called()
+
+    def test_deleted_instance(self):
+        pk = self.cars[2].pk
+        self.delete_in_transaction(self.cars[2])
+        self.delete_documents.assert_called_once_with(get_document_key(self.doc_class), "cars", [pk])
+
+    @patch.object(signals, "CELERY_TASK_SIZE", 2)
+    def test_tasks_are_chunked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for car in self.cars:
+                self.processor.handle_save(Car, car)
+        self.assertEqual(
+            [call[0][1] for call in self.update_documents.call_args_list],
+            [[self.cars[0].pk, self.cars[1].pk], [self.cars[2].pk]],
+        )
+
+    def test_related_instances(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Manufacturer, self.manufacturer)
+        self.update_related_instances.assert_called_once_with("tests", "Manufacturer", [self.manufacturer.pk])
+        self.update_documents.assert_not_called()
+
+    def test_update_documents_task(self):
+        signals.update_documents(get_document_key(self.doc_class), [self.cars[0].pk, self.cars[1].pk])
+        self.update.assert_called_once()
+        self.assertEqual([car.pk for car in self.update.call_args[0][0]], [self.cars[0].pk, self.cars[1].pk])
+
+    def test_update_documents_task_ignores_deleted_instance(self):
+        with patch.object(self.doc_class, "__init__", return_value=None) as init:
+            signals.update_documents(
+                get_document_key(self.doc_class), [self.cars[1].pk], ["tests.manufacturer", self.manufacturer.pk]
+            )
+        self.assertEqual(init.call_args[1]["related_instance_to_ignore"], self.manufacturer)
+
+    def test_defer_related_update(self):
+        with patch.object(signals.update_documents, "delay") as delay:
+            signals.defer_related_update(
+                self.doc_class, Car.objects.order_by("pk"), related_instance_to_ignore=self.manufacturer
+            )
+        delay.assert_called_once_with(
+            get_document_key(self.doc_class),
+            [car.pk for car in self.cars],
+            related_instance_to_ignore=["tests.manufacturer", self.manufacturer.pk],
+        )
+
+    def test_update_related_instances_task(self):
+        with patch.object(self.registry, "update_related") as update_related:
+            signals.update_related_instances("tests", "Manufacturer", [self.manufacturer.pk, 999])
+        update_related.assert_called_once_with(self.manufacturer)
+
+    def test_delete_documents_task(self):
+        with patch.object(self.doc_class, "delete_ids") as delete_ids:
+            signals.delete_documents(get_document_key(self.doc_class), "cars-v2", [1, 2])
+        delete_ids.assert_called_once_with([1, 2], index="cars-v2", raise_on_error=False)
+
+
+class CelerySignalProcessorTestCase(TransactionProcessorMixin, DjangoTestCase):
+    processor_class = signals.CelerySignalProcessor
+
+    def test_delete_sends_ids(self):
+        with patch.object(signals.delete_documents, "delay") as delay, self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_delete(Car, self.cars[0])
+        delay.assert_called_once_with(get_document_key(self.doc_class), "cars", [self.cars[0].pk])
+
+    def test_deleted_instance(self):
+        pk = self.cars[2].pk
+        with patch.object(signals.delete_documents, "delay") as delay:
+            self.delete_in_transaction(self.cars[2])
+        delay.assert_called_once_with(get_document_key(self.doc_class), "cars", [pk])
+
+    @patch.object(signals, "CELERY_TASK_SIZE", 2)
+    def test_deletes_are_grouped_at_commit(self):
+        with (
+            patch.object(signals.delete_documents, "delay") as delay,
+            patch.object(signals.CelerySignalProcessor.save, "delay") as save,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            for car in self.cars:
+                self.processor.handle_delete(Car, car)
+            delay.assert_not_called()
+            # The saves are still sent right away
+            self.processor.handle_save(Car, self.cars[0])
+            save.assert_called_once()
+        self.assertEqual(
+            [call[0] for call in delay.call_args_list],
+            [
+                (get_document_key(self.doc_class), "cars", [self.cars[0].pk, self.cars[1].pk]),
+                (get_document_key(self.doc_class), "cars", [self.cars[2].pk]),
+            ],
+        )
+
+    def test_delete_ignore_signals(self):
+        self.doc_class.django.ignore_signals = True
+        with patch.object(signals.delete_documents, "delay") as delay, self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_delete(Car, self.cars[0])
+        delay.assert_not_called()
+
+
+class ThreadedSignalProcessorTestCase(TransactionProcessorMixin, DjangoTestCase):
+    processor_class = ThreadedSignalProcessor
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.processor.shutdown)
+        self.processor.workers = 1
+
+    def test_updates_are_merged(self):
+        self.processor.batch_size = 4
+        self.processor.flush_interval = 60
+        with self.captureOnCommitCallbacks(execute=True):
+            for car in (self.cars[0], self.cars[1], self.cars[0]):
+                self.processor.handle_save(Car, car)
+            self.processor.handle_delete(Car, self.cars[2])
+            self.update.assert_not_called()
+
+        self.processor.join()
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk, self.cars[1].pk]])
+        self.assertEqual(self.get_deleted(), [("cars", [self.cars[2].pk])])
+
+    def test_deleted_instance(self):
+        self.processor.flush_interval = 0.01
+        pk = self.cars[2].pk
+        self.connect_processor()
+        # Sent once the test transaction "commits", after Django reset the primary key
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cars[2].delete()
+        self.processor.join()
+        self.assertEqual(self.get_deleted(), [("cars", [pk])])
+
+    def test_flush_interval(self):
+        self.processor.flush_interval = 0.01
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[0])
+        self.processor.join()
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk]])
+
+    def test_shutdown_sends_queued_updates(self):
+        self.processor.flush_interval = 60
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[0])
+        self.processor.shutdown()
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk]])
+
+    def test_rolled_back_updates_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+
+            def save_and_fail():
+                with transaction.atomic():
+                    self.processor.handle_save(Car, self.cars[0])
+                    raise RuntimeError
+
+            with self.assertRaises(RuntimeError):
+                save_and_fail()
+        self.assertEqual(callbacks, [])
+
+    def test_failed_batches_are_sent_again(self):
+        self.processor.flush_interval = 0.01
+        self.processor.retry_backoff = 0
+        self.update.side_effect = [RuntimeError("unavailable"), (1, [])]
+        with self.assertLogs("django_opensearch_models.signals", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.processor.handle_save(Car, self.cars[0])
+            self.processor.join()
+        self.assertEqual(self.get_indexed_pks(), [[self.cars[0].pk], [self.cars[0].pk]])
+
+    def test_failed_batches_are_dead_lettered(self):
+        self.processor.max_retries = 0
+        self.update.side_effect = RuntimeError("unavailable")
+        sink = MemoryDeadLetterSink()
+        # Flushed in the test thread, which can read the objects of the test transaction
+        batch = self.processor.batch_class()
+        batch.add(self.doc_class, self.cars[0].pk)
+        batch.add(self.doc_class, self.cars[2].pk, ("cars", self.cars[2].pk))
+        with (
+            patch.object(signals.DEDConfig, "dead_letter_sink", return_value=sink),
+            self.assertLogs("django_opensearch_models.signals", "ERROR"),
+        ):
+            self.processor._flush(batch)
+        self.assertEqual(
+            [(record["action"]["_op_type"], record["action"]["_id"]) for record in sink.read()],
+            [("index", self.cars[0].pk), ("delete", self.cars[2].pk)],
+        )
+        self.assertEqual(sink.read()[0]["error"], {"error": "RuntimeError('unavailable')"})
+
+    def test_atexit_registered_once(self):
+        with (
+            patch.object(signals.atexit, "register") as register,
+            patch.object(signals.atexit, "unregister") as unregister,
+        ):
+            self.processor.enqueue(lambda _batch: None)
+            self.processor.enqueue(lambda _batch: None)
+            register.assert_called_once_with(self.processor.shutdown)
+            self.processor.teardown()
+        unregister.assert_called_with(self.processor.shutdown)
+        self.assertEqual(self.processor._threads, [])
+
+    def test_errors_are_logged(self):
+        self.processor.flush_interval = 0.01
+        self.processor.max_retries = 0
+        self.update.side_effect = [RuntimeError("unavailable"), (1, [])]
+        with self.assertLogs("django_opensearch_models.signals", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.processor.handle_save(Car, self.cars[0])
+            self.processor.join()
+
+        # The worker is still running
+        with self.captureOnCommitCallbacks(execute=True):
+            self.processor.handle_save(Car, self.cars[1])
+        self.processor.join()
+        self.assertEqual(self.update.call_count, 2)